@@ -0,0 +1,287 @@
+# ann_index.py
+# ------------------------------------------------------------
+# Index approximatif (IVF) sur les histogrammes LBPH, pour les grandes
+# galeries (dizaines de milliers d'échantillons) :
+# - quantificateur grossier : k-means sur sqrt(histogramme) (distance de
+#   Hellinger, proche du chi-square) → 'lists' centroïdes
+# - chaque échantillon est rangé dans la liste de son centroïde le plus proche
+# - requête : les 'probes' listes les plus proches sont parcourues en
+#   chi-square exact (lbph_numpy.chi_square) au lieu de toute la galerie
+# - probes <= 0 ou >= lists, ou index absent/périmé : recherche exacte
+# - les échantillons ajoutés après la construction (enrôlement incrémental)
+#   sont toujours comparés exactement
+# Fichier : data/model.ivf (npz) à côté de data/model.yml / data/model.bin
+# Benchmark rappel@1 vs LBPH exact :
+#   python ann_index.py --bench --dataset data/dataset --lists 64 --probes 1 2 4 8
+# ------------------------------------------------------------
+import os
+import time
+import argparse
+
+import numpy as np
+
+from lbph_numpy import NumpyLBPH, chi_square, compute_histograms, rank_labels
+
+DATA_DIR = "data"
+GALLERY_PATH = os.path.join(DATA_DIR, "model.bin")
+IVF_PATH = os.path.join(DATA_DIR, "model.ivf")
+
+DEFAULT_PROBES = 8
+_BLOCK = 1024          # lignes traitées par bloc (affectation, k-means)
+_TRAIN_PER_LIST = 64   # échantillons d'apprentissage k-means par liste
+
+def default_lists(n_samples):
+    """Nombre de listes par défaut : ~sqrt(N), au moins 1."""
+    return max(1, int(round(np.sqrt(n_samples))))
+
+def _assign(histograms, centroids, take_sqrt=True):
+    """Indice du centroïde le plus proche (L2 sur sqrt) pour chaque ligne."""
+    # ||sqrt(h)||² est constant (somme des cellules normalisées) : le plus
+    # proche en L2 est celui de plus grand produit scalaire, à norme près
+    c_norm = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(histograms.shape[0], dtype=np.int32)
+    for start in range(0, histograms.shape[0], _BLOCK):
+        x = np.asarray(histograms[start:start + _BLOCK], dtype=np.float32)
+        if take_sqrt:
+            x = np.sqrt(x)
+        out[start:start + len(x)] = np.argmax(x @ centroids.T - c_norm, axis=1)
+    return out
+
+def train_centroids(histograms, lists, iters=10, seed=0):
+    """k-means (Lloyd) sur un sous-échantillon de la galerie → (lists, D) float32."""
+    n = histograms.shape[0]
+    lists = max(1, min(lists, n))
+    rng = np.random.default_rng(seed)
+    n_train = min(n, lists * _TRAIN_PER_LIST)
+    sample = np.sort(rng.choice(n, n_train, replace=False))
+    x = np.sqrt(np.asarray(histograms[sample], dtype=np.float32))
+    centroids = x[rng.choice(n_train, lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, centroids, take_sqrt=False)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=lists).astype(np.float32)
+        empty = counts == 0
+        # Liste vide → réinitialisée sur un échantillon tiré au hasard
+        if empty.any():
+            sums[empty] = x[rng.choice(n_train, int(empty.sum()), replace=False)]
+            counts[empty] = 1.0
+        centroids = sums / counts[:, None]
+    return centroids.astype(np.float32)
+
+class IVFIndex:
+    """
+    Listes inversées : centroids (L, D), order (N,) indices de la galerie
+    triés par liste, offsets (L+1,) bornes de chaque liste dans order.
+    labels (N,) sert à vérifier que l'index correspond à la galerie.
+    """
+
+    def __init__(self, centroids, order, offsets, labels):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.order = np.ascontiguousarray(order, dtype=np.int64)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        self._c_norm = 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    @property
+    def lists(self):
+        return self.centroids.shape[0]
+
+    @property
+    def n_samples(self):
+        return self.labels.shape[0]
+
+    @classmethod
+    def build(cls, histograms, labels, lists=None, iters=10, seed=0):
+        """Construire l'index d'une galerie (histograms (N, D), labels (N,))."""
+        n = histograms.shape[0]
+        lists = lists or default_lists(n)
+        centroids = train_centroids(histograms, lists, iters, seed)
+        assign = _assign(histograms, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+        return cls(centroids, order, offsets, labels)
+
+    def save(self, path=IVF_PATH):
+        """Écrire l'index (npz) de façon atomique."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(tmp, centroids=self.centroids, order=self.order,
+                 offsets=self.offsets, labels=self.labels)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=IVF_PATH):
+        with np.load(path) as z:
+            return cls(z["centroids"], z["order"], z["offsets"], z["labels"])
+
+    def matches(self, gallery_labels):
+        """L'index couvre-t-il le début de cette galerie (mêmes labels, même ordre) ?"""
+        n = self.n_samples
+        return n <= len(gallery_labels) and np.array_equal(np.asarray(gallery_labels[:n]), self.labels)
+
+    def candidates(self, query_hist, probes):
+        """Indices (triés) des échantillons des 'probes' listes les plus proches."""
+        scores = np.sqrt(query_hist) @ self.centroids.T - self._c_norm
+        probes = min(probes, self.lists)
+        nearest = np.argpartition(-scores, probes - 1)[:probes]
+        parts = [self.order[self.offsets[c]:self.offsets[c + 1]] for c in nearest]
+        return np.sort(np.concatenate(parts))
+
+class IVFLBPH:
+    """
+    Moteur LBPH approché : même interface que NumpyLBPH (predict,
+    predict_batch, histograms, labels) ; recherche exacte si probes <= 0.
+    """
+
+    def __init__(self, engine, index, probes=DEFAULT_PROBES):
+        self.engine = engine
+        self.index = index
+        self.probes = probes
+        self.histograms = engine.histograms
+        self.labels = engine.labels
+        self.threshold = engine.threshold
+        self.scanned = 0     # échantillons comparés (chi-square)
+        self.queries = 0
+
+    @property
+    def exact(self):
+        return self.probes <= 0 or self.probes >= self.index.lists
+
+    def predict_batch(self, rois, k=1):
+        if len(rois) == 0:
+            return []
+        if self.exact or self.histograms.shape[0] == 0:
+            self.scanned += len(rois) * self.histograms.shape[0]
+            self.queries += len(rois)
+            return self.engine.predict_batch(rois, k)
+        queries = compute_histograms(rois)
+        tail = np.arange(self.index.n_samples, self.histograms.shape[0], dtype=np.int64)
+        results = []
+        for q in queries:
+            cand = self.index.candidates(q, self.probes)
+            if len(tail):
+                cand = np.concatenate([cand, tail])
+            row = chi_square(q[None], self.histograms[cand])[0]
+            results.append(rank_labels(row, self.labels[cand], k, self.threshold))
+            self.scanned += len(cand)
+        self.queries += len(queries)
+        return results
+
+    def predict(self, roi):
+        return self.predict_batch([roi], k=1)[0][0]
+
+    def stats(self) -> dict:
+        n = self.histograms.shape[0]
+        per_query = self.scanned / self.queries if self.queries else 0.0
+        return {
+            "lists": self.index.lists, "probes": self.probes, "exact": self.exact,
+            "scanned_per_query": round(per_query, 1),
+            "scanned_ratio": round(per_query / n, 4) if n else 0.0,
+        }
+
+def build_index(path, histograms, labels, lists=None):
+    """Construire et écrire l'index IVF d'une galerie ; retourne l'index."""
+    index = IVFIndex.build(histograms, labels, lists)
+    index.save(path)
+    return index
+
+def load_ann_engine(engine, path=IVF_PATH, probes=DEFAULT_PROBES):
+    """
+    Envelopper un NumpyLBPH dans un IVFLBPH si l'index existe et correspond
+    à la galerie ; sinon retourner le moteur exact (avec un avertissement).
+    """
+    if not os.path.exists(path):
+        print(f"[WARN] Index ANN absent ({path}) → recherche exacte")
+        return engine
+    try:
+        index = IVFIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Index ANN illisible ({e}) → recherche exacte")
+        return engine
+    if not index.matches(engine.labels):
+        print("[WARN] Index ANN périmé (galerie ré-entraînée) → recherche exacte")
+        return engine
+    return IVFLBPH(engine, index, probes)
+
+def benchmark(dataset=None, lists=None, probes=(1, 2, 4, 8, 16), holdout_every=5, batch=16):
+    """
+    Rappel@1 de l'index IVF par rapport au LBPH exact (même plus proche
+    voisin) sur un jeu de test mis de côté, pour chaque nombre de probes.
+    Retourne (rows, info) : rows = [{probes, recall_at_1, top1, ms_per_face, scanned_ratio}].
+    """
+    from evaluate_model import load_samples, split_holdout
+    X, y, _ = load_samples(dataset)
+    train_idx, test_idx = split_holdout(y, holdout_every)
+    if len(train_idx) == 0 or len(test_idx) == 0:
+        return [], {}
+    engine = NumpyLBPH()
+    engine.train([X[i] for i in train_idx], y[train_idx])
+    X_test, y_test = [X[i] for i in test_idx], y[test_idx]
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(engine.histograms, engine.labels, lists)
+    t_build = time.perf_counter() - t0
+
+    def run(eng):
+        preds = []
+        t0 = time.perf_counter()
+        for i in range(0, len(X_test), batch):
+            preds.extend(p[0] for p in eng.predict_batch(X_test[i:i + batch], k=1))
+        return preds, 1000.0 * (time.perf_counter() - t0) / len(X_test)
+
+    exact, exact_ms = run(engine)
+    rows = [{"probes": 0, "recall_at_1": 1.0,
+             "top1": float(np.mean([p[0] == t for p, t in zip(exact, y_test)])),
+             "ms_per_face": exact_ms, "scanned_ratio": 1.0}]
+    for p in probes:
+        ann = IVFLBPH(engine, index, p)
+        preds, ms = run(ann)
+        rows.append({
+            "probes": p,
+            # même plus proche voisin que la recherche exacte (même distance)
+            "recall_at_1": float(np.mean([a[1] == e[1] for a, e in zip(preds, exact)])),
+            "top1": float(np.mean([a[0] == t for a, t in zip(preds, y_test)])),
+            "ms_per_face": ms,
+            "scanned_ratio": ann.stats()["scanned_ratio"],
+        })
+    info = {"gallery": int(engine.histograms.shape[0]), "test": len(X_test),
+            "lists": index.lists, "build_s": t_build}
+    return rows, info
+
+def main():
+    parser = argparse.ArgumentParser(description="Index ANN (IVF) des histogrammes LBPH : construction et benchmark.")
+    parser.add_argument("--build", action="store_true", help=f"Construire l'index depuis la galerie binaire → {IVF_PATH}")
+    parser.add_argument("--gallery", default=GALLERY_PATH, help=f"Galerie binaire (défaut: {GALLERY_PATH})")
+    parser.add_argument("--out", default=IVF_PATH, help=f"Fichier index (défaut: {IVF_PATH})")
+    parser.add_argument("--lists", type=int, default=0, help="Nombre de listes (défaut: ~sqrt(N))")
+    parser.add_argument("--bench", action="store_true", help="Mesurer rappel@1 / vitesse vs LBPH exact")
+    parser.add_argument("--dataset", help="Avec --bench : dossier <Nom>/*.png (défaut: MySQL)")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Avec --bench : nombres de listes parcourues à tester")
+    parser.add_argument("--holdout-every", type=int, default=5, help="Avec --bench : 1 image sur N en test")
+    args = parser.parse_args()
+
+    if args.build:
+        from gallery_bin import load_gallery
+        engine, _ = load_gallery(args.gallery)
+        index = build_index(args.out, engine.histograms, engine.labels, args.lists or None)
+        print(f"[OK] Index IVF: {index.n_samples} échantillons, {index.lists} listes → {args.out}")
+    if args.bench:
+        rows, info = benchmark(args.dataset, args.lists or None, args.probes, args.holdout_every)
+        if not rows:
+            print("[ERREUR] Pas assez d'images pour séparer train/test.")
+            return
+        print(f"[INFO] galerie: {info['gallery']} | test: {info['test']} | listes: {info['lists']} "
+              f"| construction: {info['build_s']:.2f}s")
+        print("| Probes | Rappel@1 | Top-1 | ms/visage | Galerie parcourue |")
+        print("|---|---|---|---|---|")
+        for r in rows:
+            name = "exact" if r["probes"] == 0 else r["probes"]
+            print(f"| {name} | {r['recall_at_1'] * 100:.1f}% | {r['top1'] * 100:.1f}% "
+                  f"| {r['ms_per_face']:.2f} | {r['scanned_ratio'] * 100:.1f}% |")
+    if not (args.build or args.bench):
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# batch_recognize.py
+# ------------------------------------------------------------
+# Reconnaissance sans affichage sur des fichiers (vidéos enregistrées,
+# dossiers d'images, globs), résultats en JSONL (une ligne par frame) :
+#   {"source", "frame", "ts", "faces": [{"box", "label", "name", "conf"}]}
+# - mêmes fonctions que le mode live : core.get_recognizer, detect_faces,
+#   predict_rois, THRESHOLD
+# - --stride N : un frame sur N (les autres sont sautés par grab(), sans
+#   décodage complet)
+# - --workers N : décodage + détection + prédiction dans un pool de
+#   processus ; les vidéos sont découpées en segments (seek par frame)
+# - --max-throughput : tous les cœurs, résultats écrits dès qu'ils arrivent
+#   (ordre des segments non garanti)
+# - filtre qualité (face_quality.py) avant la prédiction : visage refusé
+#   écrit avec "rejected": <motif>, sans label ; rejets comptés par motif
+#   (--no-quality pour le désactiver)
+# Exemples :
+#   python batch_recognize.py --input videos/hall.mp4 --out hall.jsonl --stride 2
+#   python batch_recognize.py --input "captures/**/*.jpg" --engine numpy --workers 4
+# ------------------------------------------------------------
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from multiprocessing import Pool
+
+import cv2
+
+import recognize_live_mysql as live
+from core import get_recognizer, new_cascade
+from face_quality import assess, add_quality_arguments, gate_from_args
+
+VIDEO_EXT = {".mp4", ".avi", ".mkv", ".mov", ".m4v", ".webm", ".mpg", ".mpeg"}
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+# Frames par segment vidéo quand la vidéo est répartie entre workers
+SEGMENT_FRAMES = 500
+# Images par tâche envoyée à un worker
+IMAGES_PER_TASK = 32
+
+# État d'un worker (modèle chargé une seule fois par processus)
+_STATE = {}
+
+def expand_inputs(inputs):
+    """Vidéos, dossiers (récursif) et globs → (vidéos, images) triées, sans doublon."""
+    videos, images = [], []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = sorted(glob.glob(os.path.join(item, "**", "*"), recursive=True))
+        elif os.path.exists(item):
+            paths = [item]
+        else:
+            paths = sorted(glob.glob(item, recursive=True))
+        for p in paths:
+            ext = os.path.splitext(p)[1].lower()
+            if ext in VIDEO_EXT and p not in videos:
+                videos.append(p)
+            elif ext in IMAGE_EXT and p not in images:
+                images.append(p)
+    return videos, images
+
+def make_tasks(videos, images, split_videos):
+    """
+    Tâches ("video", path, start, stop) et ("images", [paths]).
+    split_videos : découper chaque vidéo en segments de SEGMENT_FRAMES frames.
+    """
+    tasks = []
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+        cap.release()
+        if split_videos and total > SEGMENT_FRAMES:
+            tasks += [("video", path, start, min(start + SEGMENT_FRAMES, total))
+                      for start in range(0, total, SEGMENT_FRAMES)]
+        else:
+            tasks.append(("video", path, 0, None))   # None = jusqu'à la fin
+    for i in range(0, len(images), IMAGES_PER_TASK):
+        tasks.append(("images", images[i:i + IMAGES_PER_TASK]))
+    return tasks
+
+def init_state(engine="opencv", detect_width=0, stride=1, single_thread=False, quality=None):
+    """
+    Charger modèle + labels une fois (processus principal ou worker du pool).
+    'quality' : seuils de face_quality.assess (QualityGate.thresholds()),
+    None = pas de filtre.
+    """
+    if single_thread:
+        cv2.setNumThreads(1)   # le parallélisme vient du pool
+    recognizer, labels_to_name = get_recognizer(engine)
+    _STATE.update(recognizer=recognizer, labels_to_name=labels_to_name,
+                  cascade=new_cascade(),
+                  detect_width=detect_width, stride=max(1, stride), quality=quality)
+
+def recognize_image(img_bgr):
+    """
+    Détection + prédiction sur une image BGR → liste de visages (dicts).
+    Visage refusé par le filtre qualité : "rejected": <motif>, sans predict.
+    """
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    boxes = live.detect_faces(gray, _STATE["cascade"], _STATE["detect_width"])
+    if len(boxes) == 0:
+        return []
+    rois = [cv2.resize(gray[y:y + h, x:x + w], (200, 200)) for (x, y, w, h) in boxes]
+    reasons = [None] * len(rois)
+    if _STATE["quality"] is not None:
+        _, reasons, _ = assess(rois, [min(b[2], b[3]) for b in boxes], **_STATE["quality"])
+    labels_to_name = _STATE["labels_to_name"]
+    preds = iter(live.predict_rois(_STATE["recognizer"],
+                                   [roi for roi, reason in zip(rois, reasons) if reason is None]))
+    faces = []
+    for (x, y, w, h), reason in zip(boxes, reasons):
+        box = [int(x), int(y), int(w), int(h)]
+        if reason is not None:
+            faces.append({"box": box, "label": -1, "name": None, "conf": None, "rejected": reason})
+            continue
+        label, conf = next(preds)
+        known = conf < live.THRESHOLD and label in labels_to_name
+        faces.append({
+            "box": box,
+            "label": int(label) if known else -1,
+            "name": labels_to_name[label] if known else None,
+            "conf": round(float(conf), 3),
+        })
+    return faces
+
+def run_task(task):
+    """Exécuter une tâche → (records, frames_lus)."""
+    records, read = [], 0
+    if task[0] == "images":
+        for path in task[1]:
+            img = cv2.imread(path)
+            if img is None:
+                records.append({"source": path, "frame": 0, "ts": None, "error": "Lecture impossible"})
+                continue
+            read += 1
+            records.append({"source": path, "frame": 0, "ts": round(os.path.getmtime(path), 3),
+                            "faces": recognize_image(img)})
+        return records, read
+
+    _, path, start, stop = task
+    stride = _STATE["stride"]
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return [{"source": path, "frame": start, "ts": None, "error": "Lecture impossible"}], 0
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    # Premier frame traité : multiple de 'stride' (indépendant du découpage)
+    idx = start
+    while stop is None or idx < stop:
+        if idx % stride:
+            if not cap.grab():       # frame sauté : pas de décodage complet
+                break
+            idx += 1
+            continue
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            break
+        read += 1
+        records.append({"source": path, "frame": idx,
+                        "ts": round(idx / fps, 3) if fps > 0 else None,
+                        "faces": recognize_image(frame)})
+        idx += 1
+    cap.release()
+    return records, read
+
+def _worker_init(engine, detect_width, stride, quality):
+    init_state(engine, detect_width, stride, single_thread=True, quality=quality)
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconnaissance sans affichage (vidéos / images) → JSONL.")
+    parser.add_argument("--input", nargs="+", required=True,
+                        help="Fichiers vidéo, dossiers d'images ou globs (ex: 'captures/**/*.jpg')")
+    parser.add_argument("--out", default="-", help="Fichier JSONL de sortie (défaut: sortie standard)")
+    parser.add_argument("--stride", type=int, default=1, help="Traiter un frame vidéo sur N (défaut: 1)")
+    parser.add_argument("--workers", type=int, default=1, help="Processus de décodage/reconnaissance (défaut: 1)")
+    parser.add_argument("--max-throughput", action="store_true",
+                        help="Tous les cœurs, résultats écrits dans l'ordre d'arrivée")
+    parser.add_argument("--faces-only", action="store_true", help="N'écrire que les frames avec au moins un visage")
+    parser.add_argument("--engine", choices=("opencv", "numpy"), default="opencv",
+                        help="opencv: recognizer.predict par visage (défaut) | numpy: prédiction groupée par frame")
+    parser.add_argument("--detect-width", type=int, default=live.DETECT_WIDTH,
+                        help="Largeur de détection en px, 0 = pleine résolution (défaut: 0)")
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    if args.max_throughput and args.workers == 1:
+        workers = os.cpu_count() or 1
+
+    videos, images = expand_inputs(args.input)
+    if not videos and not images:
+        print("[ERREUR] Aucune vidéo ni image trouvée.", file=sys.stderr)
+        return
+    tasks = make_tasks(videos, images, split_videos=workers > 1)
+    gate = gate_from_args(args)
+    quality = gate.thresholds() if gate is not None else None
+    print(f"[INFO] {len(videos)} vidéo(s), {len(images)} image(s) → {len(tasks)} tâche(s), "
+          f"{workers} worker(s)", file=sys.stderr)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    pool = None
+    t0 = time.perf_counter()
+    frames = faces = written = 0
+    try:
+        if workers > 1:
+            pool = Pool(processes=workers, initializer=_worker_init,
+                        initargs=(args.engine, args.detect_width, args.stride, quality))
+            results = (pool.imap_unordered if args.max_throughput else pool.imap)(run_task, tasks)
+        else:
+            init_state(args.engine, args.detect_width, args.stride, quality=quality)
+            results = map(run_task, tasks)
+
+        for records, read in results:
+            frames += read
+            for rec in records:
+                n = len(rec.get("faces", ()))
+                faces += n
+                if gate is not None and n:
+                    gate.record([face.get("rejected") for face in rec["faces"]])
+                if args.faces_only and n == 0:
+                    continue
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                written += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"[SUMMARY] {frames} frame(s) traités | {faces} visage(s) | {written} ligne(s) → {args.out}",
+          file=sys.stderr)
+    if gate is not None:
+        print(f"[INFO] Filtre qualité: {gate.stats()}", file=sys.stderr)
+    print(f"[PERF] {elapsed:.2f}s | {frames / elapsed if elapsed > 0 else 0.0:.1f} frames/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# bench/
+# ------------------------------------------------------------
+# Suite de benchmarks hors-ligne (sans caméra ni affichage) :
+# - synthetic.py : visages synthétiques (ou dossier d'images local)
+# - sqlite_db.py : remplaçant SQLite des fonctions de db_utils
+# - run_bench.py : chronométrage détection / entraînement / prédiction /
+#   sauvegarde-chargement du modèle / DB → rapport JSON comparable
+# Exemple (depuis la racine du projet) :
+#   python -m bench.run_bench --images 1000 --people 50 --out bench.json
+# ------------------------------------------------------------
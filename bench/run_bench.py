@@ -0,0 +1,353 @@
+# bench/run_bench.py
+# ------------------------------------------------------------
+# Benchmarks hors-ligne (Linux sans caméra ni écran), rapport JSON :
+# - db      : get_or_create_person_id, add_image_record(s), person_exists,
+#             fetch_person_names, fetch_image_rows (SQLite ou MySQL)
+# - detect  : detect_and_crop_face (scènes synthétiques ou dossier local)
+#             + filtre qualité des crops (face_quality.assess, par lot)
+# - train   : train_and_save_model à froid puis avec cache de features
+# - model_io: sauvegarde / chargement model.yml et model.bin
+# - predict : LBPH predict par visage (OpenCV) et par lot (NumPy)
+# - startup : import de chaque script + première détection, processus neuf
+#             (core.measure_cold_start, budget core.COLD_START_BUDGET)
+# Tout tourne dans un dossier de travail temporaire (data/ isolé).
+# Exemples :
+#   python -m bench.run_bench --images 1000 --people 50 --out bench.json
+#   python -m bench.run_bench --image-dir people --db mysql
+#   python -m bench.run_bench --images 1000 --compare bench.json
+# Avec --compare, code de sortie 1 si une mesure régresse au-delà de --tolerance.
+# ------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from bench import sqlite_db
+from core import DATA_DIR, DATASET_DIR, MODEL_PATH, GALLERY_PATH, detect_and_crop_face
+from face_quality import assess
+from bench.synthetic import generate_dataset, generate_scenes, load_directory
+
+STAGES = ("db", "detect", "train", "model_io", "predict", "startup")
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+def _rate(n, seconds):
+    return n / seconds if seconds > 0 else 0.0
+
+def bench_db(db, entries, single=200, lookups=1000):
+    """Insérer personnes + images (unitaires puis par lots) et chronométrer les lectures."""
+    names = sorted({name for name, _ in entries})
+    t0 = time.perf_counter()
+    ids = {name: db.get_or_create_person_id(name) for name in names}
+    t_people = time.perf_counter() - t0
+
+    rows = [(ids[name], path) for name, path in entries]
+    head, tail = rows[:single], rows[single:]
+    t0 = time.perf_counter()
+    for pid, path in head:
+        db.add_image_record(pid, path)
+    t_single = time.perf_counter() - t0
+    _, t_batch = _timed(db.add_image_records, tail)
+
+    probe = [names[i % len(names)] for i in range(lookups)]
+    t0 = time.perf_counter()
+    for name in probe:
+        db.person_exists(name)
+    t_exists = time.perf_counter() - t0
+    _, t_names = _timed(db.fetch_person_names)
+    image_rows, t_rows = _timed(db.fetch_image_rows)
+
+    return {
+        "people": len(names),
+        "images": len(image_rows),
+        "get_or_create_person_ms": 1000.0 * t_people / len(names),
+        "add_image_record_ms": 1000.0 * t_single / max(1, len(head)),
+        "add_image_records_per_s": _rate(len(tail), t_batch),
+        "person_exists_ms": 1000.0 * t_exists / lookups,
+        "fetch_person_names_ms": 1000.0 * t_names,
+        "fetch_image_rows_ms": 1000.0 * t_rows,
+    }
+
+def bench_detect(images):
+    """
+    detect_and_crop_face sur des images BGR → ms/image et taux de visages
+    trouvés, puis filtre qualité (face_quality.assess) sur le lot des crops.
+    """
+    faces = []
+    t0 = time.perf_counter()
+    for img in images:
+        face = detect_and_crop_face(img)
+        if face is not None:
+            faces.append(face)
+    elapsed = time.perf_counter() - t0
+    report = {
+        "images": len(images),
+        "detect_and_crop_ms": 1000.0 * elapsed / max(1, len(images)),
+        "found_ratio": len(faces) / max(1, len(images)),
+    }
+    if faces:
+        (accepted, _, _), t_quality = _timed(assess, np.stack(faces))
+        report["quality_face_ms"] = 1000.0 * t_quality / len(faces)
+        report["quality_accept_ratio"] = float(accepted.mean())
+    return report
+
+def crop_directory(entries, out_dir):
+    """Recadrer les visages d'un dossier local (comme l'import) → entrées des crops + mesures."""
+    crops, found = [], 0
+    t_detect = 0.0
+    for name, path in entries:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        face, dt = _timed(detect_and_crop_face, img)
+        t_detect += dt
+        if face is None:
+            continue
+        found += 1
+        person_dir = os.path.join(out_dir, name)
+        os.makedirs(person_dir, exist_ok=True)
+        crop_path = os.path.join(person_dir, f"{len(crops):06d}.png")
+        cv2.imwrite(crop_path, face)
+        crops.append((name, crop_path))
+    stats = {
+        "images": len(entries),
+        "detect_and_crop_ms": 1000.0 * t_detect / max(1, len(entries)),
+        "found_ratio": found / max(1, len(entries)),
+    }
+    return crops, stats
+
+def bench_train(enroll, n_images):
+    """train_and_save_model : cache de features vidé puis rempli."""
+    _, t_cold = _timed(enroll.train_and_save_model, use_cache=False)
+    _, t_warm = _timed(enroll.train_and_save_model, use_cache=True)
+    return {
+        "train_cold_s": t_cold,
+        "train_cold_per_s": _rate(n_images, t_cold),
+        "train_cached_s": t_warm,
+        "train_cached_per_s": _rate(n_images, t_warm),
+    }
+
+def bench_model_io():
+    """Sauvegarde/chargement du modèle YAML (OpenCV) et de la galerie binaire."""
+    from gallery_bin import load_gallery, save_gallery, write_opencv_model
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    _, t_yml_load = _timed(recognizer.read, MODEL_PATH)
+    (engine, labels_to_name), t_bin_load = _timed(load_gallery, GALLERY_PATH)
+
+    tmp_yml = os.path.join(DATA_DIR, "bench_model.yml")
+    tmp_bin = os.path.join(DATA_DIR, "bench_model.bin")
+    _, t_yml_save = _timed(write_opencv_model, tmp_yml, engine.histograms, engine.labels)
+    _, t_bin_save = _timed(save_gallery, tmp_bin, engine.histograms, engine.labels, labels_to_name)
+    _, t_cv_save = _timed(recognizer.save, tmp_yml)
+    for p in (tmp_yml, tmp_bin):
+        os.remove(p)
+
+    return {
+        "samples": int(engine.histograms.shape[0]),
+        "model_yml_mb": os.path.getsize(MODEL_PATH) / 1e6,
+        "model_bin_mb": os.path.getsize(GALLERY_PATH) / 1e6,
+        "yml_load_s": t_yml_load,
+        "yml_save_s": t_yml_save,
+        "opencv_save_s": t_cv_save,
+        "bin_load_s": t_bin_load,
+        "bin_save_s": t_bin_save,
+    }
+
+def bench_predict(queries, labels, batch=8):
+    """LBPH : recognizer.predict (OpenCV, un visage à la fois) vs NumpyLBPH.predict_batch."""
+    from gallery_bin import load_gallery
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(MODEL_PATH)
+    engine, _ = load_gallery(GALLERY_PATH)
+
+    t0 = time.perf_counter()
+    cv_preds = [recognizer.predict(q)[0] for q in queries]
+    t_cv = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    np_preds = []
+    for i in range(0, len(queries), batch):
+        np_preds.extend(p[0][0] for p in engine.predict_batch(queries[i:i + batch]))
+    t_np = time.perf_counter() - t0
+
+    return {
+        "queries": len(queries),
+        "opencv_predict_ms": 1000.0 * t_cv / max(1, len(queries)),
+        "numpy_predict_ms": 1000.0 * t_np / max(1, len(queries)),
+        "opencv_top1": float(np.mean(np.array(cv_preds) == labels)) if len(labels) else 0.0,
+        "numpy_top1": float(np.mean(np.array(np_preds) == labels)) if len(labels) else 0.0,
+    }
+
+def bench_startup(repeat=3):
+    """Démarrage à froid par script (meilleur de 'repeat' processus neufs)."""
+    from core import measure_cold_start, COLD_START_BUDGET
+    runs = measure_cold_start(repeat=repeat)
+    results = {}
+    for module, r in runs.items():
+        results[f"{module}_import_s"] = r["import_s"]
+        results[f"{module}_first_detect_s"] = r["first_detect_s"]
+    worst = max(r["total_s"] for r in runs.values())
+    results["cold_start_worst_s"] = worst
+    results["within_budget"] = worst <= COLD_START_BUDGET
+    return results
+
+def run(args):
+    """Exécuter les étapes demandées → rapport (dict sérialisable JSON)."""
+    stages = [s for s in STAGES if s not in set(args.skip)]
+    image_dir = os.path.abspath(args.image_dir) if args.image_dir else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="faceid_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)   # data/ (modèle, dataset, cache) isolé dans le dossier de travail
+    try:
+        import enroll_face_mysql as enroll
+        import training
+        import shards
+        if args.db == "sqlite":
+            sqlite_db.connect(os.path.join(workdir, "bench.sqlite"))
+            sqlite_db.install(enroll, training, shards)
+            db = sqlite_db
+        else:
+            import db_utils as db
+
+        results = {}
+        t0 = time.perf_counter()
+        if image_dir:
+            crops, results["detect"] = crop_directory(load_directory(image_dir), DATASET_DIR)
+            entries = crops
+        else:
+            entries = generate_dataset(DATASET_DIR, args.images, args.people, seed=args.seed)
+        results["dataset"] = {"images": len(entries), "people": len({n for n, _ in entries}),
+                              "source": image_dir or "synthetic",
+                              "prepare_s": time.perf_counter() - t0}
+        if not entries:
+            raise SystemExit("[ERREUR] Aucune image exploitable.")
+
+        # La DB est toujours remplie : l'entraînement lit persons/images
+        db_stats = bench_db(db, entries, single=min(args.single_inserts, len(entries)))
+        if "db" in stages:
+            results["db"] = db_stats
+        if "detect" in stages and not image_dir:
+            results["detect"] = bench_detect(generate_scenes(args.detect_samples, seed=args.seed + 1))
+        if "train" in stages or "model_io" in stages or "predict" in stages:
+            train = bench_train(enroll, len(entries))
+            if "train" in stages:
+                results["train"] = train
+        if "model_io" in stages:
+            results["model_io"] = bench_model_io()
+        if "predict" in stages:
+            rng = np.random.default_rng(args.seed)
+            ids = dict(db.fetch_people())
+            name_to_id = {name: pid for pid, name in ids.items()}
+            pick = rng.choice(len(entries), min(args.queries, len(entries)), replace=False)
+            queries = [cv2.imread(entries[i][1], cv2.IMREAD_GRAYSCALE) for i in pick]
+            labels = np.array([name_to_id[entries[i][0]] for i in pick], dtype=np.int32)
+            results["predict"] = bench_predict(queries, labels)
+        if "startup" in stages:
+            results["startup"] = bench_startup()
+    finally:
+        os.chdir(cwd)
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+
+def _direction(metric):
+    """+1 : plus grand = mieux, -1 : plus petit = mieux, 0 : non comparé."""
+    if metric.endswith("_per_s") or metric.endswith("_top1"):
+        return 1
+    if metric.endswith("_ms") or metric.endswith("_s") or metric.endswith("_mb"):
+        return -1
+    return 0
+
+def compare(report, baseline, tolerance=0.10):
+    """
+    Comparer deux rapports → liste de dicts {stage, metric, old, new, change,
+    regression}. change = variation relative (positive = plus lent / pire).
+    """
+    rows = []
+    for stage, metrics in report["results"].items():
+        old_metrics = baseline.get("results", {}).get(stage, {})
+        for metric, new in metrics.items():
+            old = old_metrics.get(metric)
+            sign = _direction(metric)
+            if sign == 0 or not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = -sign * (new - old) / abs(old)
+            rows.append({"stage": stage, "metric": metric, "old": old, "new": new,
+                         "change": change, "regression": change > tolerance})
+    return rows
+
+def print_report(report):
+    for stage, metrics in report["results"].items():
+        values = " | ".join(f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+        print(f"[PERF] {stage}: {values}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks hors-ligne (détection, entraînement, prédiction, modèle, DB) → JSON.")
+    parser.add_argument("--images", type=int, default=1000, help="Nombre d'images synthétiques (défaut: 1000)")
+    parser.add_argument("--people", type=int, default=50, help="Nombre de personnes synthétiques (défaut: 50)")
+    parser.add_argument("--image-dir", help="Dossier local <Nom>/* (photos brutes) au lieu des images synthétiques")
+    parser.add_argument("--db", choices=("sqlite", "mysql"), default="sqlite",
+                        help="sqlite: base temporaire (défaut) | mysql: db_utils/DB_CONFIG (utiliser une base dédiée)")
+    parser.add_argument("--detect-samples", type=int, default=50, help="Scènes synthétiques pour la détection (défaut: 50)")
+    parser.add_argument("--queries", type=int, default=100, help="Visages requêtes pour predict (défaut: 100)")
+    parser.add_argument("--single-inserts", type=int, default=200,
+                        help="Images insérées une à une (add_image_record) avant le lot (défaut: 200)")
+    parser.add_argument("--skip", nargs="*", default=[], choices=STAGES, help="Étapes à ignorer")
+    parser.add_argument("--seed", type=int, default=0, help="Graine des données synthétiques")
+    parser.add_argument("--workdir", help="Dossier de travail (défaut: temporaire, supprimé à la fin)")
+    parser.add_argument("--keep", action="store_true", help="Conserver le dossier de travail temporaire")
+    parser.add_argument("--out", help="Écrire le rapport JSON dans ce fichier (défaut: sortie standard)")
+    parser.add_argument("--compare", help="Rapport JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Avec --compare : dégradation relative tolérée (défaut: 0.10)")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[OK] Rapport → {args.out}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.tolerance)
+        print("| Étape | Mesure | Référence | Actuel | Variation |")
+        print("|---|---|---|---|---|")
+        for r in rows:
+            flag = " ⚠️" if r["regression"] else ""
+            print(f"| {r['stage']} | {r['metric']} | {r['old']:.4g} | {r['new']:.4g} | {r['change'] * 100:+.1f}%{flag} |")
+        regressions = [r for r in rows if r["regression"]]
+        if regressions:
+            print(f"[WARN] {len(regressions)} régression(s) au-delà de {args.tolerance * 100:.0f}%")
+            sys.exit(1)
+        print("[OK] Aucune régression")
+
+if __name__ == "__main__":
+    main()
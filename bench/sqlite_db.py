@@ -0,0 +1,127 @@
+# bench/sqlite_db.py
+# ------------------------------------------------------------
+# Remplaçant SQLite de db_utils pour les benchmarks (aucun serveur MySQL) :
+# mêmes fonctions, mêmes tables persons/images que sql/schema.sql.
+# - connect(path): ouvrir la base (":memory:" ou fichier) et créer le schéma
+# - install(*modules): rebrancher les fonctions db_utils importées par
+#   les scripts (from db_utils import ...) sur cette base
+# ------------------------------------------------------------
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(100) UNIQUE NOT NULL,
+  group_name VARCHAR(64) NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  person_id INT NOT NULL,
+  path VARCHAR(255) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS recognition_events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  person_id INT NULL,
+  source VARCHAR(64) NOT NULL,
+  confidence FLOAT NOT NULL,
+  seen_at TIMESTAMP NOT NULL,
+  FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE SET NULL
+);
+"""
+
+DB_BATCH_SIZE = 1000
+
+_CONN = None
+_LOCK = threading.Lock()
+
+def connect(path=":memory:"):
+    """Ouvrir (ou remplacer) la connexion partagée et créer le schéma."""
+    global _CONN
+    if _CONN is not None:
+        _CONN.close()
+    _CONN = sqlite3.connect(path, check_same_thread=False)
+    _CONN.executescript(SCHEMA)
+    _CONN.commit()
+    return _CONN
+
+@contextmanager
+def db_session():
+    """Même contrat que db_utils.db_session (commit / rollback)."""
+    with _LOCK:
+        try:
+            yield _CONN
+            _CONN.commit()
+        except Exception:
+            _CONN.rollback()
+            raise
+
+def get_or_create_person_id(name: str) -> int:
+    with db_session() as conn:
+        row = conn.execute("SELECT id FROM persons WHERE name=?", (name,)).fetchone()
+        if row:
+            return row[0]
+        return conn.execute("INSERT INTO persons(name) VALUES(?)", (name,)).lastrowid
+
+def add_image_record(person_id: int, path: str) -> int:
+    with db_session() as conn:
+        return conn.execute("INSERT INTO images(person_id, path) VALUES(?, ?)",
+                            (person_id, path)).lastrowid
+
+def add_image_records(rows, batch_size: int = DB_BATCH_SIZE):
+    rows = list(rows)
+    if not rows:
+        return
+    with db_session() as conn:
+        for i in range(0, len(rows), batch_size):
+            conn.executemany("INSERT INTO images(person_id, path) VALUES(?, ?)",
+                             rows[i:i + batch_size])
+
+def person_exists(name: str) -> bool:
+    with db_session() as conn:
+        return conn.execute("SELECT 1 FROM persons WHERE name=? LIMIT 1", (name,)).fetchone() is not None
+
+def fetch_person_names():
+    with db_session() as conn:
+        return [r[0] for r in conn.execute("SELECT name FROM persons ORDER BY id")]
+
+def fetch_people():
+    with db_session() as conn:
+        return conn.execute("SELECT id, name FROM persons ORDER BY id").fetchall()
+
+def fetch_people_groups():
+    with db_session() as conn:
+        return conn.execute("SELECT id, name, group_name FROM persons ORDER BY id").fetchall()
+
+def fetch_people_and_images():
+    with db_session() as conn:
+        people = conn.execute("SELECT id, name FROM persons").fetchall()
+        images = conn.execute("SELECT person_id, path FROM images").fetchall()
+        return people, images
+
+def fetch_image_rows():
+    with db_session() as conn:
+        return conn.execute("SELECT id, person_id, path FROM images ORDER BY id").fetchall()
+
+def add_recognition_events(rows, batch_size: int = DB_BATCH_SIZE):
+    rows = list(rows)
+    if not rows:
+        return
+    with db_session() as conn:
+        for i in range(0, len(rows), batch_size):
+            conn.executemany("INSERT INTO recognition_events(person_id, source, confidence, seen_at) "
+                             "VALUES(?, ?, ?, ?)", rows[i:i + batch_size])
+
+API = ("get_or_create_person_id", "add_image_record", "add_image_records", "person_exists",
+       "fetch_person_names", "fetch_people", "fetch_people_groups", "fetch_people_and_images", "fetch_image_rows",
+       "add_recognition_events")
+
+def install(*modules):
+    """Remplacer, dans chaque module, les fonctions db_utils qu'il a importées."""
+    for module in modules:
+        for name in API:
+            if hasattr(module, name):
+                setattr(module, name, globals()[name])
@@ -0,0 +1,100 @@
+# bench/synthetic.py
+# ------------------------------------------------------------
+# Données de benchmark :
+# - visages synthétiques en niveaux de gris (ovale, yeux, sourcils, nez,
+#   bouche, texture) : géométrie fixe par personne, variations par image
+#   (décalage, rotation, luminosité, bruit)
+# - scènes BGR (visage collé sur un fond) pour chronométrer la détection
+# - ou lecture d'un dossier local <Nom>/* (même structure que people/)
+# ------------------------------------------------------------
+import os
+
+import cv2
+import numpy as np
+
+ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+def person_params(rng):
+    """Géométrie et texture propres à une personne."""
+    return {
+        "axes": (int(rng.integers(62, 80)), int(rng.integers(78, 96))),
+        "skin": int(rng.integers(120, 200)),
+        "eye_y": int(rng.integers(74, 92)),
+        "eye_dx": int(rng.integers(26, 40)),
+        "eye_r": int(rng.integers(6, 11)),
+        "brow": int(rng.integers(10, 18)),
+        "nose": int(rng.integers(18, 32)),
+        "mouth_y": int(rng.integers(136, 152)),
+        "mouth_w": int(rng.integers(18, 34)),
+        "texture": cv2.resize(rng.normal(0, 12, (12, 12)).astype(np.float32), (200, 200),
+                              interpolation=cv2.INTER_CUBIC),
+    }
+
+def render_face(p, rng, size=200):
+    """Visage 200x200 uint8 d'une personne, avec variations d'acquisition."""
+    img = np.full((200, 200), int(rng.integers(40, 90)), dtype=np.float32)
+    cx = 100
+    cv2.ellipse(img, (cx, 104), p["axes"], 0, 0, 360, p["skin"], -1)
+    img += p["texture"]
+    for side in (-1, 1):
+        ex = cx + side * p["eye_dx"]
+        cv2.circle(img, (ex, p["eye_y"]), p["eye_r"] + 3, p["skin"] + 40, -1)
+        cv2.circle(img, (ex, p["eye_y"]), p["eye_r"], 25, -1)
+        cv2.line(img, (ex - p["brow"], p["eye_y"] - 16), (ex + p["brow"], p["eye_y"] - 18), 40, 3)
+    cv2.line(img, (cx, p["eye_y"] + 8), (cx - 4, p["eye_y"] + 8 + p["nose"]), p["skin"] - 50, 2)
+    cv2.ellipse(img, (cx, p["mouth_y"]), (p["mouth_w"], 8), 0, 0, 180, 50, 3)
+
+    # Variations par image : rotation/décalage, luminosité, bruit
+    m = cv2.getRotationMatrix2D((100, 100), float(rng.uniform(-6, 6)), float(rng.uniform(0.95, 1.05)))
+    m[:, 2] += rng.uniform(-4, 4, 2)
+    img = cv2.warpAffine(img, m, (200, 200), borderMode=cv2.BORDER_REPLICATE)
+    img = img * rng.uniform(0.85, 1.15) + rng.normal(0, 6, img.shape)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    if size != 200:
+        img = cv2.resize(img, (size, size))
+    return img
+
+def render_scene(face, rng, width=640, height=480):
+    """Scène BGR : le visage (agrandi) collé sur un fond bruité."""
+    scene = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (0, 0), 6)
+    side = int(min(width, height) * rng.uniform(0.35, 0.6))
+    x = int(rng.integers(0, width - side))
+    y = int(rng.integers(0, height - side))
+    scene[y:y + side, x:x + side] = cv2.resize(face, (side, side))
+    return cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+
+def generate_dataset(root, n_images, n_people, size=200, seed=0):
+    """
+    Écrire n_images visages répartis sur n_people personnes dans
+    root/<Pxxxxx>/<i>.png → liste [(nom, chemin), ...] (ordre d'écriture).
+    """
+    rng = np.random.default_rng(seed)
+    n_people = max(1, min(n_people, n_images))
+    people = [person_params(rng) for _ in range(n_people)]
+    entries = []
+    for i in range(n_images):
+        pid = i % n_people
+        name = f"P{pid:05d}"
+        person_dir = os.path.join(root, name)
+        os.makedirs(person_dir, exist_ok=True)
+        path = os.path.join(person_dir, f"{i:06d}.png")
+        cv2.imwrite(path, render_face(people[pid], rng, size))
+        entries.append((name, path))
+    return entries
+
+def generate_scenes(n, seed=1):
+    """n scènes BGR 640x480 (visages synthétiques) pour la détection."""
+    rng = np.random.default_rng(seed)
+    return [render_scene(render_face(person_params(rng), rng), rng) for _ in range(n)]
+
+def load_directory(root):
+    """Dossier local root/<Nom>/* → liste [(nom, chemin), ...] triée."""
+    entries = []
+    for name in sorted(os.listdir(root)):
+        person_dir = os.path.join(root, name)
+        if not os.path.isdir(person_dir):
+            continue
+        for f in sorted(os.listdir(person_dir)):
+            if os.path.splitext(f)[1].lower() in ALLOWED_EXT:
+                entries.append((name, os.path.join(person_dir, f)))
+    return entries
@@ -1,50 +1,76 @@
-import cv2, time
+# cam_fix.py
+# ------------------------------------------------------------
+# Recherche de la meilleure combinaison caméra : index × backend ×
+# résolution × FOURCC (camera_probe.scan_cameras, index sondés en
+# parallèle, chaque essai borné en temps). La meilleure combinaison est
+# mémorisée (data/camera_profile.json) : recognize_live_mysql.py l'essaie
+# en premier au démarrage suivant.
+#   python cam_fix.py
+#   python cam_fix.py --indices 0 1 --budget 2 --no-show
+#   python cam_fix.py --simulate 0=black 1=ok 2=slow
+# ------------------------------------------------------------
+import time
+import argparse
+
+import cv2
+
+from camera_probe import PROFILE_PATH, scan_cameras, simulated_factory, try_config, save_profile
 
 APIS = [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
-IDX  = [0,1,2,3]
-RES  = [(640,480),(1280,720)]
-FOUR = [None, 'MJPG', 'YUY2'] 
-
-def try_combo(i, api, res, four):
-    cap = cv2.VideoCapture(i, api)
-    if not cap.isOpened():
-        return (False, 0, None)
-    w,h = res
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH,  w)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-    if four:
-        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*four))
-    ok_count = 0
-    t0 = time.time()
-    for _ in range(30):
-        ok, frame = cap.read()
-        if ok and frame is not None:
-            ok_count += 1
-        if time.time() - t0 > 3:
-            break
-    # خزن فريم باش نعرضوه لحظة
-    last = frame if ok_count else None
-    cap.release()
-    return (ok_count>0, ok_count, last)
-
-best = None
-for api in APIS:
-    for i in IDX:
-        for res in RES:
-            for four in FOUR:
-                ok, cnt, last = try_combo(i, api, res, four)
-                print(f"idx={i}, api={api}, res={res}, fourcc={four} -> frames_ok={cnt}")
-                if ok and (best is None or cnt > best[0]):
-                    best = (cnt, i, api, res, four, last)
-
-print("\n=== RESULT ===")
-if best:
-    cnt,i,api,res,four,last = best
-    print(f"USE -> index={i}, api={api}, res={res}, fourcc={four}, frames_ok={cnt}")
-    if last is not None:
-        cv2.imshow(f"OK index={i} api={api} res={res} four={four}", last)
-        cv2.waitKey(1500)
-        cv2.destroyAllWindows()
-else:
-    print("Aucune combinaison ناجحة. سدّ أي برنامج شاد الكاميرا، وتأكد من صلاحيات Windows.")
+IDX = [0, 1, 2, 3]
+RES = [(640, 480), (1280, 720)]
+FOUR = [None, 'MJPG', 'YUY2']
+
+def main():
+    parser = argparse.ArgumentParser(description="Trouver et mémoriser la meilleure combinaison caméra.")
+    parser.add_argument("--indices", type=int, nargs="+", default=IDX, help="Index à tester (défaut: 0 1 2 3)")
+    parser.add_argument("--budget", type=float, default=3.0, help="Durée max par combinaison en s (défaut: 3)")
+    parser.add_argument("--frames", type=int, default=30, help="Frames lus par combinaison (défaut: 30)")
+    parser.add_argument("--no-show", action="store_true", help="Ne pas afficher un frame de la combinaison retenue")
+    parser.add_argument("--simulate", nargs="+", metavar="IDX=COMPORTEMENT",
+                        help="Caméras simulées (ok, slow, black, fail, noread), ex: 0=fail 1=ok")
+    args = parser.parse_args()
+
+    factory = cv2.VideoCapture
+    indices = args.indices
+    if args.simulate:
+        devices = {int(k): v for k, v in (item.split("=", 1) for item in args.simulate)}
+        factory = simulated_factory(devices)
+        indices = sorted(devices)
+
+    t0 = time.perf_counter()
+    results = scan_cameras(indices, APIS, RES, FOUR, budget=args.budget,
+                           frames_needed=args.frames, capture_factory=factory)
+    for r in results:
+        print(f"idx={r['index']}, api={r['api_name']}, res={tuple(r['requested'])}, fourcc={r['fourcc']} "
+              f"-> frames_ok={r['frames_ok']} ({r['elapsed_s']:.2f}s)")
+    print(f"[INFO] {len(results)} combinaison(s) en {time.perf_counter() - t0:.1f}s")
+
+    print("\n=== RESULT ===")
+    # Plus de frames valides dans le budget = meilleure combinaison
+    best = max((r for r in results if r["frames_ok"] > 0), key=lambda r: r["frames_ok"], default=None)
+    if best is None:
+        print("Aucune combinaison fonctionnelle. Fermez toute application qui utilise la caméra "
+              "et vérifiez les autorisations Windows.")
+        return
+    w, h = best["requested"]
+    config = {"api": best["api"], "name": best["config"], "width": w, "height": h,
+              "fps": 30, "fourcc": best["fourcc"], "buffer": 1}
+    print(f"USE -> index={best['index']}, api={best['api_name']}, res={(w, h)}, "
+          f"fourcc={best['fourcc']}, frames_ok={best['frames_ok']}")
+    if not args.simulate:
+        save_profile(best["index"], config)
+        print(f"[OK] Profil mémorisé → {PROFILE_PATH}")
+
+    if not args.no_show:
+        cap, _ = try_config(best["index"], config, args.budget, 1, factory)
+        if cap is not None:
+            ok, frame = cap.read()
+            cap.release()
+            if ok:
+                cv2.imshow(f"OK index={best['index']} {config['name']}", frame)
+                cv2.waitKey(1500)
+                cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# camera_probe.py
+# ------------------------------------------------------------
+# Ouverture rapide de la caméra :
+# - le dernier profil qui a fonctionné (index, backend, résolution, FOURCC)
+#   est mémorisé dans data/camera_profile.json et essayé en premier, avec un
+#   budget court (FAST_BUDGET) : échec rapide si la caméra a changé
+# - sinon sondage complet : un thread par index de caméra, les configs d'un
+#   même index restant testées l'une après l'autre (un périphérique ne
+#   s'ouvre pas deux fois) ; l'index le plus bas qui fonctionne gagne ;
+#   à l'ouverture, un frame valide suffit, OPEN_BUDGET par config et
+#   OPEN_DEADLINE pour tout le sondage (la dernière config reçoit le reste
+#   du délai, pour une caméra lente) : ~4 s au pire au premier démarrage
+# - chaque essai est borné en temps (pas de sleep entre lectures réussies) ;
+#   un frame noir (écart-type <= MIN_STD) ne compte pas
+# - scan_cameras : grille complète index × backend × résolution × FOURCC
+#   (diagnostic, cam_fix.py), parallèle par index
+# - SimulatedCapture : VideoCapture de substitution (lente, frames noirs,
+#   ouverture impossible, lecture en échec) pour tester sans matériel
+# Exemples :
+#   python camera_probe.py --indices 0 1 2
+#   python camera_probe.py --simulate 0=fail 1=black 2=slow 3=ok
+# ------------------------------------------------------------
+import os
+import time
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from model_store import atomic_write_json
+
+DATA_DIR = "data"
+PROFILE_PATH = os.path.join(DATA_DIR, "camera_profile.json")
+
+API_NAMES = {cv2.CAP_DSHOW: "DirectShow", cv2.CAP_MSMF: "MediaFoundation", cv2.CAP_ANY: "Auto"}
+
+# Configurations testées dans l'ordre pour un index (caméras frontales)
+CONFIGS = [
+    {"api": cv2.CAP_DSHOW, "name": "DirectShow", "width": 640, "height": 480, "fps": 30, "fourcc": None, "buffer": 1},
+    {"api": cv2.CAP_DSHOW, "name": "DirectShow+MJPG", "width": 640, "height": 480, "fps": 30, "fourcc": "MJPG", "buffer": 1},
+    {"api": cv2.CAP_MSMF, "name": "MediaFoundation", "width": 640, "height": 480, "fps": 30, "fourcc": None, "buffer": 1},
+    {"api": cv2.CAP_DSHOW, "name": "DirectShow_LowRes", "width": 320, "height": 240, "fps": 30, "fourcc": None, "buffer": 1},
+    {"api": cv2.CAP_ANY, "name": "Auto", "width": 640, "height": 480, "fps": 15, "fourcc": None, "buffer": 2},
+]
+
+FRAMES_NEEDED = 3      # frames valides (non noirs) pour accepter une config
+MIN_STD = 5.0          # écart-type minimal d'un frame "avec du contenu"
+FAST_BUDGET = 1.0      # s, profil mémorisé
+OPEN_BUDGET = 0.75     # s, chaque config du sondage à l'ouverture (open_camera)
+OPEN_FRAMES = 1        # frames valides exigés à l'ouverture
+OPEN_DEADLINE = 4.0    # s, tout le sondage à l'ouverture (dernière config : >= 1 s)
+PROBE_BUDGET = 2.0     # s, chaque config du diagnostic (scan_cameras)
+
+class SimulatedCapture:
+    """
+    Substitut de cv2.VideoCapture pour les tests :
+      "ok"    : frames valides immédiatement
+      "slow"  : ouverture et frames lents (open_delay / read_delay) ;
+                sinon un frame par 1/fps, comme une vraie caméra
+      "black" : s'ouvre mais ne renvoie que des frames noirs
+      "fail"  : ne s'ouvre pas
+      "noread": s'ouvre mais read() échoue
+    """
+
+    def __init__(self, behavior="ok", width=640, height=480, fps=30.0,
+                 open_delay=0.0, read_delay=0.0, seed=0):
+        self.behavior = behavior
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: float(width), cv2.CAP_PROP_FRAME_HEIGHT: float(height),
+                      cv2.CAP_PROP_FPS: float(fps)}
+        self.read_delay = read_delay or (0.4 if behavior == "slow" else 1.0 / fps)
+        time.sleep(open_delay or (0.5 if behavior == "slow" else 0.0))
+        self._opened = behavior != "fail"
+        self._rng = np.random.default_rng(seed)
+        self.reads = 0
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS):
+            self.props[prop] = float(value)
+        return self._opened
+
+    def get(self, prop):
+        return self.props.get(prop, 0.0)
+
+    def read(self):
+        self.reads += 1
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        if not self._opened or self.behavior == "noread":
+            return False, None
+        shape = (int(self.props[cv2.CAP_PROP_FRAME_HEIGHT]), int(self.props[cv2.CAP_PROP_FRAME_WIDTH]), 3)
+        if self.behavior == "black":
+            return True, np.zeros(shape, dtype=np.uint8)
+        return True, self._rng.integers(0, 255, shape, dtype=np.uint8)
+
+    def release(self):
+        self._opened = False
+
+def simulated_factory(devices):
+    """
+    devices = {index: comportement} → fabrique (index, api) -> SimulatedCapture,
+    à passer en 'capture_factory'. Un index absent se comporte comme "fail".
+    """
+    def factory(index, api=cv2.CAP_ANY):
+        return SimulatedCapture(devices.get(index, "fail"))
+    return factory
+
+def _frame_ok(frame):
+    return frame is not None and frame.size > 0 and float(np.std(frame)) > MIN_STD
+
+def try_config(index, config, budget=PROBE_BUDGET, frames_needed=FRAMES_NEEDED,
+               capture_factory=cv2.VideoCapture):
+    """
+    Ouvrir 'index' avec 'config' et lire jusqu'à 'frames_needed' frames
+    valides en au plus 'budget' secondes.
+    Retourne (cap|None, résultat) ; cap ouvert seulement en cas de succès.
+    """
+    t0 = time.perf_counter()
+    result = {"index": index, "config": config["name"], "ok": False, "frames_ok": 0,
+              "black": 0, "failed_reads": 0, "elapsed_s": 0.0}
+    cap = None
+    try:
+        cap = capture_factory(index, config["api"])
+        if not cap.isOpened():
+            result["error"] = "ne s'ouvre pas"
+            cap.release()
+            return None, result
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, config["width"])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config["height"])
+        cap.set(cv2.CAP_PROP_FPS, config["fps"])
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, config.get("buffer", 1))
+        cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.75)
+        cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
+        if config.get("fourcc"):
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config["fourcc"]))
+
+        deadline = t0 + budget
+        while time.perf_counter() < deadline:
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                result["failed_reads"] += 1
+                time.sleep(0.02)            # le pilote n'a pas encore de frame
+                continue
+            if not _frame_ok(frame):
+                result["black"] += 1        # exposition en cours de réglage
+                continue
+            result["frames_ok"] += 1
+            if result["frames_ok"] >= frames_needed:
+                result.update(ok=True, width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                              height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                              fps=round(float(cap.get(cv2.CAP_PROP_FPS)), 1))
+                return cap, result
+        result["error"] = "budget dépassé"
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        result["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    if cap is not None:
+        cap.release()
+    return None, result
+
+def load_profile(path=PROFILE_PATH):
+    """Dernier profil qui a fonctionné, ou None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_profile(index, config, path=PROFILE_PATH):
+    atomic_write_json(path, {"index": index, "config": config})
+
+def _probe_index(index, configs, budget, capture_factory, stop, deadline=None,
+                 frames_needed=FRAMES_NEEDED):
+    """
+    Configs d'un index testées dans l'ordre → (cap|None, config|None, résultats).
+    'deadline' (perf_counter) : chaque essai est raccourci pour la respecter
+    (la dernière config dispose de tout le temps restant), les configs
+    restantes sont abandonnées une fois atteinte.
+    """
+    results = []
+    for pos, config in enumerate(configs):
+        if stop.is_set():
+            break
+        config_budget = budget
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            config_budget = remaining if pos == len(configs) - 1 else min(budget, remaining)
+            if config_budget <= 0:
+                results.append({"index": index, "config": config["name"], "ok": False, "frames_ok": 0,
+                                "black": 0, "failed_reads": 0, "elapsed_s": 0.0,
+                                "error": "délai global dépassé"})
+                break
+        cap, result = try_config(index, config, config_budget, frames_needed, capture_factory)
+        results.append(result)
+        if cap is not None:
+            return cap, config, results
+    return None, None, results
+
+def _release_probe(future):
+    cap = future.result()[0]
+    if cap is not None:
+        cap.release()
+
+def open_camera(indices=(0,), configs=CONFIGS, profile_path=PROFILE_PATH, fast_budget=FAST_BUDGET,
+                budget=OPEN_BUDGET, deadline=OPEN_DEADLINE, frames_needed=OPEN_FRAMES,
+                capture_factory=cv2.VideoCapture, verbose=True):
+    """
+    Ouvrir la première caméra utilisable → (cap, index, config) ou (None, None, None).
+    1) profil mémorisé, budget court ; 2) sondage complet parallèle par index,
+    'budget' s par config et 'deadline' s au total (None = sans limite globale),
+    'frames_needed' frames valides par essai.
+    Le profil gagnant est mémorisé pour le prochain démarrage.
+    """
+    profile = load_profile(profile_path) if profile_path else None
+    if profile is not None:
+        cap, result = try_config(profile["index"], profile["config"], fast_budget,
+                                 frames_needed, capture_factory)
+        if cap is not None:
+            if verbose:
+                print(f"[INFO] Profil caméra mémorisé OK: idx={profile['index']} {profile['config']['name']} "
+                      f"{result['width']}x{result['height']} ({result['elapsed_s'] * 1000:.0f} ms)")
+            return cap, profile["index"], profile["config"]
+        if verbose:
+            print(f"[INFO] Profil caméra mémorisé en échec ({result.get('error')}) → sondage complet")
+
+    stop = threading.Event()
+    until = time.perf_counter() + deadline if deadline else None
+    pool = ThreadPoolExecutor(max_workers=max(1, len(indices)), thread_name_prefix="cam-probe")
+    futures = [pool.submit(_probe_index, i, configs, budget, capture_factory, stop, until, frames_needed)
+               for i in indices]
+    chosen, pos = (None, None, None), len(futures)
+    try:
+        for pos, (index, future) in enumerate(zip(indices, futures)):
+            cap, config, results = future.result()
+            if verbose:
+                for r in results:
+                    status = "OK" if r["ok"] else r.get("error", "échec")
+                    print(f"[DEBUG] idx={index} {r['config']}: {status} "
+                          f"(frames {r['frames_ok']}, noirs {r['black']}, {r['elapsed_s'] * 1000:.0f} ms)")
+            if cap is not None:
+                chosen = (cap, index, config)
+                break
+    finally:
+        # Index moins prioritaires : essais interrompus, caméras ouvertes libérées
+        # en arrière-plan (sans attendre leur fin)
+        stop.set()
+        for future in futures[pos + 1:]:
+            future.add_done_callback(_release_probe)
+        pool.shutdown(wait=False)
+
+    cap, index, config = chosen
+    if cap is not None and profile_path:
+        save_profile(index, config, profile_path)
+    return chosen
+
+def scan_cameras(indices=range(5), apis=(cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY),
+                 resolutions=((640, 480),), fourccs=(None,), budget=PROBE_BUDGET,
+                 frames_needed=1, capture_factory=cv2.VideoCapture):
+    """
+    Sonder toutes les combinaisons (parallèle par index, séquentiel dans un
+    index) → liste de résultats (dicts, un par combinaison, ordre stable).
+    """
+    def grid(index):
+        out = []
+        for api in apis:
+            for (w, h) in resolutions:
+                for four in fourccs:
+                    config = {"api": api, "name": f"{API_NAMES.get(api, api)} {w}x{h}" + (f" {four}" if four else ""),
+                              "width": w, "height": h, "fps": 30, "fourcc": four, "buffer": 1}
+                    cap, result = try_config(index, config, budget, frames_needed, capture_factory)
+                    if cap is not None:
+                        cap.release()
+                    result.update(api=api, api_name=API_NAMES.get(api, str(api)), fourcc=four,
+                                  requested=[w, h])
+                    out.append(result)
+        return out
+
+    indices = list(indices)
+    with ThreadPoolExecutor(max_workers=max(1, len(indices)), thread_name_prefix="cam-scan") as pool:
+        return [r for rows in pool.map(grid, indices) for r in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description="Ouverture rapide de la caméra (profil mémorisé + sondage parallèle).")
+    parser.add_argument("--indices", type=int, nargs="+", default=[0], help="Index de caméra à sonder (défaut: 0)")
+    parser.add_argument("--forget", action="store_true", help="Ignorer le profil mémorisé")
+    parser.add_argument("--simulate", nargs="+", metavar="IDX=COMPORTEMENT",
+                        help="Caméras simulées (ok, slow, black, fail, noread), ex: 0=fail 1=ok")
+    args = parser.parse_args()
+
+    factory = cv2.VideoCapture
+    profile_path = None if args.forget else PROFILE_PATH
+    indices = args.indices
+    if args.simulate:
+        devices = {int(k): v for k, v in (item.split("=", 1) for item in args.simulate)}
+        factory = simulated_factory(devices)
+        indices = sorted(devices)
+        profile_path = None          # ne pas écraser le profil réel
+
+    t0 = time.perf_counter()
+    cap, index, config = open_camera(indices, profile_path=profile_path, capture_factory=factory)
+    elapsed = time.perf_counter() - t0
+    if cap is None:
+        print(f"[ERREUR] Aucune caméra utilisable ({elapsed:.2f}s)")
+        return
+    print(f"[OK] Caméra idx={index} {config['name']} ouverte en {elapsed:.2f}s")
+    cap.release()
+
+if __name__ == "__main__":
+    main()
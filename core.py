@@ -0,0 +1,233 @@
+# core.py
+# ------------------------------------------------------------
+# Socle commun des scripts (enrôlement, import, reconnaissance) :
+# - chemins data/ partagés
+# - singletons paresseux, créés au premier appel puis réutilisés :
+#   * get_cascade() : détecteur Haar (un par thread, CascadeClassifier
+#     n'est pas thread-safe)
+#   * get_recognizer() : modèle + labels, chargés une fois par processus
+#   * pool MySQL : db_utils.get_pool() (driver importé au premier appel)
+# - detect_and_crop_face / crop_largest_face (enrôlement / import),
+#   load_engine (reconnaissance)
+# Aucun effet de bord à l'import (ni chargement, ni dossier créé, ni
+# affichage) : une commande courte ou un worker ne paie que ce qu'il utilise.
+# Budget de démarrage à froid (import + première détection, processus neuf) :
+#   python core.py --cold-start
+#   python core.py --cold-start --budget 0.8 --modules enroll_face_mysql
+# ------------------------------------------------------------
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+import subprocess
+
+import cv2
+
+from lbph_numpy import NumpyLBPH
+from gallery_bin import load_gallery
+from face_detect import detect_scaled
+
+# --- Chemins ---
+DATA_DIR = "data"
+DATASET_DIR = os.path.join(DATA_DIR, "dataset")
+MODEL_PATH = os.path.join(DATA_DIR, "model.yml")
+LABELS_PATH = os.path.join(DATA_DIR, "labels.json")
+GALLERY_PATH = os.path.join(DATA_DIR, "model.bin")   # galerie binaire (memmap), moteur NumPy
+IVF_PATH = os.path.join(DATA_DIR, "model.ivf")       # index ANN optionnel (ann_index.py)
+
+HAAR_CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+# Largeur de détection (px) des photos d'enrôlement / d'import : réduites
+# avant detectMultiScale (0 = pleine résolution). Voir face_detect.py --images.
+DETECT_WIDTH = 1024
+
+# Démarrage à froid : import du script + première détection (s)
+COLD_START_BUDGET = 1.0
+COLD_START_MODULES = ("enroll_face_mysql", "import_people_mysql", "recognize_live_mysql")
+
+_CASCADE_LOCAL = threading.local()
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+def new_cascade(path=HAAR_CASCADE_PATH):
+    """Nouveau détecteur Haar ; RuntimeError si le fichier XML est introuvable."""
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise RuntimeError(f"Impossible de charger le détecteur Haar: {path}")
+    return cascade
+
+def get_cascade():
+    """Détecteur Haar du thread courant, chargé au premier appel."""
+    cascade = getattr(_CASCADE_LOCAL, "cascade", None)
+    if cascade is None:
+        cascade = _CASCADE_LOCAL.cascade = new_cascade()
+    return cascade
+
+def crop_largest_face(img_bgr, size=(200, 200), detect_width=DETECT_WIDTH):
+    """
+    Détecter le plus grand visage dans l'image → (crop gris 'size', boîte
+    (x, y, w, h) en pixels d'origine), ou (None, None).
+    La détection tourne sur une copie réduite à 'detect_width' pixels de large
+    (0 = pleine résolution) ; le recadrage se fait dans les pixels d'origine.
+    """
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    faces = detect_scaled(get_cascade(), gray, detect_width,
+                          scaleFactor=1.1, minNeighbors=5, minSize=(80, 80))
+    if len(faces) == 0:
+        return None, None
+    # Choisir le plus grand visage (souvent le plus pertinent)
+    x, y, w, h = sorted(faces, key=lambda b: b[2] * b[3], reverse=True)[0]
+    face = gray[y:y + h, x:x + w]
+    return cv2.resize(face, size), (x, y, w, h)
+
+def detect_and_crop_face(img_bgr, size=(200, 200), detect_width=DETECT_WIDTH):
+    """
+    Détecter le plus grand visage dans l'image, retourner une version
+    recadrée en niveaux de gris, redimensionnée à 'size' (None si aucun).
+    """
+    return crop_largest_face(img_bgr, size, detect_width)[0]
+
+def crop_files(person_dir, name):
+    """Crops '<name>_NNN.png|jpg' de 'person_dir' → {numéro: chemin} ({} si absent)."""
+    pattern = re.compile(rf"{re.escape(name)}_(\d+)\.(?:png|jpe?g)$", re.IGNORECASE)
+    try:
+        entries = os.listdir(person_dir)
+    except OSError:
+        return {}
+    crops = {}
+    for f in entries:
+        m = pattern.match(f)
+        if m:
+            crops[int(m.group(1))] = os.path.join(person_dir, f)
+    return crops
+
+def next_crop_number(person_dir, name):
+    """
+    Numéro du prochain crop '<name>_NNN' : plus grand numéro existant + 1.
+    (Compter les fichiers réutiliserait un numéro après une suppression et
+    écraserait le crop d'une autre photo.)
+    """
+    return max(crop_files(person_dir, name), default=0) + 1
+
+def load_labels(path=LABELS_PATH):
+    """Lire labels.json → dict {label_num: nom} (clés normalisées en int)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+def load_model_and_labels():
+    """
+    Charger le modèle LBPH (opencv-contrib) + le mapping label->nom depuis labels.json.
+    """
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(MODEL_PATH)
+    return recognizer, load_labels()
+
+def load_gallery_and_labels():
+    """
+    Charger la galerie binaire (gallery_bin, numpy.memmap sans copie) →
+    (NumpyLBPH, labels_to_name). Quasi instantané, même pour une grande galerie.
+    """
+    return load_gallery(GALLERY_PATH)
+
+def load_numpy_engine(recognizer):
+    """
+    Moteur LBPH NumPy (lbph_numpy.NumpyLBPH) construit depuis la galerie du
+    reconnaisseur OpenCV chargé : prédiction groupée de tous les visages
+    d'un frame, résultats identiques à recognizer.predict().
+    """
+    return NumpyLBPH.from_opencv(recognizer)
+
+def load_engine(engine="opencv", ann_probes=0, shards=None):
+    """
+    Charger (recognizer, labels_to_name) pour le moteur demandé :
+    opencv → model.yml ; numpy → model.bin (ou model.yml converti), enveloppé
+    dans l'index IVF si ann_probes > 0 ; shards → data/shards/ (tous, ou
+    seulement ceux listés dans 'shards').
+    Toujours une nouvelle lecture (rechargement à chaud) ; voir get_recognizer.
+    """
+    if engine == "shards":
+        from shards import load_shards
+        return load_shards(shards)
+    if engine == "numpy" and os.path.exists(GALLERY_PATH):
+        recognizer, labels_to_name = load_gallery_and_labels()
+    else:
+        recognizer, labels_to_name = load_model_and_labels()
+        if engine == "numpy":
+            recognizer = load_numpy_engine(recognizer)
+    if engine == "numpy" and ann_probes > 0:
+        from ann_index import load_ann_engine
+        recognizer = load_ann_engine(recognizer, IVF_PATH, ann_probes)
+    return recognizer, labels_to_name
+
+def get_recognizer(engine="opencv", ann_probes=0, shards=None):
+    """(recognizer, labels_to_name) chargés au premier appel, partagés ensuite dans le processus."""
+    key = (engine, ann_probes, tuple(shards) if shards else None)
+    with _MODELS_LOCK:
+        if key not in _MODELS:
+            _MODELS[key] = load_engine(engine, ann_probes, shards)
+        return _MODELS[key]
+
+# --- Démarrage à froid ---
+_COLD_START_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+import numpy as np
+import core
+core.detect_and_crop_face(np.zeros((480, 640, 3), dtype=np.uint8))
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_detect_s": t2 - t1}}))
+"""
+
+def measure_cold_start(modules=COLD_START_MODULES, repeat=3):
+    """
+    Pour chaque script : import + première détection dans un interpréteur
+    neuf (meilleur de 'repeat' essais, cache disque chaud).
+    Retourne {module: {"import_s", "first_detect_s", "total_s"}}.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module in modules:
+        best = None
+        for _ in range(max(1, repeat)):
+            out = subprocess.run([sys.executable, "-c", _COLD_START_SNIPPET.format(module=module)],
+                                 cwd=root, capture_output=True, text=True, check=True)
+            run = json.loads(out.stdout.strip().splitlines()[-1])
+            run["total_s"] = run["import_s"] + run["first_detect_s"]
+            if best is None or run["total_s"] < best["total_s"]:
+                best = run
+        results[module] = best
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Socle commun : mesure du démarrage à froid des scripts.")
+    parser.add_argument("--cold-start", action="store_true",
+                        help="Mesurer import + première détection de chaque script (processus neuf)")
+    parser.add_argument("--modules", nargs="+", default=list(COLD_START_MODULES),
+                        help="Scripts à mesurer (défaut: enrôlement, import, reconnaissance)")
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET,
+                        help=f"Budget import + première détection en secondes (défaut: {COLD_START_BUDGET})")
+    parser.add_argument("--repeat", type=int, default=3, help="Essais par script, meilleur retenu (défaut: 3)")
+    args = parser.parse_args()
+    if not args.cold_start:
+        parser.print_help()
+        return
+
+    results = measure_cold_start(args.modules, args.repeat)
+    over = []
+    for module, r in results.items():
+        flag = "" if r["total_s"] <= args.budget else " ⚠️"
+        print(f"[PERF] {module}: import {r['import_s'] * 1000:.0f} ms | 1re détection "
+              f"{r['first_detect_s'] * 1000:.0f} ms | total {r['total_s'] * 1000:.0f} ms{flag}")
+        if flag:
+            over.append(module)
+    if over:
+        print(f"[WARN] Budget de {args.budget:.2f}s dépassé: {', '.join(over)}")
+        sys.exit(1)
+    print(f"[OK] Démarrage à froid sous le budget de {args.budget:.2f}s")
+
+if __name__ == "__main__":
+    main()
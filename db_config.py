@@ -1,11 +1,22 @@
 # db_config.py
 # ------------------------------------------------------------
 # Configuration de la connexion MySQL (à adapter selon ton env)
+# Chaque valeur peut être surchargée par variable d'environnement
+# (DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT), cf. Dockerfile.
 # ------------------------------------------------------------
+import os
+
 DB_CONFIG = {
-    "host": "127.0.0.1",   # si tu utilises Docker: "localhost" / "127.0.0.1" depuis la machine hôte
-    "user": "faceid_user", # remplace par ton user
-    "password": "faceid_pass", # remplace par ton mot de passe
-    "database": "faceid_db",
-    "port": 3306,          # 3306 par défaut
+    "host": os.getenv("DB_HOST", "127.0.0.1"),   # si tu utilises Docker: "localhost" / "127.0.0.1" depuis la machine hôte
+    "user": os.getenv("DB_USER", "faceid_user"), # remplace par ton user
+    "password": os.getenv("DB_PASSWORD", "faceid_pass"), # remplace par ton mot de passe
+    "database": os.getenv("DB_NAME", "faceid_db"),
+    "port": int(os.getenv("DB_PORT", "3306")),   # 3306 par défaut
 }
+
+# Pool de connexions partagé par tous les scripts (voir db_utils.get_pool)
+DB_POOL_NAME = os.getenv("DB_POOL_NAME", "faceid_pool")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))   # max 32 (limite mysql.connector)
+
+# Taille des lots pour les insertions groupées (executemany)
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "1000"))
@@ -1,62 +1,171 @@
 # db_utils.py
 # ------------------------------------------------------------
 # Fonctions utilitaires pour interagir avec MySQL:
-# - get_conn(): ouvrir la connexion
+# - get_pool(): pool de connexions partagé (un par processus, créé au 1er appel)
+# - get_conn(): emprunter une connexion au pool (close() la rend)
+# - db_session(): connexion persistante + transaction (commit/rollback)
 # - get_or_create_person_id(name): récupérer/créer une personne
-# - add_image_record(person_id, path): insérer un chemin d'image
+# - add_image_record(person_id, path): insérer un chemin d'image (→ id)
+# - add_image_records(rows): insérer un lot d'images (executemany)
 # - person_exists(name): vérifier existence par nom
+# - fetch_person_names(): tous les noms (préchargement du cache)
+# - fetch_people(): [(id, name)]
+# - fetch_people_groups(): [(id, name, group_name)] (shards)
 # - fetch_people_and_images(): récupérer (persons, images)
+# - fetch_image_rows(): [(id, person_id, path)] (cache de features)
+# - add_recognition_events(rows): journal des reconnaissances (executemany)
+# - fetch_import_manifest(): {source_path: ligne} (import incrémental)
+# - save_import_checkpoint(...): images + manifeste dans une transaction
 # ------------------------------------------------------------
-import mysql.connector
-from mysql.connector import Error
-from db_config import DB_CONFIG
+import os
+import threading
+from contextlib import contextmanager
 
-def get_conn():
-    """Ouvrir une connexion MySQL en utilisant DB_CONFIG."""
-    return mysql.connector.connect(**DB_CONFIG)
+from db_config import DB_CONFIG, DB_POOL_NAME, DB_POOL_SIZE, DB_BATCH_SIZE
 
-def get_or_create_person_id(name: str) -> int:
-    """Retourner l'ID d'une personne par 'name'; la créer si absente."""
-    conn = get_conn()
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool():
+    """
+    Retourner le pool de connexions du processus courant (créé au premier appel).
+    Recréé après un fork : les sockets du parent ne sont jamais partagées.
+    Le driver mysql.connector n'est importé qu'ici (import de db_utils léger).
+    """
+    global _POOL, _POOL_PID
+    if _POOL is None or _POOL_PID != os.getpid():
+        from mysql.connector import pooling
+        with _POOL_LOCK:
+            if _POOL is None or _POOL_PID != os.getpid():
+                _POOL = pooling.MySQLConnectionPool(
+                    pool_name=f"{DB_POOL_NAME}_{os.getpid()}",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG,
+                )
+                _POOL_PID = os.getpid()
+    return _POOL
+
+def get_conn():
+    """
+    Emprunter une connexion MySQL au pool (DB_CONFIG).
+    conn.close() la rend au pool. Si le pool est épuisé, ouvrir une
+    connexion directe plutôt que d'échouer.
+    """
+    from mysql.connector import connect
+    from mysql.connector.errors import PoolError
     try:
-        c = conn.cursor()
-        c.execute("SELECT id FROM persons WHERE name=%s", (name,))
-        row = c.fetchone()
-        if row:
-            pid = row[0]
-        else:
-            c.execute("INSERT INTO persons(name) VALUES(%s)", (name,))
-            conn.commit()
-            pid = c.lastrowid
-        return pid
-    finally:
-        c.close()
-        conn.close()
+        return get_pool().get_connection()
+    except PoolError:
+        return connect(**DB_CONFIG)
 
-def add_image_record(person_id: int, path: str):
-    """Insérer une image liée à person_id avec son chemin sur disque."""
+@contextmanager
+def db_session():
+    """
+    Connexion persistante pour une série de requêtes dans une transaction :
+    commit à la sortie, rollback en cas d'exception.
+
+        with db_session() as conn:
+            c = conn.cursor()
+            ...
+    """
     conn = get_conn()
     try:
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO images(person_id, path) VALUES(%s, %s)",
-            (person_id, path)
-        )
+        yield conn
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     finally:
-        c.close()
         conn.close()
 
+def get_or_create_person_id(name: str) -> int:
+    """Retourner l'ID d'une personne par 'name'; la créer si absente."""
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("SELECT id FROM persons WHERE name=%s", (name,))
+            row = c.fetchone()
+            if row:
+                return row[0]
+            c.execute("INSERT INTO persons(name) VALUES(%s)", (name,))
+            return c.lastrowid
+        finally:
+            c.close()
+
+def add_image_record(person_id: int, path: str) -> int:
+    """Insérer une image liée à person_id avec son chemin sur disque ; retourne son id."""
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute(
+                "INSERT INTO images(person_id, path) VALUES(%s, %s)",
+                (person_id, path)
+            )
+            return c.lastrowid
+        finally:
+            c.close()
+
+def add_image_records(rows, batch_size: int = DB_BATCH_SIZE):
+    """
+    Insérer un lot d'images [(person_id, path), ...] dans une seule transaction,
+    par paquets de 'batch_size' via executemany (quelques allers-retours au lieu
+    d'une connexion par ligne).
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            for i in range(0, len(rows), batch_size):
+                c.executemany(
+                    "INSERT INTO images(person_id, path) VALUES(%s, %s)",
+                    rows[i:i + batch_size]
+                )
+        finally:
+            c.close()
+
 def person_exists(name: str) -> bool:
     """Vérifier si une personne existe en base par son nom."""
-    conn = get_conn()
-    try:
+    with db_session() as conn:
         c = conn.cursor()
-        c.execute("SELECT 1 FROM persons WHERE name=%s LIMIT 1", (name,))
-        return c.fetchone() is not None
-    finally:
-        c.close()
-        conn.close()
+        try:
+            c.execute("SELECT 1 FROM persons WHERE name=%s LIMIT 1", (name,))
+            return c.fetchone() is not None
+        finally:
+            c.close()
+
+def fetch_person_names():
+    """Récupérer tous les noms de la table persons (ordre d'id)."""
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("SELECT name FROM persons ORDER BY id")
+            return [row[0] for row in c.fetchall()]
+        finally:
+            c.close()
+
+def fetch_people():
+    """Récupérer toutes les personnes : liste [(id, name), ...] (ordre d'id)."""
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("SELECT id, name FROM persons ORDER BY id")
+            return c.fetchall()
+        finally:
+            c.close()
+
+def fetch_people_groups():
+    """Récupérer toutes les personnes avec leur groupe : [(id, name, group_name), ...]."""
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("SELECT id, name, group_name FROM persons ORDER BY id")
+            return c.fetchall()
+        finally:
+            c.close()
 
 def fetch_people_and_images():
     """
@@ -64,14 +173,88 @@ def fetch_people_and_images():
       - people: liste [(id, name), ...]
       - images: liste [(person_id, path), ...]
     """
-    conn = get_conn()
-    try:
+    with db_session() as conn:
         c = conn.cursor()
-        c.execute("SELECT id, name FROM persons ORDER BY id")
-        people = c.fetchall()
-        c.execute("SELECT person_id, path FROM images ORDER BY id")
-        images = c.fetchall()
-        return people, images
-    finally:
-        c.close()
-        conn.close()
+        try:
+            c.execute("SELECT id, name FROM persons ORDER BY id")
+            people = c.fetchall()
+            c.execute("SELECT person_id, path FROM images ORDER BY id")
+            images = c.fetchall()
+            return people, images
+        finally:
+            c.close()
+
+def fetch_image_rows():
+    """Récupérer toutes les images : liste [(id, person_id, path), ...] (ordre d'id)."""
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("SELECT id, person_id, path FROM images ORDER BY id")
+            return c.fetchall()
+        finally:
+            c.close()
+
+def add_recognition_events(rows, batch_size: int = DB_BATCH_SIZE):
+    """
+    Insérer des événements [(person_id, source, confidence, seen_at), ...]
+    (seen_at : datetime) en une transaction, par paquets de 'batch_size'.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            for i in range(0, len(rows), batch_size):
+                c.executemany(
+                    "INSERT INTO recognition_events(person_id, source, confidence, seen_at) "
+                    "VALUES(%s, %s, %s, %s)",
+                    rows[i:i + batch_size]
+                )
+        finally:
+            c.close()
+
+def fetch_import_manifest():
+    """
+    Manifeste d'import → {source_path: (size, mtime_ns, content_hash, status, crop_path)}.
+    """
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("SELECT source_path, size, mtime_ns, content_hash, status, crop_path FROM import_manifest")
+            return {row[0]: tuple(row[1:]) for row in c.fetchall()}
+        finally:
+            c.close()
+
+def save_import_checkpoint(images=(), manifest=(), stale_paths=(), batch_size: int = DB_BATCH_SIZE):
+    """
+    Point de reprise de l'import, dans UNE transaction :
+      stale_paths : chemins de crops dont la ligne 'images' est supprimée
+      images      : [(person_id, path), ...] nouvelles lignes 'images'
+      manifest    : [(source_path, person_id, size, mtime_ns, content_hash,
+                      status, crop_path), ...] insérées ou mises à jour
+    Un crash ne perd que le lot en cours : manifeste et images restent cohérents.
+    """
+    images, manifest, stale_paths = list(images), list(manifest), list(stale_paths)
+    if not (images or manifest or stale_paths):
+        return
+    with db_session() as conn:
+        c = conn.cursor()
+        try:
+            for i in range(0, len(stale_paths), batch_size):
+                c.executemany("DELETE FROM images WHERE path=%s",
+                              [(p,) for p in stale_paths[i:i + batch_size]])
+            for i in range(0, len(images), batch_size):
+                c.executemany("INSERT INTO images(person_id, path) VALUES(%s, %s)",
+                              images[i:i + batch_size])
+            for i in range(0, len(manifest), batch_size):
+                c.executemany(
+                    "INSERT INTO import_manifest(source_path, person_id, size, mtime_ns, content_hash, "
+                    "status, crop_path) VALUES(%s, %s, %s, %s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE person_id=VALUES(person_id), size=VALUES(size), "
+                    "mtime_ns=VALUES(mtime_ns), content_hash=VALUES(content_hash), "
+                    "status=VALUES(status), crop_path=VALUES(crop_path)",
+                    manifest[i:i + batch_size]
+                )
+        finally:
+            c.close()
@@ -2,124 +2,150 @@
 # ------------------------------------------------------------
 # Objectif :
 # 1) Charger une image fournie (jpg/png)
-# 2) Détecter et recadrer le visage (Haar Cascade)
+# 2) Détecter et recadrer le visage (Haar Cascade), refuser un crop flou,
+#    trop petit ou mal exposé (face_quality.py, --no-quality pour forcer)
 # 3) Sauvegarder l'image recadrée dans data/dataset/<nom>/
 # 4) Insérer (personne, image) dans MySQL
-# 5) Ré-entraîner un modèle LBPH sur tout le dataset et sauvegarder:
+# 5) Mettre à jour le modèle LBPH de façon incrémentale (recognizer.update)
+#    avec ce seul visage, ou tout ré-entraîner avec --rebuild (histogrammes
+#    repris du cache data/features/ sauf images nouvelles/modifiées), puis sauvegarder:
 #    - data/model.yml
-#    - data/labels.json (mapping label_num -> nom)
+#    - data/labels.json (mapping label_num = persons.id -> nom)
+#    - data/model.bin (galerie binaire memmap, cf. gallery_bin.py)
+#    - data/model.ivf (index ANN, avec --ann ou s'il existe déjà)
+#    - data/model.version (publiée en dernier : rechargement à chaud)
+#    --max-per-person N (avec --rebuild) : N meilleurs crops par personne
+#    --compact K (avec --rebuild) : K prototypes par personne (gallery_compact.py)
+# Détection et entraînement complet partagés avec l'import (core.py,
+# training.py) ; rien n'est chargé à l'import du module.
 # ------------------------------------------------------------
 import os
 import cv2
-import json
 import argparse
 import numpy as np
 
-from db_utils import get_or_create_person_id, add_image_record, fetch_people_and_images
-
-# --- Chemins ---
-DATA_DIR = "data"
-DATASET_DIR = os.path.join(DATA_DIR, "dataset")
-MODEL_PATH = os.path.join(DATA_DIR, "model.yml")
-LABELS_PATH = os.path.join(DATA_DIR, "labels.json")
-
-# --- Détecteur Haar pour le visage ---
-FACE_CASCADE = cv2.CascadeClassifier(
-    cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-)
-
-# Assurer les dossiers
-os.makedirs(DATASET_DIR, exist_ok=True)
-
-def detect_and_crop_face(img_bgr, size=(200, 200)):
-    """
-    Détecter le plus grand visage dans l'image, retourner une version
-    recadrée en niveaux de gris, redimensionnée à 'size'.
-    """
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    faces = FACE_CASCADE.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(80, 80))
-    if len(faces) == 0:
-        return None
-    # Choisir le plus grand visage (souvent le plus pertinent)
-    x, y, w, h = sorted(faces, key=lambda b: b[2]*b[3], reverse=True)[0]
-    face = gray[y:y+h, x:x+w]
-    return cv2.resize(face, size)
-
-def build_training_data():
+from core import (DATASET_DIR, MODEL_PATH, LABELS_PATH, GALLERY_PATH,
+                  DETECT_WIDTH, crop_largest_face, next_crop_number, load_labels)
+from training import train_and_save_model, update_shards
+from lbph_numpy import NumpyLBPH
+from gallery_bin import save_engine
+from feature_cache import FeatureCache
+from face_quality import quality_score, add_quality_arguments, gate_from_args
+from model_store import atomic_write_json, save_recognizer, publish_version
+from db_utils import get_or_create_person_id, add_image_record, fetch_people
+
+def update_model(face, person_id: int, name: str, image_id=None, image_path=None):
     """
-    Lire toutes les personnes/images depuis la DB et charger
-    les images recadrées depuis le disque pour construire:
-    - X: liste d'images (np.array)
-    - y: labels numériques
-    - labels_to_name: dict {label_num: nom}
+    Ajouter un seul visage au modèle existant via recognizer.update():
+    seul l'histogramme LBP de ce visage est calculé puis ajouté à model.yml.
+    Bascule sur un entraînement complet si aucun modèle n'existe ou si une
+    entrée de labels.json ne correspond pas à persons (label = id → nom).
     """
-    people, images = fetch_people_and_images()
-    if not people:
-        return [], np.array([], dtype=np.int32), {}
-
-    # map DB-id -> label (0..N-1)
-    id_to_label = {pid: idx for idx, (pid, _) in enumerate(people)}
-    labels_to_name = {id_to_label[pid]: name for (pid, name) in people}
-
-    X, y = [], []
-    for (person_id, path) in images:
-        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            continue
-        X.append(img)
-        y.append(id_to_label[person_id])
-
-    return X, np.array(y, dtype=np.int32), labels_to_name
-
-def train_and_save_model():
-    """Entraîner LBPH sur tout le dataset et sauvegarder modèle + labels."""
-    X, y, labels_to_name = build_training_data()
-    if len(X) == 0:
-        print("[INFO] Aucun échantillon pour l'entraînement.")
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(LABELS_PATH)):
+        print("[INFO] Aucun modèle existant → entraînement complet.")
+        train_and_save_model()
+        return
+
+    labels_to_name = load_labels()
+    # Tout labels.json doit correspondre à persons (label = id → nom) :
+    # ancien modèle (labels 0..N-1), personne renommée ou supprimée → reconstruire
+    persons = dict(fetch_people())
+    conflict = persons.get(person_id) != name or any(
+        persons.get(label) != n for label, n in labels_to_name.items()
+    )
+    if conflict:
+        print("[INFO] labels.json incompatible avec persons.id → entraînement complet.")
+        train_and_save_model()
         return
 
-    # Créer le reconnaisseur LBPH (module 'cv2.face' via opencv-contrib)
     recognizer = cv2.face.LBPHFaceRecognizer_create(radius=1, neighbors=8, grid_x=8, grid_y=8)
-    recognizer.train(X, y)
+    recognizer.read(MODEL_PATH)
+    recognizer.update([face], np.array([person_id], dtype=np.int32))
+    save_recognizer(recognizer, MODEL_PATH)
+
+    labels_to_name[person_id] = name
+    atomic_write_json(LABELS_PATH, labels_to_name)
+    engine = NumpyLBPH.from_opencv(recognizer)
+    save_engine(GALLERY_PATH, engine, labels_to_name)
 
-    os.makedirs(DATA_DIR, exist_ok=True)
-    recognizer.save(MODEL_PATH)
-    with open(LABELS_PATH, "w", encoding="utf-8") as f:
-        json.dump(labels_to_name, f, ensure_ascii=False, indent=2)
+    # Le nouvel histogramme (dernière ligne) alimente le cache de features
+    if image_id is not None and image_path is not None:
+        cache = FeatureCache()
+        cache.put(image_id, image_path, engine.histograms[-1], quality_score(face))
+        cache.save_index()
 
-    print(f"[OK] Modèle entraîné → {MODEL_PATH}")
-    print(f"[OK] Labels sauvegardés → {LABELS_PATH}")
+    publish_version([MODEL_PATH, LABELS_PATH, GALLERY_PATH], n_samples=len(engine.labels))
+    print(f"[OK] Modèle mis à jour (incrémental) → {MODEL_PATH}")
+
+    update_shards()
 
 def main():
-    parser = argparse.ArgumentParser(description="Enrôler une image de visage et ré-entraîner le modèle LBPH.")
-    parser.add_argument("--name", required=True, help="Nom de la personne (ex: Ayoub)")
-    parser.add_argument("--image", required=True, help="Chemin de l'image (jpg/png)")
+    parser = argparse.ArgumentParser(description="Enrôler une image de visage et mettre à jour le modèle LBPH.")
+    parser.add_argument("--name", help="Nom de la personne (ex: Ayoub)")
+    parser.add_argument("--image", help="Chemin de l'image (jpg/png)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Ré-entraîner tout le modèle depuis la DB (au lieu de l'ajout incrémental)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Avec --rebuild : recalculer tous les histogrammes (ignorer data/features/)")
+    parser.add_argument("--ann", action="store_true",
+                        help="Avec --rebuild : construire aussi l'index ANN data/model.ivf (grandes galeries)")
+    parser.add_argument("--ann-lists", type=int, default=0,
+                        help="Nombre de listes de l'index ANN (défaut: ~sqrt(N))")
+    parser.add_argument("--detect-width", type=int, default=DETECT_WIDTH,
+                        help=f"Largeur de détection en px, 0 = pleine résolution (par défaut: {DETECT_WIDTH})")
+    parser.add_argument("--max-per-person", type=int, default=0,
+                        help="Avec --rebuild : N crops de meilleure qualité par personne (0 = tous, défaut)")
+    parser.add_argument("--compact", type=int, default=0, metavar="K",
+                        help="Avec --rebuild : modèle compact, au plus K prototypes par personne (0 = tout, défaut)")
+    add_quality_arguments(parser)
     args = parser.parse_args()
 
+    if not (args.name and args.image):
+        if args.rebuild:
+            train_and_save_model(use_cache=not args.no_cache, ann=args.ann,
+                                 ann_lists=args.ann_lists or None,
+                                 max_per_person=max(0, args.max_per_person),
+                                 compact_k=max(0, args.compact))
+            return
+        parser.error("--name et --image sont requis (ou --rebuild seul pour tout ré-entraîner)")
+
     img = cv2.imread(args.image)
     if img is None:
         print("[ERREUR] Impossible de lire l'image:", args.image)
         return
 
-    face = detect_and_crop_face(img)
+    face, box = crop_largest_face(img, detect_width=args.detect_width)
     if face is None:
         print("[ERREUR] Aucun visage détecté correctement. Essaie une image plus claire/centrée.")
         return
 
+    gate = gate_from_args(args)
+    if gate is not None:
+        accepted, reasons, scores = gate.check(face[None], [min(box[2], box[3])])
+        if not accepted[0]:
+            print(f"[ERREUR] Qualité du visage insuffisante ({reasons[0]}, score {scores[0]:.2f}). "
+                  "Essaie une image plus nette/mieux éclairée, ou --no-quality pour forcer.")
+            return
+
     # Sauvegarder l'image recadrée dans data/dataset/<nom>/
     person_dir = os.path.join(DATASET_DIR, args.name)
     os.makedirs(person_dir, exist_ok=True)
-    idx = len([f for f in os.listdir(person_dir) if f.lower().endswith((".png", ".jpg", ".jpeg"))]) + 1
+    idx = next_crop_number(person_dir, args.name)
     save_path = os.path.join(person_dir, f"{args.name}_{idx:03d}.png")
     cv2.imwrite(save_path, face)
 
     # Mettre à jour la DB
     pid = get_or_create_person_id(args.name)
-    add_image_record(pid, save_path)
+    image_id = add_image_record(pid, save_path)
 
     print(f"[OK] Image enrôlée pour '{args.name}' → {save_path}")
-    # Ré-entraîner
-    train_and_save_model()
+    if args.rebuild:
+        train_and_save_model(use_cache=not args.no_cache, ann=args.ann,
+                             ann_lists=args.ann_lists or None,
+                             max_per_person=max(0, args.max_per_person),
+                             compact_k=max(0, args.compact))
+    else:
+        update_model(face, pid, args.name, image_id, save_path)
 
 if __name__ == "__main__":
     main()
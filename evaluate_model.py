@@ -0,0 +1,148 @@
+# evaluate_model.py
+# ------------------------------------------------------------
+# Évaluation hors-ligne du modèle LBPH :
+# - charger les visages recadrés (depuis MySQL ou un dossier
+#   data/dataset/<Nom>/*.png)
+# - séparer un jeu de test (1 image sur N par personne)
+# - entraîner OpenCV LBPH sur le reste, puis comparer sur le test :
+#   OpenCV recognizer.predict (boucle) vs moteur NumPy (batch, top-k)
+# - rapporter précision top-1 / top-k, accord entre moteurs et temps
+# Exemple :
+#   python evaluate_model.py --dataset data/dataset --holdout-every 5 --k 3
+# ------------------------------------------------------------
+import os
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from lbph_numpy import NumpyLBPH
+
+ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+def load_samples(dataset=None):
+    """
+    Charger les visages (niveaux de gris) et leurs labels.
+    - dataset=None : lignes persons/images de MySQL (label = persons.id)
+    - dataset=<dossier> : <dossier>/<Nom>/*, label = rang du nom trié
+    Retourne (X: liste d'images, y: int32, labels_to_name: dict).
+    """
+    if dataset is None:
+        from db_utils import fetch_people_and_images
+        people, images = fetch_people_and_images()
+        labels_to_name = {pid: name for (pid, name) in people}
+        entries = [(person_id, path) for (person_id, path) in images]
+    else:
+        names = sorted(d for d in os.listdir(dataset) if os.path.isdir(os.path.join(dataset, d)))
+        labels_to_name = {i: name for i, name in enumerate(names)}
+        entries = []
+        for label, name in labels_to_name.items():
+            person_dir = os.path.join(dataset, name)
+            for f in sorted(os.listdir(person_dir)):
+                if os.path.splitext(f)[1].lower() in ALLOWED_EXT:
+                    entries.append((label, os.path.join(person_dir, f)))
+
+    X, y = [], []
+    for label, path in entries:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        if img.shape != (200, 200):
+            img = cv2.resize(img, (200, 200))
+        X.append(img)
+        y.append(label)
+    return X, np.array(y, dtype=np.int32), labels_to_name
+
+def split_holdout(y, every=5):
+    """
+    Indices (train, test) : pour chaque personne, une image sur 'every'
+    part en test (déterministe). Les personnes à une seule image restent en train.
+    """
+    train_idx, test_idx = [], []
+    seen = {}
+    for i, label in enumerate(y):
+        n = seen.get(int(label), 0)
+        seen[int(label)] = n + 1
+        (test_idx if n % every == every - 1 else train_idx).append(i)
+    return np.array(train_idx, dtype=np.int64), np.array(test_idx, dtype=np.int64)
+
+def evaluate_opencv(recognizer, X_test, y_test):
+    """Précision top-1 et temps par visage de recognizer.predict (boucle)."""
+    t0 = time.perf_counter()
+    preds = [recognizer.predict(img) for img in X_test]
+    elapsed = time.perf_counter() - t0
+    labels = np.array([p[0] for p in preds], dtype=np.int32)
+    return {
+        "top1": float(np.mean(labels == y_test)) if len(y_test) else 0.0,
+        "ms_per_face": 1000.0 * elapsed / max(1, len(X_test)),
+        "preds": preds,
+    }
+
+def evaluate_engine(engine, X_test, y_test, k=3, batch=16):
+    """Précision top-1 / top-k et temps par visage d'un moteur à predict_batch."""
+    tops = []
+    t0 = time.perf_counter()
+    for i in range(0, len(X_test), batch):
+        tops.extend(engine.predict_batch(X_test[i:i + batch], k=k))
+    elapsed = time.perf_counter() - t0
+    top1 = np.array([t[0][0] for t in tops], dtype=np.int32)
+    topk = [any(label == y for label, _ in t) for t, y in zip(tops, y_test)]
+    return {
+        "top1": float(np.mean(top1 == y_test)) if len(y_test) else 0.0,
+        f"top{k}": float(np.mean(topk)) if len(y_test) else 0.0,
+        "ms_per_face": 1000.0 * elapsed / max(1, len(X_test)),
+        "tops": tops,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluer LBPH (OpenCV vs moteur NumPy) sur un jeu de test mis de côté.")
+    parser.add_argument("--dataset", help="Dossier <Nom>/*.png (par défaut: lire les images depuis MySQL)")
+    parser.add_argument("--holdout-every", type=int, default=5, help="1 image sur N par personne en test (défaut: 5)")
+    parser.add_argument("--k", type=int, default=3, help="Top-k pour le moteur NumPy (défaut: 3)")
+    parser.add_argument("--batch", type=int, default=16, help="Taille des lots NumPy (défaut: 16)")
+    parser.add_argument("--json", help="Écrire le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    X, y, labels_to_name = load_samples(args.dataset)
+    train_idx, test_idx = split_holdout(y, args.holdout_every)
+    if len(train_idx) == 0 or len(test_idx) == 0:
+        print("[ERREUR] Pas assez d'images pour séparer train/test.")
+        return
+    X_train = [X[i] for i in train_idx]
+    X_test = [X[i] for i in test_idx]
+    y_train, y_test = y[train_idx], y[test_idx]
+    print(f"[INFO] {len(labels_to_name)} personne(s) | train: {len(X_train)} | test: {len(X_test)}")
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create(radius=1, neighbors=8, grid_x=8, grid_y=8)
+    recognizer.train(X_train, y_train)
+    engine = NumpyLBPH.from_opencv(recognizer)
+
+    cv_res = evaluate_opencv(recognizer, X_test, y_test)
+    np_res = evaluate_engine(engine, X_test, y_test, k=args.k, batch=args.batch)
+
+    agree = np.mean([c[0] == t[0][0] for c, t in zip(cv_res["preds"], np_res["tops"])])
+    max_dist_diff = max(abs(c[1] - t[0][1]) for c, t in zip(cv_res["preds"], np_res["tops"]))
+
+    report = {
+        "people": len(labels_to_name),
+        "train": len(X_train),
+        "test": len(X_test),
+        "opencv": {k: v for k, v in cv_res.items() if k != "preds"},
+        "numpy": {k: v for k, v in np_res.items() if k != "tops"},
+        "agreement": float(agree),
+        "max_distance_diff": float(max_dist_diff),
+    }
+    print(f"[OK] OpenCV : top1={report['opencv']['top1']:.3f} | {report['opencv']['ms_per_face']:.2f} ms/visage")
+    print(f"[OK] NumPy  : top1={report['numpy']['top1']:.3f} | top{args.k}={report['numpy'][f'top{args.k}']:.3f} "
+          f"| {report['numpy']['ms_per_face']:.2f} ms/visage")
+    print(f"[OK] Accord OpenCV/NumPy: {agree * 100:.1f}% (écart max distance {max_dist_diff:.2e})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[OK] Rapport → {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# event_log.py
+# ------------------------------------------------------------
+# Journal asynchrone des reconnaissances (table recognition_events) :
+# - log() est appelé depuis la boucle vidéo et ne bloque jamais : un
+#   événement va dans une file bornée ; file pleine → événement abandonné
+#   et compté (la lenteur de la DB ne remonte jamais jusqu'aux frames)
+# - dédoublonnage : une même personne sur une même source n'est journalisée
+#   qu'une fois par fenêtre de 'window' secondes
+# - un thread de fond vide la file par lots (executemany) dès 'batch_size'
+#   événements ou toutes les 'flush_interval' secondes
+# - compteurs (mis en file, dédoublonnés, abandonnés, écrits, erreurs,
+#   profondeur de file, durée du dernier flush) exposés via stats()
+# ------------------------------------------------------------
+import time
+import queue
+import threading
+from datetime import datetime
+
+from db_utils import add_recognition_events
+
+class EventLogger:
+    def __init__(self, source="0", window=10.0, max_queue=10000, batch_size=200,
+                 flush_interval=2.0, writer=add_recognition_events):
+        """
+        source         : identifiant de la caméra / du flux (colonne source)
+        window         : fenêtre de dédoublonnage par (personne, source) (s)
+        max_queue      : capacité de la file en mémoire
+        batch_size     : flush dès que ce nombre d'événements est en attente
+        flush_interval : flush au plus tard après ce délai (s)
+        writer         : rows -> None (insertion groupée), remplaçable
+        """
+        self.source = source
+        self.window = window
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._writer = writer
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._last_seen = {}            # (person_id, source) -> t du dernier événement
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.enqueued = 0
+        self.deduped = 0
+        self.dropped = 0                # file pleine
+        self.written = 0
+        self.lost = 0                   # lots perdus sur erreur DB (événements)
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_s = 0.0
+
+    # --- Chemin rapide (boucle vidéo) ---
+    def log(self, person_id, confidence, source=None) -> bool:
+        """Journaliser une reconnaissance ; False si dédoublonnée ou abandonnée."""
+        source = self.source if source is None else source
+        now = time.monotonic()
+        key = (person_id, source)
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is not None and now - last < self.window:
+                self.deduped += 1
+                return False
+            # Réservé avant l'enqueue (deux workers ne journalisent pas le
+            # même passage), annulé si la file est pleine
+            self._last_seen[key] = now
+        try:
+            self._queue.put_nowait((person_id, source, round(float(confidence), 3), datetime.now()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                # Pas de fenêtre de dédoublonnage pour un événement abandonné :
+                # le passage suivant de la personne sera retenté
+                if self._last_seen.get(key) == now:
+                    if last is None:
+                        del self._last_seen[key]
+                    else:
+                        self._last_seen[key] = last
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    # --- Thread d'écriture ---
+    def _take_batch(self, deadline):
+        batch = []
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, timeout)) if timeout > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch):
+        """Écrire un lot ; en cas d'erreur DB, le lot est perdu (compté) plutôt que d'accumuler."""
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        try:
+            self._writer(batch)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self.lost += len(batch)
+            print(f"[WARN] Journal des reconnaissances: écriture impossible ({e})")
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.flushes += 1
+            self.last_flush_s = time.perf_counter() - t0
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(time.monotonic() + self.flush_interval)
+            self.flush(batch)
+            self._prune()
+        # Dernier vidage à l'arrêt
+        while not self._queue.empty():
+            self.flush(self._take_batch(0))
+
+    def _prune(self):
+        """Oublier les clés de dédoublonnage expirées (mémoire bornée)."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._last_seen) > 1024:
+                self._last_seen = {k: t for k, t in self._last_seen.items() if now - t < self.window}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Arrêter le thread après avoir écrit les événements en attente."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "deduped": self.deduped,
+                "dropped": self.dropped,
+                "written": self.written,
+                "lost": self.lost,
+                "flushes": self.flushes,
+                "errors": self.errors,
+                "queue": self._queue.qsize(),
+                "last_flush_ms": round(self.last_flush_s * 1000.0, 1),
+            }
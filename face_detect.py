@@ -0,0 +1,121 @@
+# face_detect.py
+# ------------------------------------------------------------
+# Détection Haar à résolution réduite :
+# - réduire l'image en niveaux de gris à une largeur cible
+# - détecter sur l'image réduite (minSize/maxSize mis à l'échelle)
+# - remonter les boîtes en coordonnées pleine résolution, pour que le
+#   ROI LBPH 200x200 soit recadré dans les pixels d'origine
+# Usage en benchmark (vitesse / rappel par rapport à la pleine résolution) :
+#   python face_detect.py --images "people/*/*.jpg" --widths 0 1600 1024 800 640
+# ------------------------------------------------------------
+import glob
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from face_tracker import _iou
+
+# Taille de la fenêtre de base du détecteur Haar frontal (24x24)
+_HAAR_WINDOW = 24
+
+def detect_scaled(cascade, gray, detect_width=0, scaleFactor=1.1, minNeighbors=5,
+                  minSize=(30, 30), maxSize=None):
+    """
+    detectMultiScale sur 'gray' réduite à 'detect_width' pixels de large
+    (0 ou largeur >= image : pas de réduction). Les boîtes retournées sont
+    en coordonnées de 'gray' (pleine résolution), dtype int32 (N, 4).
+    """
+    h, w = gray.shape[:2]
+    scale = 1.0
+    small = gray
+    if detect_width and w > detect_width:
+        scale = detect_width / float(w)
+        small = cv2.resize(gray, (detect_width, max(1, int(round(h * scale)))),
+                           interpolation=cv2.INTER_AREA)
+
+    kwargs = {"scaleFactor": scaleFactor, "minNeighbors": minNeighbors}
+    if minSize:
+        m = max(_HAAR_WINDOW, int(minSize[0] * scale)), max(_HAAR_WINDOW, int(minSize[1] * scale))
+        kwargs["minSize"] = m
+    if maxSize:
+        kwargs["maxSize"] = (max(1, int(maxSize[0] * scale)), max(1, int(maxSize[1] * scale)))
+
+    faces = cascade.detectMultiScale(small, **kwargs)
+    if len(faces) == 0:
+        return np.empty((0, 4), dtype=np.int32)
+    faces = np.asarray(faces, dtype=np.float32)
+    if scale != 1.0:
+        faces /= scale
+    # Borner aux dimensions de l'image d'origine
+    boxes = np.rint(faces).astype(np.int32)
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, w - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, h - 1)
+    boxes[:, 2] = np.minimum(boxes[:, 2], w - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], h - boxes[:, 1])
+    return boxes
+
+def largest(boxes):
+    """Plus grande boîte (celle que garde detect_and_crop_face), ou None."""
+    if len(boxes) == 0:
+        return None
+    return max(boxes, key=lambda b: int(b[2]) * int(b[3]))
+
+def benchmark(paths, widths, min_iou=0.5, **detect_kwargs):
+    """
+    Pour chaque largeur : temps moyen de détection (gray déjà calculée) et
+    rappel du visage retenu : la plus grande boîte trouvée en pleine
+    résolution est-elle retrouvée (IoU >= min_iou) à cette largeur ?
+    Retourne une liste de dicts {width, ms, recall, faces}.
+    """
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    grays = []
+    for p in paths:
+        img = cv2.imread(p)
+        if img is not None:
+            grays.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    if not grays:
+        return []
+
+    reference = [largest(detect_scaled(cascade, g, 0, **detect_kwargs)) for g in grays]
+    n_ref = sum(1 for r in reference if r is not None)
+    rows = []
+    for width in widths:
+        found, t_total = 0, 0.0
+        for g, ref in zip(grays, reference):
+            t0 = time.perf_counter()
+            boxes = detect_scaled(cascade, g, width, **detect_kwargs)
+            t_total += time.perf_counter() - t0
+            best = largest(boxes)
+            if ref is not None and best is not None and _iou(ref, best) >= min_iou:
+                found += 1
+        rows.append({
+            "width": width or "pleine",
+            "ms": 1000.0 * t_total / len(grays),
+            "recall": found / n_ref if n_ref else 0.0,
+            "faces": n_ref,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer vitesse/rappel de la détection Haar selon la largeur de détection.")
+    parser.add_argument("--images", required=True, help="Glob des images (ex: 'people/*/*.jpg')")
+    parser.add_argument("--widths", type=int, nargs="+", default=[0, 1600, 1024, 800, 640, 480],
+                        help="Largeurs de détection à tester (0 = pleine résolution)")
+    parser.add_argument("--min-size", type=int, default=80, help="minSize en pixels pleine résolution")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images, recursive=True))
+    rows = benchmark(paths, args.widths, minSize=(args.min_size, args.min_size))
+    if not rows:
+        print("[ERREUR] Aucune image lisible.")
+        return
+    print(f"[INFO] {len(paths)} image(s), {rows[0]['faces']} visage(s) de référence")
+    print("| Largeur détection | Temps/image (ms) | Rappel |")
+    print("|---|---|---|")
+    for r in rows:
+        print(f"| {r['width']} | {r['ms']:.1f} | {r['recall'] * 100:.1f}% |")
+
+if __name__ == "__main__":
+    main()
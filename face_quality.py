@@ -0,0 +1,179 @@
+# face_quality.py
+# ------------------------------------------------------------
+# Filtre qualité des visages recadrés, appliqué après la détection et
+# avant predict (live) ou l'écriture d'un échantillon (import / enrôlement) :
+# - netteté   : variance du laplacien (noyau 4-voisins) sur le crop 200x200
+# - taille    : plus petit côté de la boîte détectée, en px d'origine
+# - exposition: luminosité moyenne dans [min, max]
+# - contraste : écart-type des niveaux de gris
+# Calcul vectorisé sur un lot (B, H, W) : ~0.2 ms par visage 200x200.
+# Un crop flou, minuscule ou mal exposé coûte un predict pour un résultat
+# peu fiable, et gonfle la galerie parcourue linéairement par LBPH.
+# score() ∈ [0, 1] classe les crops d'une personne (cap "meilleurs N" à
+# l'entraînement, training.py --max-per-person).
+#   python face_quality.py people/Ayoub/*.jpg
+#   python face_quality.py data/dataset/Ayoub/*.png --cropped --min-sharpness 40
+# ------------------------------------------------------------
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+from core import crop_largest_face
+
+# Seuils par défaut (ajuster avec face_quality.py sur ses propres photos)
+MIN_SHARPNESS = 20.0         # variance du laplacien
+MIN_FACE_SIZE = 40           # px, plus petit côté de la boîte détectée
+EXPOSURE = (40.0, 215.0)     # luminosité moyenne acceptée
+MIN_CONTRAST = 20.0          # écart-type des niveaux de gris
+
+# Valeurs à partir desquelles un critère compte pour 1 dans score()
+SHARPNESS_REF = 200.0
+CONTRAST_REF = 60.0
+FACE_SIZE_REF = 120
+
+# Motifs de rejet, dans l'ordre de vérification
+REASONS = ("size", "sharpness", "exposure", "contrast")
+
+def measure(rois):
+    """
+    Lot (B, H, W) uint8 (ou un seul crop (H, W)) →
+    (sharpness, brightness, contrast), trois tableaux float32 (B,).
+    """
+    x = np.asarray(rois, dtype=np.float32)
+    if x.ndim == 2:
+        x = x[None]
+    lap = (x[:, :-2, 1:-1] + x[:, 2:, 1:-1] + x[:, 1:-1, :-2] + x[:, 1:-1, 2:]
+           - 4.0 * x[:, 1:-1, 1:-1])
+    flat = x.reshape(len(x), -1)
+    return lap.reshape(len(x), -1).var(axis=1), flat.mean(axis=1), flat.std(axis=1)
+
+def score(sharpness, brightness, contrast, sizes=None):
+    """Score de qualité ∈ [0, 1] (produit des critères normalisés), vectorisé."""
+    s = np.clip(sharpness / SHARPNESS_REF, 0.0, 1.0)
+    s = s * np.clip(contrast / CONTRAST_REF, 0.0, 1.0)
+    s = s * np.clip(1.0 - np.abs(brightness - 127.5) / 127.5, 0.0, 1.0)
+    if sizes is not None:
+        s = s * np.clip(np.asarray(sizes, dtype=np.float32) / FACE_SIZE_REF, 0.0, 1.0)
+    return s
+
+def quality_score(roi):
+    """Score d'un seul crop (sans critère de taille : crops déjà redimensionnés)."""
+    return float(score(*measure(roi))[0])
+
+def assess(rois, sizes=None, min_sharpness=MIN_SHARPNESS, min_size=MIN_FACE_SIZE,
+           exposure=EXPOSURE, min_contrast=MIN_CONTRAST):
+    """
+    Vérifier un lot de crops. 'sizes' : plus petit côté de chaque boîte
+    détectée (None = critère ignoré). Fonction pure (utilisable dans un
+    worker de multiprocessing).
+    Retourne (accepted bool (B,), reasons [None | motif], scores (B,)).
+    """
+    sharpness, brightness, contrast = measure(rois)
+    n = len(sharpness)
+    failed = {
+        "size": (np.asarray(sizes) < min_size) if sizes is not None else np.zeros(n, bool),
+        "sharpness": sharpness < min_sharpness,
+        "exposure": (brightness < exposure[0]) | (brightness > exposure[1]),
+        "contrast": contrast < min_contrast,
+    }
+    reasons = [None] * n
+    for reason in reversed(REASONS):     # premier motif vérifié retenu
+        for i in np.flatnonzero(failed[reason]):
+            reasons[i] = reason
+    accepted = np.array([r is None for r in reasons], dtype=bool)
+    return accepted, reasons, score(sharpness, brightness, contrast, sizes)
+
+class QualityGate:
+    """
+    Seuils + compteurs de rejets par motif (thread-safe, un filtre partagé
+    par tous les workers live). Usage :
+        accepted, reasons, scores = gate.check(rois, sizes)
+    """
+
+    def __init__(self, min_sharpness=MIN_SHARPNESS, min_size=MIN_FACE_SIZE,
+                 exposure=EXPOSURE, min_contrast=MIN_CONTRAST):
+        self.min_sharpness = min_sharpness
+        self.min_size = min_size
+        self.exposure = tuple(exposure)
+        self.min_contrast = min_contrast
+        self.checked = 0
+        self.rejected = dict.fromkeys(REASONS, 0)
+        self._lock = threading.Lock()
+
+    def thresholds(self) -> dict:
+        """Paramètres de assess() (ex: à passer à un worker de processus)."""
+        return {"min_sharpness": self.min_sharpness, "min_size": self.min_size,
+                "exposure": self.exposure, "min_contrast": self.min_contrast}
+
+    def record(self, reasons):
+        """Compter des verdicts (motifs None = acceptés), ex: rendus par un worker."""
+        with self._lock:
+            self.checked += len(reasons)
+            for reason in reasons:
+                if reason is not None:
+                    self.rejected[reason] += 1
+
+    def check(self, rois, sizes=None):
+        accepted, reasons, scores = assess(rois, sizes, **self.thresholds())
+        self.record(reasons)
+        return accepted, reasons, scores
+
+    def stats(self) -> dict:
+        with self._lock:
+            rejected = sum(self.rejected.values())
+            return {"checked": self.checked, "accepted": self.checked - rejected,
+                    "rejected": rejected, **{f"rejected_{k}": v for k, v in self.rejected.items()}}
+
+def add_quality_arguments(parser):
+    """Options communes du filtre qualité (live, import, enrôlement)."""
+    parser.add_argument("--no-quality", action="store_true",
+                        help="Désactiver le filtre qualité des visages")
+    parser.add_argument("--min-sharpness", type=float, default=MIN_SHARPNESS,
+                        help=f"Filtre qualité : variance du laplacien minimale (défaut: {MIN_SHARPNESS})")
+    parser.add_argument("--min-face-size", type=int, default=MIN_FACE_SIZE,
+                        help=f"Filtre qualité : plus petit côté du visage en px (défaut: {MIN_FACE_SIZE})")
+    parser.add_argument("--exposure", type=float, nargs=2, default=EXPOSURE, metavar=("MIN", "MAX"),
+                        help=f"Filtre qualité : luminosité moyenne acceptée (défaut: {EXPOSURE[0]:g} {EXPOSURE[1]:g})")
+    parser.add_argument("--min-contrast", type=float, default=MIN_CONTRAST,
+                        help=f"Filtre qualité : écart-type minimal des niveaux de gris (défaut: {MIN_CONTRAST})")
+
+def gate_from_args(args):
+    """QualityGate depuis les options de add_quality_arguments ; None si désactivé."""
+    if getattr(args, "no_quality", False):
+        return None
+    return QualityGate(args.min_sharpness, args.min_face_size, args.exposure, args.min_contrast)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer la qualité des visages de quelques images.")
+    parser.add_argument("images", nargs="+", help="Images à mesurer")
+    parser.add_argument("--cropped", action="store_true",
+                        help="Images déjà recadrées (data/dataset/) : pas de détection, taille ignorée")
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+    gate = QualityGate(args.min_sharpness, args.min_face_size, args.exposure, args.min_contrast)
+
+    for path in args.images:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"[WARN] Lecture impossible: {path}")
+            continue
+        if args.cropped:
+            face, sizes = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (200, 200)), None
+        else:
+            face, box = crop_largest_face(img)
+            if face is None:
+                print(f"[WARN] Aucun visage détecté: {path}")
+                continue
+            sizes = [min(box[2], box[3])]
+        sharpness, brightness, contrast = measure(face)
+        accepted, reasons, scores = gate.check(face[None], sizes)
+        verdict = "OK" if accepted[0] else f"rejet ({reasons[0]})"
+        size = f"{sizes[0]}px" if sizes else "-"
+        print(f"{path}: netteté {sharpness[0]:.1f} | taille {size} | luminosité {brightness[0]:.0f} "
+              f"| contraste {contrast[0]:.1f} | score {scores[0]:.2f} → {verdict}")
+    print(f"[INFO] {gate.stats()}")
+
+if __name__ == "__main__":
+    main()
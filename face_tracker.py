@@ -0,0 +1,136 @@
+# face_tracker.py
+# ------------------------------------------------------------
+# Suivi des visages entre deux détections Haar complètes :
+# - detectMultiScale plein frame seulement tous les N frames
+#   (ou dès qu'une piste est perdue)
+# - entre deux détections : suivi par matchTemplate dans une fenêtre
+#   de recherche locale autour de la dernière position (très peu coûteux)
+# - chaque piste garde sa dernière prédiction LBPH ; l'appelant ne relance
+#   recognizer.predict que tous les M frames par piste
+# ------------------------------------------------------------
+import cv2
+
+def _iou(a, b):
+    """Intersection-over-union de deux boîtes (x, y, w, h)."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+class Track:
+    """Une piste : boîte courante, gabarit de suivi et dernière prédiction."""
+    __slots__ = ("id", "box", "template", "result", "since_predict")
+
+    def __init__(self, track_id, box, gray):
+        self.id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = None
+        self.result = None          # dernière prédiction (fournie par l'appelant)
+        self.since_predict = 0      # frames depuis la dernière prédiction
+        self.set_template(gray)
+
+    def set_template(self, gray):
+        x, y, w, h = self.box
+        self.template = gray[y:y + h, x:x + w].copy()
+
+class FaceTracker:
+    def __init__(self, detect, detect_every=5, predict_every=10,
+                 search_scale=2.0, min_score=0.6, iou_match=0.3):
+        """
+        detect        : fonction gray -> liste de boîtes (x, y, w, h)
+        detect_every  : détection plein frame tous les N frames
+        predict_every : prédiction LBPH tous les M frames par piste
+        search_scale  : taille de la fenêtre de recherche (× la boîte)
+        min_score     : score matchTemplate minimal, sinon piste perdue
+        iou_match     : IoU minimale pour associer une détection à une piste
+        """
+        self.detect = detect
+        self.detect_every = max(1, detect_every)
+        self.predict_every = max(1, predict_every)
+        self.search_scale = search_scale
+        self.min_score = min_score
+        self.iou_match = iou_match
+
+        self.tracks = []
+        self._next_id = 0
+        self._frame_idx = 0
+        self._force_detect = True
+        self.detections_run = 0
+        self.frames_tracked = 0
+        self.tracks_lost = 0
+
+    def _associate(self, gray, boxes):
+        """Associer les nouvelles détections aux pistes existantes (IoU glouton)."""
+        remaining = list(self.tracks)
+        updated = []
+        for box in boxes:
+            best, best_iou = None, self.iou_match
+            for t in remaining:
+                iou = _iou(t.box, box)
+                if iou >= best_iou:
+                    best, best_iou = t, iou
+            if best is not None:
+                remaining.remove(best)
+                best.box = tuple(int(v) for v in box)
+                best.set_template(gray)
+                updated.append(best)      # la prédiction précédente est conservée
+            else:
+                updated.append(Track(self._next_id, box, gray))
+                self._next_id += 1
+        self.tracks_lost += len(remaining)
+        self.tracks = updated
+
+    def _follow(self, gray):
+        """Déplacer chaque piste par matchTemplate dans une fenêtre locale."""
+        H, W = gray.shape[:2]
+        kept = []
+        for t in self.tracks:
+            x, y, w, h = t.box
+            mx = int(w * (self.search_scale - 1) / 2)
+            my = int(h * (self.search_scale - 1) / 2)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(W, x + w + mx), min(H, y + h + my)
+            window = gray[y0:y1, x0:x1]
+            if window.shape[0] < h or window.shape[1] < w:
+                self.tracks_lost += 1
+                continue
+            res = cv2.matchTemplate(window, t.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(res)
+            if score < self.min_score:
+                self.tracks_lost += 1
+                continue
+            t.box = (x0 + loc[0], y0 + loc[1], w, h)
+            t.set_template(gray)
+            kept.append(t)
+        if len(kept) < len(self.tracks):
+            self._force_detect = True     # piste perdue → détection au prochain frame
+        self.tracks = kept
+
+    def update(self, gray):
+        """Avancer d'un frame ; retourne la liste des pistes actives."""
+        if self._force_detect or self._frame_idx % self.detect_every == 0:
+            self._associate(gray, self.detect(gray))
+            self._force_detect = False
+            self.detections_run += 1
+        else:
+            self._follow(gray)
+            self.frames_tracked += 1
+        self._frame_idx += 1
+        for t in self.tracks:
+            t.since_predict += 1
+        return self.tracks
+
+    def needs_predict(self, track):
+        """Vrai si la piste n'a pas de prédiction ou si elle date de M frames."""
+        return track.result is None or track.since_predict >= self.predict_every
+
+    def stats(self) -> dict:
+        return {
+            "tracks": len(self.tracks),
+            "detections_run": self.detections_run,
+            "frames_tracked": self.frames_tracked,
+            "tracks_lost": self.tracks_lost,
+        }
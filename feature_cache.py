@@ -0,0 +1,139 @@
+# feature_cache.py
+# ------------------------------------------------------------
+# Cache persistant des histogrammes LBP par image (data/features/) :
+# - une entrée par ligne de la table images, clé = images.id
+#   + (path, mtime_ns, taille) du fichier recadré
+# - <id>.npy : histogramme float32 (16384) identique à celui d'OpenCV
+# - index.json : métadonnées de validation + score qualité du crop
+#   (face_quality.quality_score, pour garder les N meilleurs par personne)
+# Un ré-entraînement ne décode et ne recalcule que les images nouvelles
+# ou modifiées ; les entrées dont la ligne a été supprimée sont évincées.
+# ------------------------------------------------------------
+import os
+import json
+
+import cv2
+import numpy as np
+
+from lbph_numpy import compute_histograms
+from face_quality import quality_score
+
+DATA_DIR = "data"
+FEATURES_DIR = os.path.join(DATA_DIR, "features")
+
+class FeatureCache:
+    def __init__(self, cache_dir=FEATURES_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = {}          # str(image_id) -> {"path", "mtime_ns", "size", "quality"}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.unreadable = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}   # index corrompu → tout sera recalculé
+
+    def _vector_path(self, image_id):
+        return os.path.join(self.cache_dir, f"{image_id}.npy")
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def put(self, image_id, path, histogram, quality=None):
+        """Enregistrer l'histogramme (+ score qualité) d'une image (ex: après un enrôlement)."""
+        mtime_ns, size = self._signature(path)
+        np.save(self._vector_path(image_id), np.asarray(histogram, dtype=np.float32).ravel())
+        entry = {"path": path, "mtime_ns": mtime_ns, "size": size}
+        if quality is not None:
+            entry["quality"] = float(quality)
+        self.index[str(image_id)] = entry
+
+    def quality(self, image_id, path):
+        """Score qualité en cache ; calculé depuis l'image (et mémorisé) s'il manque."""
+        entry = self.index.get(str(image_id))
+        if entry is not None and "quality" in entry:
+            return entry["quality"]
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            return 0.0
+        q = quality_score(img)
+        if entry is not None:
+            entry["quality"] = q
+        return q
+
+    def get(self, image_id, path):
+        """Histogramme en cache si (path, mtime, taille) correspondent, sinon None."""
+        entry = self.index.get(str(image_id))
+        if entry is None or entry["path"] != path:
+            return None
+        try:
+            if (entry["mtime_ns"], entry["size"]) != self._signature(path):
+                return None
+            return np.load(self._vector_path(image_id))
+        except (OSError, ValueError):
+            return None
+
+    def evict_missing(self, image_ids):
+        """Supprimer les entrées dont l'id n'est plus dans la table images."""
+        keep = {str(i) for i in image_ids}
+        for key in [k for k in self.index if k not in keep]:
+            self.index.pop(key, None)
+            try:
+                os.remove(self._vector_path(key))
+            except OSError:
+                pass
+            self.evicted += 1
+
+    def save_index(self):
+        """Écrire index.json de façon atomique."""
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def features_for(self, rows, with_quality=False):
+        """
+        rows = [(image_id, label, path), ...] → (H float32 (N, D), y int32 (N,)).
+        Les images illisibles sont ignorées ; seules les images absentes du
+        cache ou modifiées sont décodées puis passées au calcul LBP (le score
+        qualité est calculé au passage).
+        with_quality=True → (H, y, q float32 (N,)) ; les entrées d'avant le
+        score qualité sont relues une fois.
+        """
+        self.evict_missing([image_id for image_id, _, _ in rows])
+        vectors, labels, scores = [], [], []
+        for image_id, label, path in rows:
+            h = self.get(image_id, path)
+            if h is None:
+                img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    self.unreadable += 1
+                    continue
+                h = compute_histograms(img[None])[0]
+                self.put(image_id, path, h, quality_score(img))
+                self.misses += 1
+            else:
+                self.hits += 1
+            vectors.append(h)
+            labels.append(label)
+            if with_quality:
+                scores.append(self.quality(image_id, path))
+        self.save_index()
+        if not vectors:
+            H, y = np.empty((0, 0), dtype=np.float32), np.array([], dtype=np.int32)
+        else:
+            H, y = np.vstack(vectors).astype(np.float32, copy=False), np.array(labels, dtype=np.int32)
+        if with_quality:
+            return H, y, np.array(scores, dtype=np.float32)
+        return H, y
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses,
+                "evicted": self.evicted, "unreadable": self.unreadable}
@@ -0,0 +1,59 @@
+# frame_buffers.py
+# ------------------------------------------------------------
+# Tampons réutilisés d'un frame à l'autre (un jeu par worker) :
+# - gray : cvtColor(dst=...) dans une image préallouée, réallouée
+#   seulement si la résolution change
+# - rois : lot fixe (max_faces, 200, 200) rempli par resize(dst=...) ;
+#   au-delà de max_faces, les visages en trop ne sont pas reconnus
+#   (comptés dans 'overflow')
+# En régime établi, le chemin frame → ROI n'alloue plus de tableau image.
+# Les vues retournées sont écrasées au frame suivant : à consommer (ou
+# copier) avant de traiter un nouveau frame.
+# ------------------------------------------------------------
+import cv2
+import numpy as np
+
+ROI_SIZE = (200, 200)
+MAX_FACES = 16
+
+class FrameBuffers:
+    def __init__(self, max_faces=MAX_FACES, roi_size=ROI_SIZE):
+        self.max_faces = max(1, max_faces)
+        self.roi_size = roi_size
+        self.gray = None
+        self.roi_batch = np.empty((self.max_faces, roi_size[1], roi_size[0]), dtype=np.uint8)
+        self.gray_allocs = 0
+        self.frames = 0
+        self.overflow = 0
+
+    def to_gray(self, frame):
+        """Frame BGR → niveaux de gris, dans le tampon réutilisé."""
+        h, w = frame.shape[:2]
+        if self.gray is None or self.gray.shape != (h, w):
+            self.gray = np.empty((h, w), dtype=np.uint8)
+            self.gray_allocs += 1
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        self.frames += 1
+        return self.gray
+
+    def rois(self, gray, boxes):
+        """Boîtes (x, y, w, h) → vue (n, 200, 200) du lot préalloué (n <= max_faces)."""
+        n = min(len(boxes), self.max_faces)
+        self.overflow += len(boxes) - n
+        for i in range(n):
+            x, y, w, h = boxes[i]
+            cv2.resize(gray[y:y + h, x:x + w], self.roi_size, dst=self.roi_batch[i])
+        return self.roi_batch[:n]
+
+    def stats(self) -> dict:
+        return {"frames": self.frames, "gray_allocs": self.gray_allocs,
+                "overflow": self.overflow, "max_faces": self.max_faces}
+
+def merge_stats(buffers) -> dict:
+    """Stats cumulées de plusieurs jeux de tampons (un par worker)."""
+    out = {"workers": len(buffers), "frames": 0, "gray_allocs": 0, "overflow": 0}
+    for b in list(buffers):
+        s = b.stats()
+        for key in ("frames", "gray_allocs", "overflow"):
+            out[key] += s[key]
+    return out
@@ -0,0 +1,173 @@
+# frame_pipeline.py
+# ------------------------------------------------------------
+# Pipeline multi-thread capture → détection/reconnaissance → affichage
+# pour recognize_live_mysql (mode --mode threaded) :
+# - un thread de capture qui ne garde que le frame le plus récent
+# - un pool de workers (OpenCV relâche le GIL pendant detectMultiScale /
+#   predict, donc les threads tournent réellement en parallèle)
+# - l'affichage reste dans le thread principal (imshow / waitKey)
+# Les files entre étapes sont bornées et "drop-oldest" : une étape lente
+# perd des frames anciens au lieu d'accumuler de la latence.
+# ------------------------------------------------------------
+import time
+import threading
+from collections import deque
+
+class DropOldestQueue:
+    """File bornée : put() ne bloque jamais et éjecte l'élément le plus ancien si pleine."""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Retourner le prochain élément, ou None si timeout / file fermée."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        """Réveiller tous les consommateurs (arrêt du pipeline)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+class ThreadedPipeline:
+    """
+    Orchestration des étapes. Paramètres :
+      open_cap      : () -> cap | None   (ouvrir / rouvrir la caméra)
+      make_worker   : () -> process(frame) -> résultat
+                      (appelé une fois par worker : ressources non partagées
+                      comme le CascadeClassifier)
+      workers       : nombre de threads de détection/reconnaissance
+      metrics       : live_metrics.LiveMetrics optionnel (étape "capture",
+                      lectures échouées)
+    Les sorties sont des tuples (seq, t_capture, frame, résultat), lues par
+    le thread principal via next_result().
+    """
+
+    def __init__(self, open_cap, make_worker, workers=2, metrics=None):
+        self.open_cap = open_cap
+        self.make_worker = make_worker
+        self.workers = max(1, workers)
+        self.metrics = metrics
+
+        self.frames = DropOldestQueue(maxsize=1)             # capture → workers
+        self.results = DropOldestQueue(maxsize=self.workers) # workers → affichage
+        self.failed = False          # caméra impossible à rouvrir
+        self.captured = 0
+        self.displayed = 0
+        self.out_of_order = 0        # résultats plus vieux que le dernier affiché
+        self.latency_ema = 0.0       # latence capture → affichage (s)
+
+        self._stop = threading.Event()
+        self._reopen = threading.Event()
+        self._threads = []
+        self._last_seq = -1
+
+    # --- Étape 1 : capture ---
+    def _capture_loop(self):
+        cap = self.open_cap()
+        if cap is None:
+            self.failed = True
+            self.frames.close()
+            return
+        seq = 0
+        while not self._stop.is_set():
+            if self._reopen.is_set():
+                self._reopen.clear()
+                cap.release()
+                cap = self.open_cap()
+                if cap is None:
+                    self.failed = True
+                    break
+            t0 = time.perf_counter()
+            ok, frame = cap.read()
+            if self.metrics is not None:
+                self.metrics.observe("capture", time.perf_counter() - t0)
+            if not ok or frame is None:
+                if self.metrics is not None:
+                    self.metrics.incr("read_failures")
+                print("[WARN] Lecture échouée. Tentative de re-ouverture de la caméra...")
+                self._reopen.set()
+                continue
+            self.frames.put((seq, time.perf_counter(), frame))
+            self.captured += 1
+            seq += 1
+        if cap is not None:
+            cap.release()
+        self.frames.close()
+
+    # --- Étape 2 : détection + reconnaissance ---
+    def _worker_loop(self):
+        process = self.make_worker()
+        while not self._stop.is_set():
+            item = self.frames.get(timeout=0.5)
+            if item is None:
+                if self.failed:
+                    break
+                continue
+            seq, t_cap, frame = item
+            self.results.put((seq, t_cap, frame, process(frame)))
+
+    # --- Étape 3 : affichage (thread principal) ---
+    def next_result(self, timeout=0.1):
+        """Prochain résultat à afficher (dans l'ordre), ou None."""
+        while True:
+            item = self.results.get(timeout=timeout)
+            if item is None:
+                return None
+            seq = item[0]
+            if seq <= self._last_seq:
+                self.out_of_order += 1
+                continue
+            self._last_seq = seq
+            self.displayed += 1
+            latency = time.perf_counter() - item[1]
+            self.latency_ema = latency if self.displayed == 1 else 0.9 * self.latency_ema + 0.1 * latency
+            return item
+
+    def request_reopen(self):
+        """Demander au thread de capture de rouvrir la caméra (touche 'c')."""
+        self._reopen.set()
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._capture_loop, name="capture", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._worker_loop, name=f"worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.frames.close()
+        self.results.close()
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    def stats(self) -> dict:
+        return {
+            "captured": self.captured,
+            "displayed": self.displayed,
+            "dropped_capture": self.frames.dropped,
+            "dropped_results": self.results.dropped,
+            "out_of_order": self.out_of_order,
+            "latency_ms": round(self.latency_ema * 1000.0, 1),
+        }
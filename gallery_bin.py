@@ -0,0 +1,172 @@
+# gallery_bin.py
+# ------------------------------------------------------------
+# Format binaire compact de la galerie LBPH (data/model.bin) :
+#   [en-tête 4096 o] [histogrammes float32 M x D] [labels int32 M] [noms JSON]
+# - chargé par numpy.memmap sans copie : démarrage quasi instantané et
+#   pages partagées entre plusieurs processus d'une même machine
+# - écrit de façon atomique (fichier temporaire puis os.replace)
+# - write_opencv_model() : model.yml OpenCV écrit depuis des histogrammes
+#   déjà calculés (cache de features), sans ré-entraîner
+# - convertisseur depuis model.yml + labels.json existants :
+#   python gallery_bin.py --convert
+#   python gallery_bin.py --info data/model.bin
+# ------------------------------------------------------------
+import os
+import json
+import struct
+import argparse
+
+import numpy as np
+
+from lbph_numpy import NumpyLBPH, RADIUS, NEIGHBORS, GRID_X, GRID_Y
+
+DATA_DIR = "data"
+MODEL_PATH = os.path.join(DATA_DIR, "model.yml")
+LABELS_PATH = os.path.join(DATA_DIR, "labels.json")
+GALLERY_PATH = os.path.join(DATA_DIR, "model.bin")
+
+MAGIC = b"FACEIDG1"
+VERSION = 1
+# magic, version, radius, neighbors, grid_x, grid_y, n_samples, dim,
+# hist_offset, labels_offset, names_offset, names_len
+_HEADER = struct.Struct("<8sIIIIIQIQQQQ")
+_ALIGN = 4096   # histogrammes alignés sur une page mémoire
+
+def _align(n, a=_ALIGN):
+    return (n + a - 1) // a * a
+
+def save_gallery(path, histograms, labels, labels_to_name):
+    """
+    Écrire la galerie (histograms (M, D) float32, labels (M,) int32,
+    labels_to_name {label: nom}) au format binaire, de façon atomique.
+    """
+    histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+    labels = np.ascontiguousarray(labels, dtype=np.int32).ravel()
+    n, dim = histograms.shape if histograms.ndim == 2 else (0, GRID_X * GRID_Y * 2 ** NEIGHBORS)
+    names = json.dumps({str(k): v for k, v in labels_to_name.items()}, ensure_ascii=False).encode("utf-8")
+
+    hist_offset = _align(_HEADER.size)
+    labels_offset = hist_offset + histograms.nbytes
+    names_offset = labels_offset + labels.nbytes
+    header = _HEADER.pack(MAGIC, VERSION, RADIUS, NEIGHBORS, GRID_X, GRID_Y,
+                          n, dim, hist_offset, labels_offset, names_offset, len(names))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(b"\0" * (hist_offset - _HEADER.size))
+        f.write(histograms.tobytes())
+        f.write(labels.tobytes())
+        f.write(names)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_header(path):
+    """Lire et valider l'en-tête → dict."""
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"Fichier galerie tronqué: {path}")
+    (magic, version, radius, neighbors, grid_x, grid_y, n, dim,
+     hist_offset, labels_offset, names_offset, names_len) = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Format galerie inconnu: {path}")
+    if version != VERSION:
+        raise ValueError(f"Version galerie non supportée ({version}): {path}")
+    if (radius, neighbors, grid_x, grid_y) != (RADIUS, NEIGHBORS, GRID_X, GRID_Y):
+        raise ValueError(f"Paramètres LBPH incompatibles ({radius}, {neighbors}, {grid_x}x{grid_y}): {path}")
+    return {
+        "n_samples": n, "dim": dim,
+        "hist_offset": hist_offset, "labels_offset": labels_offset,
+        "names_offset": names_offset, "names_len": names_len,
+    }
+
+def load_gallery(path=GALLERY_PATH):
+    """
+    Charger la galerie binaire → (NumpyLBPH, labels_to_name).
+    Histogrammes et labels sont des numpy.memmap en lecture seule (aucune
+    copie : les pages sont lues à la demande et partagées entre processus).
+    """
+    h = read_header(path)
+    n, dim = h["n_samples"], h["dim"]
+    if n:
+        hists = np.memmap(path, dtype=np.float32, mode="r", offset=h["hist_offset"], shape=(n, dim))
+        labels = np.memmap(path, dtype=np.int32, mode="r", offset=h["labels_offset"], shape=(n,))
+    else:
+        hists = np.empty((0, dim), dtype=np.float32)
+        labels = np.empty((0,), dtype=np.int32)
+    with open(path, "rb") as f:
+        f.seek(h["names_offset"])
+        names = json.loads(f.read(h["names_len"]).decode("utf-8"))
+    labels_to_name = {int(k): v for k, v in names.items()}
+    return NumpyLBPH(hists, labels), labels_to_name
+
+def save_engine(path, engine, labels_to_name):
+    """Écrire la galerie d'un NumpyLBPH."""
+    save_gallery(path, engine.histograms, engine.labels, labels_to_name)
+
+def convert_yaml(model_path=MODEL_PATH, labels_path=LABELS_PATH, out_path=GALLERY_PATH):
+    """Convertir model.yml (OpenCV) + labels.json en galerie binaire ; retourne n_samples."""
+    import cv2
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    with open(labels_path, "r", encoding="utf-8") as f:
+        labels_to_name = {int(k): v for k, v in json.load(f).items()}
+    engine = NumpyLBPH.from_opencv(recognizer)
+    save_engine(out_path, engine, labels_to_name)
+    return engine.histograms.shape[0]
+
+def write_opencv_model(path, histograms, labels):
+    """
+    Écrire un model.yml lisible par LBPHFaceRecognizer.read() directement
+    depuis des histogrammes (même contenu que recognizer.save()), sans
+    recalculer les LBP. Écriture atomique (fichier temporaire .yml puis rename).
+    """
+    import cv2
+    histograms = np.asarray(histograms, dtype=np.float32)
+    labels = np.ascontiguousarray(labels, dtype=np.int32).reshape(-1, 1)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp.{os.getpid()}{ext or '.yml'}"
+
+    fs = cv2.FileStorage(tmp, cv2.FILE_STORAGE_WRITE)
+    fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+    fs.write("threshold", float(np.finfo(np.float64).max))
+    fs.write("radius", RADIUS)
+    fs.write("neighbors", NEIGHBORS)
+    fs.write("grid_x", GRID_X)
+    fs.write("grid_y", GRID_Y)
+    fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+    for h in histograms:
+        fs.write("", h.reshape(1, -1))
+    fs.endWriteStruct()
+    fs.write("labels", labels)
+    fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Galerie LBPH binaire (memmap) : conversion depuis model.yml et inspection.")
+    parser.add_argument("--convert", action="store_true", help="Convertir model.yml + labels.json → model.bin")
+    parser.add_argument("--model", default=MODEL_PATH, help=f"Modèle YAML source (défaut: {MODEL_PATH})")
+    parser.add_argument("--labels", default=LABELS_PATH, help=f"Labels JSON source (défaut: {LABELS_PATH})")
+    parser.add_argument("--out", default=GALLERY_PATH, help=f"Galerie binaire (défaut: {GALLERY_PATH})")
+    parser.add_argument("--info", metavar="PATH", help="Afficher l'en-tête d'une galerie binaire")
+    args = parser.parse_args()
+
+    if args.convert:
+        n = convert_yaml(args.model, args.labels, args.out)
+        print(f"[OK] {n} histogrammes → {args.out} ({os.path.getsize(args.out) / 1e6:.1f} Mo)")
+    if args.info:
+        h = read_header(args.info)
+        print(f"[INFO] {args.info}: {h['n_samples']} échantillons x {h['dim']} | "
+              f"{os.path.getsize(args.info) / 1e6:.1f} Mo")
+    if not (args.convert or args.info):
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
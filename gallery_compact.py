@@ -0,0 +1,230 @@
+# gallery_compact.py
+# ------------------------------------------------------------
+# Compaction de la galerie LBPH : chaque personne est réduite à au plus K
+# prototypes, choisis par k-medoids sous la distance chi-square
+# (lbph_numpy.chi_square, celle de predict) :
+# - initialisation BUILD gloutonne (médoïde le plus central, puis celui
+#   qui réduit le plus le coût total), puis alternance affectation /
+#   recentrage jusqu'à stabilité
+# - les prototypes sont des échantillons réels : model.yml reste un
+#   modèle LBPH OpenCV valide
+# - au-delà de 'max_points' images, les médoïdes sont cherchés dans un
+#   sous-échantillon (matrice de distances n x n bornée)
+# predict coûte alors (personnes x K) comparaisons au lieu d'une par image.
+# Évaluation sur un jeu mis de côté : requêtes par blocs de EVAL_CHUNK
+# (mémoire bornée à EVAL_CHUNK x galerie distances), au plus
+# EVAL_MAX_QUERIES requêtes (temps borné) ; à l'entraînement,
+# les distances de chaque personne servent aux deux compactions (galerie
+# sans le jeu de test, galerie complète).
+# Entraînement compact : enroll --rebuild --compact K, import --compact K
+# (training.train_and_save_model) ; précision avant/après sur un jeu mis
+# de côté :
+#   python gallery_compact.py --dataset data/dataset --k 1 3 5 10
+# ------------------------------------------------------------
+import time
+import argparse
+
+import numpy as np
+
+from lbph_numpy import chi_square, compute_histograms
+
+COMPACT_ITERS = 20       # itérations max de l'alternance k-medoids
+MAX_POINTS = 500         # images par personne au plus dans la recherche
+HOLDOUT_EVERY = 5        # 1 image sur N par personne en test (évaluation)
+EVAL_CHUNK = 256         # requêtes par bloc de distances (évaluation)
+EVAL_MAX_QUERIES = 1000  # requêtes de test évaluées au plus (réparties)
+
+def kmedoids(D, k, iters=COMPACT_ITERS):
+    """Indices triés des k médoïdes d'une matrice de distances (n, n)."""
+    n = len(D)
+    if n <= k:
+        return np.arange(n)
+    # BUILD : le plus central, puis le plus grand gain sur le coût total
+    medoids = [int(np.argmin(D.sum(axis=1)))]
+    nearest = D[medoids[0]].copy()
+    for _ in range(1, k):
+        gain = np.maximum(nearest[None, :] - D, 0.0).sum(axis=1)
+        gain[medoids] = -1.0
+        m = int(np.argmax(gain))
+        medoids.append(m)
+        np.minimum(nearest, D[m], out=nearest)
+    medoids = np.array(medoids)
+
+    for _ in range(iters):
+        assign = np.argmin(D[medoids], axis=0)
+        assign[medoids] = np.arange(k)          # doublons exacts : chaque médoïde garde le sien
+        new = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(assign == c)
+            new[c] = members[np.argmin(D[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(np.sort(new), np.sort(medoids)):
+            break
+        medoids = new
+    return np.sort(medoids)
+
+def _medoids(idx, D, k):
+    """Indices (parmi 'idx') des k médoïdes ; tous si len(idx) <= k."""
+    return idx if len(idx) <= k else idx[kmedoids(D, k)]
+
+def _merge(parts):
+    return np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+
+def compact_indices(histograms, labels, k, max_points=MAX_POINTS, seed=0, holdout=None):
+    """
+    Indices (ordre d'origine) des prototypes gardés : au plus 'k' par label.
+    Les labels à k images ou moins sont gardés tels quels.
+    'holdout' (masque bool (N,) du jeu de test) → (keep, keep_train) :
+    keep_train = prototypes choisis sans les échantillons de test, avec la
+    même matrice de distances par personne (calculée une seule fois).
+    """
+    rng = np.random.default_rng(seed)
+    keep, keep_train = [], []
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        if len(idx) > max_points:
+            idx = np.sort(rng.choice(idx, max_points, replace=False))
+        D = None
+        if len(idx) > k:
+            block = np.asarray(histograms[idx], dtype=np.float32)
+            D = chi_square(block, block)
+        keep.append(_medoids(idx, D, k))
+        if holdout is not None:
+            tr = np.flatnonzero(~holdout[idx])
+            keep_train.append(_medoids(idx[tr], D[np.ix_(tr, tr)] if len(tr) > k else None, k))
+    if holdout is not None:
+        return _merge(keep), _merge(keep_train)
+    return _merge(keep)
+
+def compact_gallery(histograms, labels, k, max_points=MAX_POINTS):
+    """(histograms, labels) → (histograms, labels) compacts, au plus k par label."""
+    keep = compact_indices(histograms, labels, k, max_points)
+    return np.ascontiguousarray(histograms[keep]), labels[keep]
+
+def size_report(n_before, n_after, dim):
+    """Taille de galerie avant/après (échantillons et Mo de float32)."""
+    return {
+        "samples_before": int(n_before),
+        "samples_after": int(n_after),
+        "mb_before": round(n_before * dim * 4 / 2**20, 2),
+        "mb_after": round(n_after * dim * 4 / 2**20, 2),
+        "ratio": round(n_after / n_before, 4) if n_before else 1.0,
+    }
+
+def _top1(histograms, labels, test_idx, gallery_h, gallery_y, exclude=None, chunk=EVAL_CHUNK):
+    """
+    Précision top-1, distance moyenne au plus proche et ms/visage
+    (chi-square exact) des requêtes histograms[test_idx] contre la galerie.
+    Requêtes par blocs de 'chunk' : seuls l'argmin et le min de chaque bloc
+    sont gardés. 'exclude' : masque bool des colonnes de la galerie
+    ignorées (ex: le jeu de test quand la galerie est la matrice complète).
+    """
+    n = len(test_idx)
+    pred = np.empty(n, dtype=gallery_y.dtype)
+    best = np.empty(n, dtype=np.float32)
+    t0 = time.perf_counter()
+    for start in range(0, n, chunk):
+        sel = test_idx[start:start + chunk]
+        D = chi_square(histograms[sel], gallery_h)
+        if exclude is not None:
+            D[:, exclude] = np.inf
+        j = np.argmin(D, axis=1)
+        pred[start:start + len(sel)] = gallery_y[j]
+        best[start:start + len(sel)] = D[np.arange(len(sel)), j]
+    elapsed = time.perf_counter() - t0
+    return {
+        "top1": float(np.mean(pred == labels[test_idx])),
+        "mean_distance": float(best.mean()),
+        "ms_per_face": 1000.0 * elapsed / n,
+    }
+
+def _holdout(labels, holdout_every, max_queries=EVAL_MAX_QUERIES):
+    """
+    (requêtes, masque bool du jeu de test) ; requêtes vides si impossible.
+    Tout le jeu de test est exclu de la galerie ; au plus 'max_queries'
+    de ses images, réparties régulièrement, sont évaluées.
+    """
+    from evaluate_model import split_holdout
+    train_idx, test_idx = split_holdout(labels, holdout_every)
+    if len(train_idx) == 0:
+        test_idx = test_idx[:0]
+    mask = np.zeros(len(labels), dtype=bool)
+    mask[test_idx] = True
+    if max_queries and len(test_idx) > max_queries:
+        test_idx = test_idx[np.linspace(0, len(test_idx) - 1, max_queries).astype(np.int64)]
+    return test_idx, mask
+
+def compact_and_evaluate(histograms, labels, k, holdout_every=HOLDOUT_EVERY, max_points=MAX_POINTS):
+    """
+    Compaction de toute la galerie + précision avant/après sur un jeu mis
+    de côté, en un seul calcul de distances par personne (k-medoids lancé
+    deux fois sur la même matrice : galerie sans le test, galerie complète).
+    Retourne (keep, rows) : rows comme evaluate_compaction, [] si le jeu
+    de test est vide.
+    """
+    test_idx, mask = _holdout(labels, holdout_every)
+    if len(test_idx) == 0:
+        return compact_indices(histograms, labels, k, max_points), []
+    keep, keep_train = compact_indices(histograms, labels, k, max_points, holdout=mask)
+    # Galerie complète sans copie : toute la matrice, colonnes de test ignorées
+    full = _top1(histograms, labels, test_idx, histograms, labels, exclude=mask)
+    res = _top1(histograms, labels, test_idx, histograms[keep_train], labels[keep_train])
+    rows = [{"k": 0, "samples": int((~mask).sum()), **full, "delta_top1": 0.0},
+            {"k": k, "samples": len(keep_train), **res, "delta_top1": res["top1"] - full["top1"]}]
+    return keep, rows
+
+def evaluate_compaction(histograms, labels, ks, holdout_every=HOLDOUT_EVERY, max_points=MAX_POINTS):
+    """
+    Précision avant/après compaction sur un jeu mis de côté (1 image sur
+    'holdout_every' par personne) : la galerie d'entraînement complète puis
+    compactée à chaque K de 'ks'. Retourne [{k, samples, top1, delta_top1,
+    mean_distance, ms_per_face}, ...] (k=0 : galerie complète), [] si le
+    jeu de test est vide.
+    """
+    test_idx, mask = _holdout(labels, holdout_every)
+    if len(test_idx) == 0:
+        return []
+    full = _top1(histograms, labels, test_idx, histograms, labels, exclude=mask)
+    rows = [{"k": 0, "samples": int((~mask).sum()), **full, "delta_top1": 0.0}]
+    for k in ks:
+        _, keep = compact_indices(histograms, labels, k, max_points, holdout=mask)
+        res = _top1(histograms, labels, test_idx, histograms[keep], labels[keep])
+        rows.append({"k": k, "samples": len(keep), **res,
+                     "delta_top1": res["top1"] - full["top1"]})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compaction de la galerie LBPH (k-medoids chi-square) : évaluation.")
+    parser.add_argument("--dataset", help="Dossier <Nom>/*.png (défaut: MySQL)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10],
+                        help="Prototypes par personne à tester (défaut: 1 3 5 10)")
+    parser.add_argument("--holdout-every", type=int, default=HOLDOUT_EVERY,
+                        help=f"1 image sur N par personne en test (défaut: {HOLDOUT_EVERY})")
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS,
+                        help=f"Images par personne au plus dans la recherche des médoïdes (défaut: {MAX_POINTS})")
+    args = parser.parse_args()
+
+    from evaluate_model import load_samples
+    X, y, labels_to_name = load_samples(args.dataset)
+    if not X:
+        print("[ERREUR] Aucune image.")
+        return
+    t0 = time.perf_counter()
+    H = np.vstack([compute_histograms(np.stack(X[i:i + 256])) for i in range(0, len(X), 256)])
+    print(f"[INFO] {len(labels_to_name)} personne(s) | {len(y)} images | histogrammes en "
+          f"{time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    rows = evaluate_compaction(H, y, sorted(set(args.k)), args.holdout_every, args.max_points)
+    if not rows:
+        print("[ERREUR] Pas assez d'images pour séparer train/test.")
+        return
+    print(f"[INFO] Évaluation en {time.perf_counter() - t0:.1f}s")
+    print("| K | Galerie | Top-1 | Δ top-1 | Distance moy. | ms/visage |")
+    print("|---|---|---|---|---|---|")
+    for r in rows:
+        name = "complète" if r["k"] == 0 else r["k"]
+        print(f"| {name} | {r['samples']} | {r['top1'] * 100:.1f}% | {r['delta_top1'] * 100:+.1f} pts "
+              f"| {r['mean_distance']:.1f} | {r['ms_per_face']:.2f} |")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# identity_cache.py
+# ------------------------------------------------------------
+# Cache en mémoire des identités (persons.name → existe ?) pour la
+# boucle temps réel, afin qu'aucune requête MySQL ne tombe sur le
+# chemin d'un frame :
+# - préchargé depuis la table persons au démarrage
+# - TTL par entrée + taille bornée (éviction LRU)
+# - rafraîchi en arrière-plan (thread) : rechargement complet périodique
+#   et résolution des noms inconnus / expirés
+# - compteurs hits / misses / stale / evictions exposés via stats()
+# ------------------------------------------------------------
+import time
+import threading
+from collections import OrderedDict
+
+from db_utils import person_exists, fetch_person_names
+
+class IdentityCache:
+    def __init__(self, ttl=60.0, max_size=10000, refresh_interval=30.0,
+                 loader=fetch_person_names, checker=person_exists):
+        """
+        ttl              : durée de validité d'une entrée (s)
+        max_size         : nombre max d'entrées (les moins récemment utilisées sortent)
+        refresh_interval : période du rechargement complet en arrière-plan (s)
+        loader / checker : accès DB (tous les noms / un nom), remplaçables
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self._loader = loader
+        self._checker = checker
+
+        self._entries = OrderedDict()   # name -> (exists, t_maj)
+        self._pending = set()           # noms à résoudre par le thread
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # DB injoignable → comportement historique "mode test" (exists=True)
+        self.db_ok = True
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    # --- Chemin rapide (appelé par frame, jamais bloquant) ---
+    def exists(self, name: str) -> bool:
+        """
+        Réponse immédiate depuis le cache. Une entrée expirée est servie
+        (stale) et re-vérifiée en arrière-plan ; un nom absent est mis en
+        file et vaut False (ou True si la DB est injoignable).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                value, t = entry
+                if now - t <= self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale += 1
+                    self._pending.add(name)
+                    self._wake.set()
+                return value
+            self.misses += 1
+            self._pending.add(name)
+            self._wake.set()
+            return not self.db_ok
+
+    def invalidate(self, name=None):
+        """Oublier un nom (ou tout le cache) ; la prochaine lecture le re-résout."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self) -> dict:
+        """Compteurs du cache (copie)."""
+        with self._lock:
+            lookups = self.hits + self.stale + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "stale": self.stale,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+                "db_ok": self.db_ok,
+            }
+
+    # --- Accès DB (thread de fond ou démarrage) ---
+    def _put(self, name, value, now):
+        self._entries[name] = (value, now)
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def preload(self) -> bool:
+        """Charger tous les noms de persons (appelé au démarrage et périodiquement)."""
+        try:
+            names = self._loader()
+        except Exception as e:
+            with self._lock:
+                self.db_ok = False
+                self.errors += 1
+            print(f"[WARN] Cache identités: DB injoignable ({e})")
+            return False
+        now = time.monotonic()
+        known = set(names)
+        with self._lock:
+            # Noms disparus de la table → False (fraîchement vérifié)
+            for name in list(self._entries):
+                if name not in known:
+                    self._put(name, False, now)
+            for name in names[-self.max_size:]:
+                self._put(name, True, now)
+            self.db_ok = True
+            self.refreshes += 1
+        return True
+
+    def _resolve_pending(self):
+        with self._lock:
+            names = list(self._pending)
+            self._pending.clear()
+        for name in names:
+            try:
+                value = bool(self._checker(name))
+            except Exception:
+                with self._lock:
+                    self.db_ok = False
+                    self.errors += 1
+                continue
+            with self._lock:
+                self._put(name, value, time.monotonic())
+                self.db_ok = True
+
+    def _run(self):
+        next_refresh = time.monotonic() + self.refresh_interval
+        while not self._stop.is_set():
+            self._wake.wait(timeout=max(0.0, next_refresh - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if time.monotonic() >= next_refresh:
+                self.preload()
+                next_refresh = time.monotonic() + self.refresh_interval
+            # DB injoignable : attendre le prochain rechargement plutôt que
+            # de retenter à chaque frame
+            if self.db_ok:
+                self._resolve_pending()
+
+    def start(self):
+        """Précharger puis lancer le thread de rafraîchissement (daemon)."""
+        self.preload()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="identity-cache", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Arrêter le thread de rafraîchissement."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
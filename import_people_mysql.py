@@ -4,88 +4,165 @@
 # - Parcourir le dossier "people/<Nom>/*" (images brutes)
 # - Pour chaque image : détecter/recadrer le visage (Haar), sauvegarder
 #   dans "data/dataset/<Nom>/...", puis indexer le chemin dans MySQL.
+#   (--workers N : décodage + détection en parallèle, écrivain unique)
+# - Manifeste (table import_manifest : chemin + taille + mtime/SHA-1) :
+#   seules les photos nouvelles ou modifiées sont retraitées, sans doublon
+#   de crop ni de ligne 'images' ; points de reprise réguliers (reprise
+#   après interruption)
+# - Crops nommés <Nom>_NNN.png à partir du plus grand numéro existant ;
+#   au démarrage, les crops jamais indexés (écrits juste avant une
+#   interruption, sans point de reprise) sont supprimés
 # - À la fin : entraîner le modèle LBPH et sauvegarder "data/model.yml"
-#   + "data/labels.json".
+#   + "data/labels.json" + "data/model.bin" (galerie binaire memmap)
+#   (+ "data/model.ivf", index ANN, avec --ann ou s'il existe déjà),
+#   puis "data/model.version" (rechargement à chaud des recognizers).
+#   Les histogrammes LBP sont repris du cache "data/features/" : seules
+#   les images nouvelles/modifiées sont recalculées (--no-cache : tout).
+# - Filtre qualité (face_quality.py) : crops flous, trop petits, mal
+#   exposés ou sans contraste ni écrits ni indexés (statut 'low_quality'
+#   dans le manifeste ; --rescan après un changement de seuils) ;
+#   --max-per-person N : galerie limitée aux N meilleurs crops par personne
+# - --compact K : modèle compact, K prototypes par personne (gallery_compact.py)
+# Détection et entraînement complet partagés avec l'enrôlement (core.py,
+# training.py) ; les workers chargent le détecteur à leur 1re image.
 # ------------------------------------------------------------
 import os
 import cv2
-import json
+import time
+import hashlib
 import argparse
 import numpy as np
 from pathlib import Path
+from functools import partial
+from multiprocessing import Pool
 
-from db_utils import get_or_create_person_id, add_image_record, fetch_people_and_images
+from core import DATASET_DIR, MODEL_PATH, DETECT_WIDTH, crop_largest_face, crop_files, next_crop_number
+from training import train_and_save_model
+from face_quality import assess, add_quality_arguments, gate_from_args
+from db_utils import get_or_create_person_id, fetch_import_manifest, save_import_checkpoint, fetch_image_rows
 
-# Dossiers/fichiers
-DATA_DIR = "data"
-DATASET_DIR = os.path.join(DATA_DIR, "dataset")
-MODEL_PATH = os.path.join(DATA_DIR, "model.yml")
-LABELS_PATH = os.path.join(DATA_DIR, "labels.json")
-PEOPLE_DIR = "people"  # dossier des photos brutes
+# Dossier des photos brutes
+PEOPLE_DIR = "people"
 
 # Extensions autorisées
 ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
 
-# Détecteur Haar pour visages
-FACE_CASCADE = cv2.CascadeClassifier(
-    cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-)
-
-os.makedirs(DATASET_DIR, exist_ok=True)
-
-def detect_and_crop_face(img_bgr, size=(200, 200)):
-    """Détecter le plus grand visage ; retourner image recadrée (grayscale, resized)."""
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    faces = FACE_CASCADE.detectMultiScale(gray, 1.1, 5, minSize=(80, 80))
-    if len(faces) == 0:
-        return None
-    x, y, w, h = sorted(faces, key=lambda b: b[2] * b[3], reverse=True)[0]
-    roi = gray[y:y + h, x:x + w]
-    return cv2.resize(roi, size)
-
-def build_training_data():
-    """Construire X, y, labels_to_name depuis DB + disque."""
-    people, images = fetch_people_and_images()
-    if not people:
-        return [], np.array([], dtype=np.int32), {}
-
-    id_to_label = {pid: idx for idx, (pid, _) in enumerate(people)}
-    labels_to_name = {id_to_label[pid]: name for (pid, name) in people}
-
-    X, y = [], []
-    for (person_id, path) in images:
-        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            continue
-        X.append(img)
-        y.append(id_to_label[person_id])
+# Motifs d'échec renvoyés par les workers
+ERR_READ = "Lecture impossible"
+ERR_NO_FACE = "Aucun visage détecté"
+ERR_LOW_QUALITY = "Qualité insuffisante"
 
-    return X, np.array(y, dtype=np.int32), labels_to_name
+# Statut d'une photo source dans le manifeste (table import_manifest)
+STATUS_OK = "ok"
+STATUS_NO_FACE = "no_face"
+STATUS_UNREADABLE = "unreadable"
+STATUS_LOW_QUALITY = "low_quality"
 
-def train_and_save_model():
-    """Entraîner LBPH et sauvegarder modèle + labels.json."""
-    X, y, labels_to_name = build_training_data()
-    if len(X) == 0:
-        print("[INFO] Aucun échantillon pour l'entraînement.")
-        return
-    recognizer = cv2.face.LBPHFaceRecognizer_create(radius=1, neighbors=8, grid_x=8, grid_y=8)
-    recognizer.train(X, y)
-    os.makedirs(DATA_DIR, exist_ok=True)
-    recognizer.save(MODEL_PATH)
-    with open(LABELS_PATH, "w", encoding="utf-8") as f:
-        json.dump(labels_to_name, f, ensure_ascii=False, indent=2)
-    print(f"[OK] Modèle entraîné → {MODEL_PATH}")
-    print(f"[OK] Labels sauvegardés → {LABELS_PATH}")
-
-def import_people(root="people"):
-    """Scanner 'people/<Nom>/*' et importer toutes les images valides."""
+# Point de reprise (images + manifeste) tous les N fichiers traités
+CHECKPOINT_EVERY = 200
+
+def _rate(count, seconds):
+    """Débit formaté (images/s) ; '-' si la durée est nulle."""
+    return f"{count / seconds:.1f}" if seconds > 0 else "-"
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+def _process_image(img_path, detect_width=DETECT_WIDTH, want_hash=False, quality=None):
+    """
+    Étape worker (exécutée dans un processus du pool) : lire et décoder
+    l'image brute (empreinte SHA-1 des octets si 'want_hash') puis
+    détecter/recadrer le visage et, si 'quality' (seuils de
+    face_quality.assess), vérifier sa qualité.
+    Retourne (img_path, face|None, erreur|None, sha1|None, t_decode, t_detect,
+    motif de rejet qualité|None).
+    """
+    t0 = time.perf_counter()
+    try:
+        data = Path(img_path).read_bytes()
+    except OSError:
+        return img_path, None, ERR_READ, None, time.perf_counter() - t0, 0.0, None
+    digest = _sha1(data) if want_hash else None
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    t1 = time.perf_counter()
+    if img is None:
+        return img_path, None, ERR_READ, digest, t1 - t0, 0.0, None
+    face, box = crop_largest_face(img, detect_width=detect_width)
+    reason = None
+    if face is not None and quality is not None:
+        _, reasons, _ = assess(face[None], [min(box[2], box[3])], **quality)
+        reason = reasons[0]
+    t2 = time.perf_counter()
+    if face is None:
+        return img_path, None, ERR_NO_FACE, digest, t1 - t0, t2 - t1, None
+    if reason is not None:
+        return img_path, None, ERR_LOW_QUALITY, digest, t1 - t0, t2 - t1, reason
+    return img_path, face, None, digest, t1 - t0, t2 - t1, None
+
+def _flush_checkpoint(images, manifest, stale):
+    """Enregistrer le point de reprise (images + manifeste, une transaction) ; retourne la durée (s)."""
+    if not (images or manifest or stale):
+        return 0.0
+    t0 = time.perf_counter()
+    save_import_checkpoint(images, manifest, stale)
+    images.clear()
+    manifest.clear()
+    stale.clear()
+    return time.perf_counter() - t0
+
+def _remove_orphan_crops(out_dir, name, indexed):
+    """
+    Supprimer les crops '<name>_NNN' de 'out_dir' absents de la table images
+    ('indexed' : chemins absolus) : écrits avant une interruption, leur
+    point de reprise n'a jamais été enregistré. Retourne le nombre supprimé.
+    """
+    removed = 0
+    for path in crop_files(out_dir, name).values():
+        if os.path.abspath(path) not in indexed:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                print(f"[WARN] Crop orphelin non supprimé ({e}): {path}")
+    return removed
+
+def _init_worker():
+    """Un seul thread OpenCV par processus : le parallélisme vient du pool."""
+    cv2.setNumThreads(1)
+
+def import_people(root="people", workers=1, detect_width=DETECT_WIDTH, use_cache=True,
+                  ann=False, ann_lists=None, use_hash=False, rescan=False,
+                  checkpoint_every=CHECKPOINT_EVERY, gate=None, max_per_person=0, compact_k=0):
+    """
+    Scanner 'people/<Nom>/*' et importer les images nouvelles ou modifiées.
+    Le manifeste (table import_manifest, clé = chemin relatif à 'root')
+    garde (taille, mtime, SHA-1, statut, crop) de chaque photo source :
+    - fichier inchangé (taille + mtime, ou même SHA-1 avec use_hash) → ignoré
+    - fichier modifié → son crop est réécrit au même chemin (aucune ligne
+      'images' en double) ; plus de visage → crop et ligne supprimés
+    - point de reprise tous les 'checkpoint_every' fichiers : un import
+      interrompu reprend où il s'était arrêté
+    rescan=True ignore le manifeste (tout retraiter, toujours sans doublon).
+    Avec workers > 1, décodage + détection tournent dans un pool de processus ;
+    les résultats reviennent dans l'ordre d'origine vers un seul écrivain
+    (écriture disque + DB), ce qui garde le nommage <nom>_NNN.png déterministe.
+    'gate' (face_quality.QualityGate) : crops de qualité insuffisante rejetés
+    (comptés par motif) ; max_per_person, compact_k : cf. train_and_save_model.
+    """
     root_path = Path(root)
     if not root_path.exists():
         print(f"[ERREUR] Dossier '{root}' introuvable.")
         return
 
-    total_ok, total_fail = 0, 0
+    manifest = fetch_import_manifest()
+    indexed = {os.path.abspath(path) for _, _, path in fetch_image_rows()}
 
+    # Préparer les personnes (ordre trié) et la liste des tâches
+    tasks = []      # [(name, img_path, key, stat, entry), ...] dans l'ordre de traitement
+    persons = {}    # name -> [pid, out_dir, dernier numéro de crop utilisé]
+    n_orphans = 0
+    touched = []    # lignes du manifeste à rafraîchir (mtime changé, contenu identique)
+    n_unchanged = 0
     for person_dir in sorted([p for p in root_path.iterdir() if p.is_dir()]):
         name = person_dir.name.strip()
         if not name:
@@ -95,42 +172,144 @@ def import_people(root="people"):
         out_dir = Path(DATASET_DIR) / name
         out_dir.mkdir(parents=True, exist_ok=True)
 
-        # Compter ce qui existe déjà pour nommer en séquence
-        existing_count = len([f for f in out_dir.iterdir() if f.is_file()])
+        # Numérotation après le plus grand numéro existant (jamais un
+        # numéro libéré par une suppression : il écraserait un autre crop)
+        n_orphans += _remove_orphan_crops(out_dir, name, indexed)
+        persons[name] = [pid, out_dir, next_crop_number(out_dir, name) - 1]
 
         for img_path in sorted(person_dir.rglob("*")):
-            if not img_path.is_file() or img_path.suffix.lower() not in ALLOWED_EXT:
+            if not (img_path.is_file() and img_path.suffix.lower() in ALLOWED_EXT):
                 continue
+            key = img_path.relative_to(root_path).as_posix()
+            st = img_path.stat()
+            entry = manifest.get(key)
+            if entry is not None and not rescan:
+                size, mtime_ns, digest, status, crop_path = entry
+                if (size, mtime_ns) == (st.st_size, st.st_mtime_ns):
+                    n_unchanged += 1
+                    continue
+                if use_hash and digest and size == st.st_size and _sha1(img_path.read_bytes()) == digest:
+                    touched.append((key, pid, st.st_size, st.st_mtime_ns, digest, status, crop_path))
+                    n_unchanged += 1
+                    continue
+            tasks.append((name, img_path, key, st, entry))
 
-            img = cv2.imread(str(img_path))
-            if img is None:
-                print(f"[WARN] Lecture impossible: {img_path}")
-                total_fail += 1
-                continue
+    if n_orphans:
+        print(f"[INFO] {n_orphans} crop(s) orphelin(s) d'un import interrompu supprimé(s)")
+    print(f"[INFO] Manifeste: {n_unchanged} fichier(s) inchangé(s) ignoré(s), {len(tasks)} à traiter")
+
+    total_ok, total_fail, n_decoded = 0, 0, 0
+    pending_images = []     # [(pid, path), ...] nouvelles lignes 'images'
+    pending_manifest = touched
+    pending_stale = []      # crops dont la ligne 'images' disparaît
+    t_decode = t_detect = t_write = t_db = 0.0
+    t_start = time.perf_counter()
+
+    pool = None
+    paths = [task[1] for task in tasks]
+    process = partial(_process_image, detect_width=detect_width, want_hash=use_hash,
+                      quality=gate.thresholds() if gate is not None else None)
+    if workers > 1:
+        pool = Pool(processes=workers, initializer=_init_worker)
+        results = pool.imap(process, paths, chunksize=max(1, len(paths) // (workers * 8)))
+    else:
+        results = map(process, paths)
+
+    try:
+        # Écrivain unique : résultats consommés dans l'ordre des tâches
+        for i, ((name, _, key, st, entry), (img_path, face, err, digest, dt_decode, dt_detect, reason)) \
+                in enumerate(zip(tasks, results), 1):
+            t_decode += dt_decode
+            t_detect += dt_detect
+            if err != ERR_READ:
+                n_decoded += 1
+            if gate is not None and err in (None, ERR_LOW_QUALITY):
+                gate.record([reason])
+
+            person = persons[name]
+            pid, out_dir = person[0], person[1]
+            old_crop = entry[4] if entry is not None else None
 
-            face = detect_and_crop_face(img)
             if face is None:
-                print(f"[WARN] Aucun visage détecté: {img_path}")
+                print(f"[WARN] {err}{f' ({reason})' if reason else ''}: {img_path}")
                 total_fail += 1
-                continue
+                # Photo modifiée sans visage exploitable : retirer l'ancien crop
+                if old_crop:
+                    pending_stale.append(old_crop)
+                    if os.path.exists(old_crop):
+                        os.remove(old_crop)
+                status = {ERR_READ: STATUS_UNREADABLE, ERR_LOW_QUALITY: STATUS_LOW_QUALITY}.get(err, STATUS_NO_FACE)
+                pending_manifest.append((key, pid, st.st_size, st.st_mtime_ns, digest, status, None))
+            else:
+                if old_crop:
+                    save_path = Path(old_crop)      # réécrit en place, ligne 'images' conservée
+                else:
+                    person[2] += 1
+                    save_path = out_dir / f"{name}_{person[2]:03d}.png"
+                    pending_images.append((pid, str(save_path)))
 
-            existing_count += 1
-            save_path = out_dir / f"{name}_{existing_count:03d}.png"
-            cv2.imwrite(str(save_path), face)
+                t0 = time.perf_counter()
+                cv2.imwrite(str(save_path), face)
+                t_write += time.perf_counter() - t0
 
-            add_image_record(pid, str(save_path))
-            total_ok += 1
-            print(f"[OK] {name} <= {img_path.name} → {save_path.name}")
+                pending_manifest.append((key, pid, st.st_size, st.st_mtime_ns, digest, STATUS_OK, str(save_path)))
+                total_ok += 1
+                print(f"[OK] {name} <= {img_path.name} → {save_path.name}")
 
-    print(f"\n[SUMMARY] Import réussi: {total_ok} | Échecs: {total_fail}")
-    train_and_save_model()
+            # Point de reprise : images + manifeste dans une transaction
+            if i % checkpoint_every == 0:
+                t_db += _flush_checkpoint(pending_images, pending_manifest, pending_stale)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        t_db += _flush_checkpoint(pending_images, pending_manifest, pending_stale)
+
+    elapsed = time.perf_counter() - t_start
+    n = len(tasks)
+    print(f"\n[SUMMARY] Import réussi: {total_ok} | Échecs: {total_fail} | Inchangés: {n_unchanged}")
+    if gate is not None:
+        print(f"[INFO] Filtre qualité: {gate.stats()}")
+    print(f"[PERF] workers={workers} | total: {n} images en {elapsed:.2f}s ({_rate(n, elapsed)} img/s)")
+    print(f"[PERF] decode: {_rate(n, t_decode)} img/s/worker ({t_decode:.2f}s) | "
+          f"detect: {_rate(n_decoded, t_detect)} img/s/worker ({t_detect:.2f}s) | "
+          f"write: {_rate(total_ok, t_write)} img/s ({t_write:.2f}s) | "
+          f"db: {_rate(total_ok, t_db)} img/s ({t_db:.2f}s)")
+    if n == 0 and os.path.exists(MODEL_PATH):
+        print("[INFO] Aucun changement → modèle conservé.")
+        return
+    train_and_save_model(use_cache, ann, ann_lists, max_per_person, compact_k)
 
 def main():
     parser = argparse.ArgumentParser(description="Importer toutes les photos depuis 'people/<Nom>/' puis entraîner LBPH.")
     parser.add_argument("--root", default=PEOPLE_DIR, help="Dossier racine des photos (par défaut: people)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de processus pour décodage + détection (par défaut: 1 = séquentiel)")
+    parser.add_argument("--detect-width", type=int, default=DETECT_WIDTH,
+                        help=f"Largeur de détection en px, 0 = pleine résolution (par défaut: {DETECT_WIDTH})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recalculer tous les histogrammes (ignorer le cache data/features/)")
+    parser.add_argument("--ann", action="store_true",
+                        help="Construire aussi l'index ANN data/model.ivf (grandes galeries)")
+    parser.add_argument("--ann-lists", type=int, default=0,
+                        help="Nombre de listes de l'index ANN (défaut: ~sqrt(N))")
+    parser.add_argument("--hash", action="store_true",
+                        help="Empreinte SHA-1 des photos : un fichier seulement re-daté n'est pas retraité")
+    parser.add_argument("--rescan", action="store_true",
+                        help="Ignorer le manifeste et retraiter toutes les photos (sans doublon)")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help=f"Point de reprise tous les N fichiers (par défaut: {CHECKPOINT_EVERY})")
+    parser.add_argument("--max-per-person", type=int, default=0,
+                        help="Galerie limitée aux N crops de meilleure qualité par personne (0 = tous, défaut)")
+    parser.add_argument("--compact", type=int, default=0, metavar="K",
+                        help="Modèle compact : au plus K prototypes par personne (0 = galerie complète, défaut)")
+    add_quality_arguments(parser)
     args = parser.parse_args()
-    import_people(args.root)
+    import_people(args.root, workers=max(1, args.workers), detect_width=args.detect_width,
+                  use_cache=not args.no_cache, ann=args.ann, ann_lists=args.ann_lists or None,
+                  use_hash=args.hash, rescan=args.rescan, checkpoint_every=max(1, args.checkpoint_every),
+                  gate=gate_from_args(args), max_per_person=max(0, args.max_per_person),
+                  compact_k=max(0, args.compact))
 
 if __name__ == "__main__":
-    import argparse
     main()
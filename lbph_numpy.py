@@ -0,0 +1,205 @@
+# lbph_numpy.py
+# ------------------------------------------------------------
+# Moteur LBPH en NumPy, compatible avec cv2.face.LBPHFaceRecognizer
+# (radius=1, neighbors=8, grid_x=8, grid_y=8) :
+# - histogrammes de la galerie dans une seule matrice float32 contiguë
+# - codes LBP de tous les visages d'un frame calculés en une passe
+#   vectorisée (batch B x H x W)
+# - distances chi-square (HISTCMP_CHISQR_ALT, comme OpenCV) pour tout le
+#   batch par opérations matricielles, par blocs de galerie
+# - top-k (label, distance) par visage ; le top-1 correspond à predict()
+# ------------------------------------------------------------
+import numpy as np
+
+RADIUS = 1
+NEIGHBORS = 8
+GRID_X = 8
+GRID_Y = 8
+NUM_PATTERNS = 2 ** NEIGHBORS
+
+_EPS = np.finfo(np.float32).eps
+_TINY = np.finfo(np.float32).tiny
+
+def _sampling_points(radius=RADIUS, neighbors=NEIGHBORS):
+    """
+    Points d'échantillonnage circulaires et poids bilinéaires, calculés
+    exactement comme elbp_() d'OpenCV (float32).
+    """
+    points = []
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / np.float32(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / np.float32(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty = np.float32(y - fy)
+        tx = np.float32(x - fx)
+        one = np.float32(1)
+        w1 = (one - tx) * (one - ty)
+        w2 = tx * (one - ty)
+        w3 = (one - tx) * ty
+        w4 = tx * ty
+        points.append((fx, fy, cx, cy, w1, w2, w3, w4))
+    return points
+
+_POINTS = _sampling_points()
+
+def lbp_codes(batch):
+    """
+    Codes LBP circulaires (radius=1, neighbors=8) d'un batch d'images
+    uint8 (B, H, W) → int32 (B, H-2, W-2), en une passe vectorisée.
+    """
+    src = np.asarray(batch, dtype=np.float32)
+    if src.ndim == 2:
+        src = src[None]
+    r = RADIUS
+    _, H, W = src.shape
+    center = src[:, r:H - r, r:W - r]
+    codes = np.zeros(center.shape, dtype=np.int32)
+
+    def shifted(dy, dx):
+        return src[:, r + dy:H - r + dy, r + dx:W - r + dx]
+
+    for n, (fx, fy, cx, cy, w1, w2, w3, w4) in enumerate(_POINTS):
+        t = w1 * shifted(fy, fx)
+        t += w2 * shifted(fy, cx)
+        t += w3 * shifted(cy, fx)
+        t += w4 * shifted(cy, cx)
+        bit = (t > center) | (np.abs(t - center) < _EPS)
+        codes |= bit.astype(np.int32) << n
+    return codes
+
+def spatial_histograms(codes, grid_x=GRID_X, grid_y=GRID_Y):
+    """
+    Histogrammes spatiaux normalisés (comme spatial_histogram() d'OpenCV) :
+    (B, h, w) codes → float32 (B, grid_x*grid_y*256). Les cellules font
+    w//grid_x x h//grid_y pixels ; le reste en bord d'image est ignoré.
+    """
+    B, h, w = codes.shape
+    ch, cw = h // grid_y, w // grid_x
+    cells = codes[:, :ch * grid_y, :cw * grid_x]
+    cells = cells.reshape(B, grid_y, ch, grid_x, cw).transpose(0, 1, 3, 2, 4)
+    cells = cells.reshape(B, grid_y * grid_x, ch * cw)
+
+    # Un seul bincount pour tout le batch : index = (visage, cellule, code)
+    n_cells = grid_x * grid_y
+    offsets = (np.arange(B * n_cells, dtype=np.int64) * NUM_PATTERNS).reshape(B, n_cells, 1)
+    counts = np.bincount((cells + offsets).ravel(), minlength=B * n_cells * NUM_PATTERNS)
+    hist = counts.reshape(B, n_cells * NUM_PATTERNS).astype(np.float32)
+    hist /= np.float32(ch * cw)
+    return hist
+
+def compute_histograms(rois):
+    """Histogrammes LBPH (B, 16384) d'un batch de ROI uint8 de même taille."""
+    return spatial_histograms(lbp_codes(rois))
+
+def chi_square(queries, gallery, max_elems=1 << 20):
+    """
+    Distances chi-square (CHISQR_ALT d'OpenCV : 2 * Σ (a-b)² / (a+b))
+    entre chaque requête (B, D) et chaque ligne de la galerie (M, D) → (B, M).
+    La galerie est parcourue par blocs d'au plus 'max_elems' flottants
+    (~4 Mo, reste en cache) avec des tampons réutilisés.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    B, M = queries.shape[0], gallery.shape[0]
+    D = queries.shape[1]
+    out = np.empty((B, M), dtype=np.float32)
+    if M == 0:
+        return out
+    # Zéros de la requête → plus petit float32 normal : quand a = b = 0 le
+    # terme vaut 0/tiny = 0 (pas de division 0/0), et ailleurs tiny est
+    # absorbé par l'addition (résultat identique au bit près).
+    q = np.where(queries > 0, queries, _TINY).astype(np.float32)[:, None, :]
+    block = max(1, min(M, max_elems // max(1, B * D)))
+    num = np.empty((B, block, D), dtype=np.float32)
+    den = np.empty_like(num)
+    for start in range(0, M, block):
+        g = gallery[None, start:start + block, :]
+        n = g.shape[1]
+        nu, de = num[:, :n], den[:, :n]
+        np.subtract(g, q, out=nu)
+        np.square(nu, out=nu)
+        np.add(g, q, out=de)
+        np.divide(nu, de, out=nu)
+        out[:, start:start + n] = 2.0 * nu.sum(axis=2)
+    return out
+
+def rank_labels(row, labels, k=1, threshold=np.inf):
+    """
+    Top-k [(label, distance), ...] d'une ligne de distances (M,) vers des
+    échantillons de labels (M,) : un label au plus une fois, distance
+    croissante ; [(-1, inf)] si rien sous le seuil.
+    """
+    if k == 1:
+        # argmin : premier minimum, comme la boucle de predict() d'OpenCV
+        idx = int(np.argmin(row))
+        d = float(row[idx])
+        return [(int(labels[idx]), d)] if d < threshold else [(-1, float("inf"))]
+    # Ordre stable : à distance égale, premier échantillon (comme OpenCV)
+    order = np.argsort(row, kind="stable")
+    top, seen = [], set()
+    for idx in order:
+        label = int(labels[idx])
+        if label in seen:
+            continue
+        d = float(row[idx])
+        if d >= threshold:
+            break
+        seen.add(label)
+        top.append((label, d))
+        if len(top) == k:
+            break
+    return top or [(-1, float("inf"))]
+
+class NumpyLBPH:
+    """
+    Galerie LBPH en mémoire : histograms float32 (M, 16384) contiguë et
+    labels int32 (M,). Même interface predict() que le reconnaisseur OpenCV,
+    plus predict_batch() pour tous les visages d'un frame.
+    """
+
+    def __init__(self, histograms=None, labels=None):
+        if histograms is None:
+            histograms = np.empty((0, GRID_X * GRID_Y * NUM_PATTERNS), dtype=np.float32)
+            labels = np.empty((0,), dtype=np.int32)
+        self.histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32).ravel()
+        self.threshold = np.inf
+
+    @classmethod
+    def from_opencv(cls, recognizer):
+        """Copier la galerie d'un cv2.face.LBPHFaceRecognizer déjà chargé."""
+        hists = recognizer.getHistograms()
+        if len(hists) == 0:
+            return cls()
+        return cls(np.vstack([h.reshape(1, -1) for h in hists]), recognizer.getLabels())
+
+    def train(self, images, labels):
+        """Remplacer la galerie (équivalent recognizer.train)."""
+        self.histograms = compute_histograms(np.stack(images))
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+
+    def update(self, images, labels):
+        """Ajouter des échantillons (équivalent recognizer.update)."""
+        self.histograms = np.ascontiguousarray(
+            np.vstack([self.histograms, compute_histograms(np.stack(images))]))
+        self.labels = np.concatenate([self.labels, np.asarray(labels, dtype=np.int32).ravel()])
+
+    def distances(self, rois):
+        """Distances (B, M) entre les ROI et tous les échantillons de la galerie."""
+        return chi_square(compute_histograms(rois), self.histograms)
+
+    def predict_batch(self, rois, k=1):
+        """
+        Top-k par visage : liste (une entrée par ROI) de [(label, distance), ...]
+        triée par distance croissante, un label au plus une fois (distance
+        du plus proche échantillon de ce label).
+        """
+        if len(rois) == 0:
+            return []
+        if self.histograms.shape[0] == 0:
+            return [[(-1, float("inf"))] for _ in rois]
+        return [rank_labels(row, self.labels, k, self.threshold) for row in self.distances(rois)]
+
+    def predict(self, roi):
+        """(label, distance) du plus proche échantillon, comme recognizer.predict."""
+        return self.predict_batch([roi], k=1)[0][0]
@@ -0,0 +1,294 @@
+# live_metrics.py
+# ------------------------------------------------------------
+# Instrumentation de la boucle temps réel (recognize_live_mysql) :
+# - un histogramme glissant par étape (capture, cvtColor, detect, resize,
+#   quality, predict, person_exists, draw, imshow, ...) : fenêtre des N
+#   dernières mesures pour p50/p95/p99 + compteurs cumulés par seaux
+#   (Prometheus)
+# - compteurs (frames, visages, lectures échouées) et FPS glissant
+# - sources externes (stats du pipeline, du cache d'identités, ...)
+# - export périodique par un thread de fond : lignes JSON (JSONL) et/ou
+#   fichier texte Prometheus (collecteur textfile de node_exporter)
+# - MemoryStats : collectes du GC par génération et durée des pauses
+#   (gc.callbacks), blocs alloués, RSS, tracemalloc en option
+# Coût par mesure : une affectation dans un anneau + un bisect sous verrou
+# (~1 µs) ; les quantiles ne sont calculés qu'à l'export.
+# ------------------------------------------------------------
+import gc
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import tracemalloc
+
+import numpy as np
+
+STAGES = ("capture", "cvtColor", "detect", "track", "resize", "quality", "predict",
+          "person_exists", "draw", "imshow")
+
+# Bornes des seaux (secondes), comme un histogramme Prometheus
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class RollingHistogram:
+    """Dernières 'window' mesures (quantiles) + seaux/somme/compte cumulés."""
+
+    def __init__(self, window=512):
+        self.window = window
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)   # dernier seau = +Inf
+        self._ring = [0.0] * window
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._ring[self.count % self.window] = seconds
+            self.count += 1
+            self.sum += seconds
+            self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = min(self.count, self.window)
+            values = np.array(self._ring[:n]) if n else None
+            count, total, buckets = self.count, self.sum, list(self.buckets)
+        out = {"count": count, "sum_s": total, "buckets": buckets}
+        if values is not None:
+            p50, p95, p99 = np.percentile(values, (50, 95, 99)) * 1000.0
+            out.update({"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+                        "p99_ms": round(float(p99), 3),
+                        "mean_ms": round(float(values.mean()) * 1000.0, 3),
+                        "max_ms": round(float(values.max()) * 1000.0, 3)})
+        return out
+
+class LiveMetrics:
+    """
+    Registre des mesures de la boucle live. Usage :
+        t0 = time.perf_counter(); ...; metrics.observe("detect", time.perf_counter() - t0)
+        metrics.frame_done()          # un frame affiché
+        metrics.incr("faces", 3)
+    """
+
+    def __init__(self, window=512, fps_window=64):
+        self.started = time.time()
+        self.window = window
+        self.stages = {name: RollingHistogram(window) for name in STAGES}
+        self.counters = {"frames": 0, "faces": 0, "read_failures": 0}
+        self.sources = {}
+        self._frame_times = [0.0] * fps_window
+        self._lock = threading.Lock()
+        self._overlay = ([], 0.0)
+
+    def observe(self, stage, seconds):
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages.setdefault(stage, RollingHistogram(self.window))
+        hist.observe(seconds)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def frame_done(self):
+        """Compter un frame affiché (FPS glissant sur les derniers frames)."""
+        now = time.perf_counter()
+        with self._lock:
+            n = self.counters["frames"]
+            self._frame_times[n % len(self._frame_times)] = now
+            self.counters["frames"] = n + 1
+
+    def fps(self):
+        with self._lock:
+            n = min(self.counters["frames"], len(self._frame_times))
+            if n < 2:
+                return 0.0
+            times = self._frame_times[:n]
+        span = max(times) - min(times)
+        return (n - 1) / span if span > 0 else 0.0
+
+    def add_source(self, name, fn):
+        """Ajouter des statistiques externes : fn() -> dict (ex: pipeline.stats)."""
+        self.sources[name] = fn
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        snap = {
+            "ts": round(time.time(), 3),
+            "uptime_s": round(time.time() - self.started, 1),
+            "fps": round(self.fps(), 2),
+            **counters,
+            "stages": {name: h.snapshot() for name, h in self.stages.items() if h.count},
+        }
+        for name, fn in self.sources.items():
+            try:
+                snap[name] = fn()
+            except Exception as e:
+                snap[name] = {"error": str(e)}
+        return snap
+
+    def overlay_lines(self, refresh=0.5):
+        """Lignes courtes (FPS, p50 par étape) pour l'affichage, recalculées toutes les 'refresh' s."""
+        lines, t = self._overlay
+        now = time.perf_counter()
+        if now - t < refresh and lines:
+            return lines
+        lines = [f"FPS {self.fps():.1f} | frames {self.counters['frames']}"]
+        for name, h in self.stages.items():
+            if h.count:
+                s = h.snapshot()
+                lines.append(f"{name}: p50 {s['p50_ms']:.1f} / p95 {s['p95_ms']:.1f} ms")
+        self._overlay = (lines, now)
+        return lines
+
+class MemoryStats:
+    """
+    Allocations et ramasse-miettes du processus, à brancher comme source :
+        mem = MemoryStats(); metrics.add_source("memory", mem.stats); ...; mem.stop()
+    'trace_alloc' : tracemalloc actif (mémoire Python courante/pic), coûteux
+    (~x2 sur les allocations) : pour le diagnostic seulement.
+    """
+
+    def __init__(self, trace_alloc=False):
+        self.collections = [0, 0, 0]
+        self.pause_total_s = 0.0
+        self.pause_max_s = 0.0
+        self._t0 = None
+        self.trace_alloc = trace_alloc and not tracemalloc.is_tracing()
+        if self.trace_alloc:
+            tracemalloc.start()
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._t0 = time.perf_counter()
+        elif self._t0 is not None:
+            pause = time.perf_counter() - self._t0
+            self._t0 = None
+            self.collections[info["generation"]] += 1
+            self.pause_total_s += pause
+            self.pause_max_s = max(self.pause_max_s, pause)
+
+    @staticmethod
+    def rss_mb():
+        """Mémoire résidente (Mo) : /proc/self/statm, sinon pic via resource."""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+        except (OSError, ValueError, IndexError, AttributeError):
+            pass
+        try:
+            import resource
+        except ImportError:  # Windows
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+    def stats(self) -> dict:
+        out = {
+            "gc_gen0": self.collections[0],
+            "gc_gen1": self.collections[1],
+            "gc_gen2": self.collections[2],
+            "gc_pause_total_ms": round(self.pause_total_s * 1000, 3),
+            "gc_pause_max_ms": round(self.pause_max_s * 1000, 3),
+            "allocated_blocks": sys.getallocatedblocks(),
+        }
+        rss = self.rss_mb()
+        if rss is not None:
+            out["rss_mb"] = round(rss, 1)
+        if self.trace_alloc and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            out["traced_mb"] = round(current / 2**20, 2)
+            out["traced_peak_mb"] = round(peak / 2**20, 2)
+        return out
+
+    def stop(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        if self.trace_alloc:
+            tracemalloc.stop()
+
+def to_prometheus(snap, prefix="faceid"):
+    """Snapshot → format texte Prometheus (histogrammes par étape + jauges)."""
+    out = [f"# TYPE {prefix}_stage_seconds histogram"]
+    for stage, s in snap["stages"].items():
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), s["buckets"]):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            out.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        out.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {s["sum_s"]:.6f}')
+        out.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+    out.append(f"# TYPE {prefix}_fps gauge")
+    out.append(f"{prefix}_fps {snap['fps']}")
+    for key, value in snap.items():
+        if key in ("ts", "fps", "stages"):
+            continue
+        if isinstance(value, dict):
+            # Sources externes : valeurs numériques exportées en jauges
+            for k, v in value.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    out.append(f"{prefix}_{key}_{k} {v}")
+        elif isinstance(value, (int, float)):
+            kind = "gauge" if key == "uptime_s" else "counter"
+            name = f"{prefix}_{key}" if kind == "gauge" else f"{prefix}_{key}_total"
+            out.append(f"# TYPE {name} {kind}")
+            out.append(f"{name} {value}")
+    return "\n".join(out) + "\n"
+
+class MetricsExporter:
+    """
+    Thread de fond : toutes les 'interval' secondes, ajouter un snapshot à
+    'jsonl_path' et/ou réécrire 'prom_path' (écriture atomique). Un dernier
+    export est fait à stop().
+    """
+
+    def __init__(self, metrics, interval=10.0, jsonl_path=None, prom_path=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.exports = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export(self):
+        snap = self.metrics.snapshot()
+        if self.jsonl_path:
+            # Seaux cumulés réservés à Prometheus : lignes JSON plus courtes
+            stages = {k: {m: v for m, v in s.items() if m != "buckets"} for k, s in snap["stages"].items()}
+            line = json.dumps({**snap, "stages": stages}, ensure_ascii=False)
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        if self.prom_path:
+            tmp = f"{self.prom_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(to_prometheus(snap))
+            os.replace(tmp, self.prom_path)
+        self.exports += 1
+        return snap
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"[WARN] Export métriques impossible: {e}")
+
+    def start(self):
+        if self.jsonl_path or self.prom_path:
+            self._thread = threading.Thread(target=self._loop, name="metrics-export", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            try:
+                self.export()
+            except OSError as e:
+                print(f"[WARN] Export métriques impossible: {e}")
@@ -0,0 +1,167 @@
+# model_store.py
+# ------------------------------------------------------------
+# Publication et rechargement à chaud du modèle :
+# - côté entraînement : model.yml, labels.json, model.bin (et model.ivf)
+#   sont écrits de façon atomique (fichier temporaire puis os.replace),
+#   puis data/model.version est publié EN DERNIER : un lecteur qui voit une
+#   nouvelle version voit aussi des fichiers complets et cohérents
+# - côté reconnaissance : ModelWatcher surveille la version dans un thread
+#   de fond, charge le nouveau modèle hors du chemin des frames et le
+#   publie d'une seule affectation (recognizer, labels_to_name) ; chaque
+#   frame lit 'current' une fois → jamais de paire modèle/labels mélangée
+# Le fichier de version enregistre (mtime, taille) de chaque fichier publié :
+# un chargement n'est accepté que si ces signatures sont identiques avant et
+# après la lecture (pas d'écrivain au milieu). Sans fichier de version
+# (ancien entraînement), les mtime de model.yml et labels.json servent de version.
+# ------------------------------------------------------------
+import os
+import json
+import time
+import threading
+
+DATA_DIR = "data"
+MODEL_PATH = os.path.join(DATA_DIR, "model.yml")
+LABELS_PATH = os.path.join(DATA_DIR, "labels.json")
+VERSION_PATH = os.path.join(DATA_DIR, "model.version")
+
+def atomic_write_json(path, obj):
+    """Écrire un JSON de façon atomique (temporaire dans le même dossier puis rename)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def save_recognizer(recognizer, path=MODEL_PATH):
+    """recognizer.save() atomique (le temporaire garde l'extension .yml pour OpenCV)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp.{os.getpid()}{ext or '.yml'}"
+    recognizer.save(tmp)
+    os.replace(tmp, path)
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def publish_version(files, path=VERSION_PATH, **info):
+    """
+    Publier une nouvelle version du modèle, après avoir écrit tous les
+    fichiers 'files' (chemins existants ; signatures enregistrées).
+    Retourne le numéro de version (horodatage en ns).
+    """
+    version = time.time_ns()
+    signatures = {f: _signature(f) for f in files if os.path.exists(f)}
+    atomic_write_json(path, {"version": version, "ts": round(time.time(), 3),
+                             "files": signatures, **info})
+    return version
+
+def read_version(path=VERSION_PATH, model_path=MODEL_PATH, labels_path=LABELS_PATH):
+    """
+    Version courante → dict {"version", "files", ...} publié, sinon
+    {"version": mtimes de model.yml/labels.json}, sinon None.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if isinstance(info, dict) and "version" in info:
+            return info
+    except (OSError, ValueError):
+        pass
+    try:
+        return {"version": (os.stat(model_path).st_mtime_ns, os.stat(labels_path).st_mtime_ns)}
+    except OSError:
+        return None
+
+def files_match(info) -> bool:
+    """Les fichiers sur disque sont-ils exactement ceux publiés avec cette version ?"""
+    try:
+        return all(_signature(f) == sig for f, sig in info.get("files", {}).items())
+    except OSError:
+        return False
+
+class ModelWatcher:
+    """
+    Modèle courant + rechargement en arrière-plan. Paramètres :
+      loader    : () -> (recognizer, labels_to_name), appelé dans le thread
+      current   : paire déjà chargée au démarrage
+      interval  : période de vérification de la version (s)
+      on_reload : callback optionnel (recognizer, labels_to_name) après un échange
+    Lecture par frame : recognizer, labels_to_name = watcher.current
+    """
+
+    def __init__(self, loader, current, interval=2.0, on_reload=None, version_path=VERSION_PATH):
+        self.loader = loader
+        self.current = current
+        self.interval = interval
+        self.on_reload = on_reload
+        self.version_path = version_path
+        info = read_version(version_path)
+        self.version = info["version"] if info else None
+        self.reloads = 0
+        self.failures = 0
+        self.retries = 0             # fichiers en cours de réécriture
+        self.last_load_s = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Recharger si la version a changé ; True si un nouveau modèle a été publié."""
+        info = read_version(self.version_path)
+        if info is None or info["version"] == self.version:
+            return False
+        version = info["version"]
+        if not files_match(info):
+            # Un entraînement est en train de réécrire les fichiers
+            self.retries += 1
+            return False
+        t0 = time.perf_counter()
+        try:
+            loaded = self.loader()
+        except Exception as e:
+            # Le modèle courant reste servi ; nouvel essai au prochain tour
+            self.failures += 1
+            print(f"[WARN] Rechargement du modèle impossible: {e}")
+            return False
+        after = read_version(self.version_path)
+        if after is None or after["version"] != version or not files_match(info):
+            self.retries += 1            # fichiers remplacés pendant la lecture
+            return False
+        self.last_load_s = time.perf_counter() - t0
+        self.current = loaded            # échange atomique (une affectation)
+        self.version = version
+        self.reloads += 1
+        print(f"[INFO] Nouveau modèle chargé en {self.last_load_s:.2f}s (version {version})")
+        if self.on_reload is not None:
+            try:
+                self.on_reload(*loaded)
+            except Exception as e:
+                print(f"[WARN] Après rechargement: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "version": str(self.version),
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "retries": self.retries,
+            "last_load_ms": round(self.last_load_s * 1000.0, 1),
+        }
@@ -0,0 +1,441 @@
+# multi_stream.py
+# ------------------------------------------------------------
+# Hôte multi-flux : N sources vidéo dans un seul processus, au lieu d'un
+# recognize_live_mysql.py par caméra :
+# - un seul modèle LBPH, un seul cache d'identités (IdentityCache), un
+#   seul pool MySQL pour tous les flux
+# - rechargement à chaud comme le mode live (model_store.ModelWatcher) :
+#   chaque frame lit le modèle courant, un ré-entraînement est pris en
+#   compte sans redémarrer (--reload-interval)
+# - un thread de capture par source ; chaque source ne garde que son frame
+#   le plus récent (un frame non traité est remplacé → sauté, compté)
+# - un pool de workers partagé ; l'ordonnanceur sert les flux à tour de
+#   rôle (round-robin), au plus un frame en cours par flux : un flux rapide
+#   ne peut pas affamer les autres
+# - statistiques par flux : FPS traité, latence capture → résultat,
+#   frames sautés ; export via live_metrics (--metrics-*)
+# - filtre qualité (face_quality.py) partagé par les workers, rejets
+#   comptés par motif (--no-quality pour le désactiver)
+# Sources : index de caméra ("0"), fichier vidéo, ou "synth[:WxH[@fps]]"
+# (générateur de frames factice, pour les essais sans caméra).
+# Exemples :
+#   python multi_stream.py --source 0 1 --workers 4 --show
+#   python multi_stream.py --source cam1.mp4 cam2.mp4 synth:640x480@30 --duration 60
+# ------------------------------------------------------------
+import os
+import re
+import time
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+import recognize_live_mysql as live
+from core import get_recognizer, load_engine, new_cascade
+from model_store import ModelWatcher, VERSION_PATH
+from shards import SHARDS_VERSION
+from identity_cache import IdentityCache
+from frame_pipeline import DropOldestQueue
+from frame_buffers import FrameBuffers, merge_stats
+from live_metrics import MetricsExporter
+from face_quality import add_quality_arguments, gate_from_args
+
+# Tentatives de réouverture d'une caméra avant d'abandonner le flux
+REOPEN_TRIES = 3
+
+class SyntheticCapture:
+    """
+    Source factice compatible VideoCapture (read/isOpened/get/release) :
+    frames BGR avec un bloc clair qui se déplace. 'frames' : nombre de
+    frames avant fin de flux (None = infini). Le rythme est imposé par
+    l'appelant (voir Stream.fps).
+    """
+
+    def __init__(self, width=640, height=480, fps=30.0, frames=None, seed=0):
+        self.width, self.height, self.fps = width, height, fps
+        self.frames = frames
+        self.count = 0
+        rng = np.random.default_rng(seed)
+        self._base = rng.integers(0, 96, (height, width, 3), dtype=np.uint8)
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened or (self.frames is not None and self.count >= self.frames):
+            return False, None
+        frame = self._base.copy()
+        size = min(self.width, self.height) // 3
+        x = (self.count * 4) % max(1, self.width - size)
+        y = (self.height - size) // 2
+        frame[y:y + size, x:x + size] = 200
+        self.count += 1
+        return True, frame
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: self.fps,
+                cv2.CAP_PROP_FRAME_WIDTH: self.width,
+                cv2.CAP_PROP_FRAME_HEIGHT: self.height}.get(prop, 0.0)
+
+    def release(self):
+        self._opened = False
+
+def parse_source(spec):
+    """
+    Source → (kind, open_cap) avec kind "device" | "file" | "synth" et
+    open_cap : () -> cap (non encore vérifié).
+    """
+    if spec.isdigit():
+        return "device", lambda: cv2.VideoCapture(int(spec))
+    m = re.fullmatch(r"synth(?::(\d+)x(\d+))?(?:@(\d+(?:\.\d+)?))?", spec)
+    if m:
+        w, h, fps = int(m.group(1) or 640), int(m.group(2) or 480), float(m.group(3) or 30)
+        return "synth", lambda: SyntheticCapture(w, h, fps)
+    return "file", lambda: cv2.VideoCapture(spec)
+
+class Stream:
+    """
+    Un flux : capture dans son propre thread, dernier frame en attente
+    ('pending', protégé par le verrou de l'ordonnanceur) et statistiques.
+    """
+
+    def __init__(self, sid, spec, open_cap, kind="device", fps_window=32):
+        self.sid = sid
+        self.spec = spec
+        self.kind = kind
+        self.open_cap = open_cap
+        self.fps = 0.0              # > 0 : capture cadencée (fichiers, synth)
+        self.pending = None         # (seq, t_capture, frame) en attente d'un worker
+        self.busy = False           # un worker traite déjà un frame de ce flux
+        self.done = False           # fin du fichier / caméra perdue
+        self.results = DropOldestQueue(maxsize=1)   # → affichage (--show)
+
+        self.captured = 0
+        self.processed = 0
+        self.skipped = 0            # frames remplacés avant d'être traités
+        self.faces = 0
+        self.latency_ema = 0.0
+        self._done_times = [0.0] * fps_window
+
+    def record(self, latency, n_faces):
+        """Un frame traité (appelé par un worker, sous le verrou de l'ordonnanceur)."""
+        n = self.processed
+        self._done_times[n % len(self._done_times)] = time.perf_counter()
+        self.latency_ema = latency if n == 0 else 0.9 * self.latency_ema + 0.1 * latency
+        self.processed = n + 1
+        self.faces += n_faces
+
+    def processed_fps(self):
+        n = min(self.processed, len(self._done_times))
+        if n < 2:
+            return 0.0
+        times = self._done_times[:n]
+        span = max(times) - min(times)
+        return (n - 1) / span if span > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "source": self.spec,
+            "captured": self.captured,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.captured, 3) if self.captured else 0.0,
+            "fps": round(self.processed_fps(), 2),
+            "latency_ms": round(self.latency_ema * 1000.0, 1),
+            "faces": self.faces,
+            "done": self.done,
+        }
+
+class FairScheduler:
+    """
+    Répartition des frames en attente entre workers : parcours circulaire
+    des flux à partir de celui qui suit le dernier servi, un seul frame en
+    cours par flux.
+    """
+
+    def __init__(self, streams):
+        self.streams = streams
+        self._next = 0
+        self._cond = threading.Condition()
+
+    def submit(self, stream, item):
+        """Déposer le dernier frame d'un flux (remplace celui en attente)."""
+        with self._cond:
+            if stream.pending is not None:
+                stream.skipped += 1
+            stream.pending = item
+            stream.captured += 1
+            self._cond.notify()
+
+    def acquire(self, timeout=0.5):
+        """(stream, item) à traiter, ou None après 'timeout' sans travail."""
+        with self._cond:
+            deadline = time.monotonic() + timeout
+            while True:
+                n = len(self.streams)
+                for k in range(n):
+                    stream = self.streams[(self._next + k) % n]
+                    if stream.pending is not None and not stream.busy:
+                        item, stream.pending = stream.pending, None
+                        stream.busy = True
+                        self._next = (self._next + k + 1) % n
+                        return stream, item
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def release(self, stream, latency, n_faces):
+        with self._cond:
+            stream.busy = False
+            stream.record(latency, n_faces)
+            self._cond.notify()
+
+    def wake_all(self):
+        with self._cond:
+            self._cond.notify_all()
+
+class MultiStreamHost:
+    """
+    Paramètres :
+      streams     : liste de Stream
+      make_worker : () -> process(frame) -> (detections, is_target_present)
+                    (appelé une fois par worker : un CascadeClassifier chacun)
+      workers     : taille du pool partagé
+      metrics     : live_metrics.LiveMetrics optionnel
+    """
+
+    def __init__(self, streams, make_worker, workers=2, metrics=None):
+        self.streams = streams
+        self.make_worker = make_worker
+        self.workers = max(1, workers)
+        self.metrics = metrics
+        self.scheduler = FairScheduler(streams)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _capture_loop(self, stream):
+        cap = stream.open_cap()
+        tries = 0
+        seq = 0
+        next_t = time.perf_counter()
+        while not self._stop.is_set():
+            if cap is None or not cap.isOpened():
+                tries += 1
+                if stream.kind != "device" or tries > REOPEN_TRIES:
+                    print(f"[ERREUR] Flux {stream.sid} ({stream.spec}) inaccessible")
+                    break
+                time.sleep(0.5)
+                cap = stream.open_cap()
+                continue
+            if seq == 0 and stream.kind != "device":
+                stream.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            if stream.fps > 0:
+                # Cadence de la source : un fichier se comporte comme une caméra
+                next_t += 1.0 / stream.fps
+                delay = next_t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_t = time.perf_counter()
+            t0 = time.perf_counter()
+            ok, frame = cap.read()
+            if self.metrics is not None:
+                self.metrics.observe("capture", time.perf_counter() - t0)
+            if not ok or frame is None:
+                if stream.kind != "device":
+                    break                       # fin du fichier / du générateur
+                if self.metrics is not None:
+                    self.metrics.incr("read_failures")
+                print(f"[WARN] Flux {stream.sid}: lecture échouée, réouverture...")
+                cap.release()
+                cap = None
+                continue
+            tries = 0
+            self.scheduler.submit(stream, (seq, time.perf_counter(), frame))
+            seq += 1
+        if cap is not None:
+            cap.release()
+        stream.done = True
+        self.scheduler.wake_all()
+
+    def _worker_loop(self):
+        process = self.make_worker()
+        while not self._stop.is_set():
+            job = self.scheduler.acquire(timeout=0.5)
+            if job is None:
+                if self.finished:
+                    break
+                continue
+            stream, (seq, t_cap, frame) = job
+            n_faces = 0
+            try:
+                detections, is_target_present = process(frame)
+                n_faces = len(detections)
+                stream.results.put((seq, frame, detections, is_target_present))
+            except Exception as e:
+                print(f"[WARN] Flux {stream.sid}: erreur de traitement: {e}")
+            finally:
+                self.scheduler.release(stream, time.perf_counter() - t_cap, n_faces)
+            if self.metrics is not None:
+                self.metrics.frame_done()
+
+    @property
+    def finished(self):
+        """Tous les flux terminés et plus aucun frame en attente."""
+        return all(s.done and s.pending is None and not s.busy for s in self.streams)
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._capture_loop, args=(s,),
+                                          name=f"capture-{s.sid}", daemon=True)
+                         for s in self.streams]
+        self._threads += [threading.Thread(target=self._worker_loop, name=f"worker-{i}", daemon=True)
+                          for i in range(self.workers)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.scheduler.wake_all()
+        for s in self.streams:
+            s.results.close()
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    def stats(self) -> dict:
+        return {f"stream{s.sid}": s.stats() for s in self.streams}
+
+def print_stats(host):
+    for s in host.streams:
+        st = s.stats()
+        print(f"[STREAM {s.sid}] {st['source']}: {st['fps']:.1f} FPS | latence {st['latency_ms']:.1f} ms "
+              f"| traités {st['processed']}/{st['captured']} | sautés {st['skipped']} "
+              f"| visages {st['faces']}{' | terminé' if st['done'] else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconnaissance sur plusieurs flux vidéo, un seul modèle partagé.")
+    parser.add_argument("--source", nargs="+", required=True,
+                        help="Index caméra, fichier vidéo ou synth[:WxH[@fps]] (un par flux)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Threads détection/reconnaissance partagés (défaut: nombre de cœurs)")
+    parser.add_argument("--engine", choices=("opencv", "numpy", "shards"), default="opencv",
+                        help="opencv: recognizer.predict par visage (défaut) | numpy: prédiction groupée par frame"
+                             " | shards: galerie en shards (shards.py)")
+    parser.add_argument("--ann-probes", type=int, default=0,
+                        help="Avec --engine numpy : listes IVF parcourues (0 = recherche exacte, défaut)")
+    parser.add_argument("--shards", nargs="+", metavar="SHARD",
+                        help="Avec --engine shards : ne charger que ces shards (défaut: tous)")
+    parser.add_argument("--detect-width", type=int, default=live.DETECT_WIDTH,
+                        help="Largeur de détection en px, 0 = pleine résolution (défaut: 0)")
+    parser.add_argument("--reload-interval", type=float, default=live.RELOAD_INTERVAL,
+                        help="Vérifier un nouveau modèle toutes les N secondes, 0 = jamais (défaut: 2)")
+    parser.add_argument("--show", action="store_true", help="Une fenêtre par flux (sinon sans affichage)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Arrêt après N secondes (0 = jusqu'à la fin)")
+    parser.add_argument("--stats-interval", type=float, default=5.0,
+                        help="Période d'affichage des stats par flux en secondes (défaut: 5)")
+    parser.add_argument("--metrics-jsonl", help="Ajouter un snapshot des métriques (JSON) à ce fichier à chaque export")
+    parser.add_argument("--metrics-prom", help="Réécrire ce fichier texte Prometheus à chaque export (textfile collector)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Période d'export des métriques en secondes (défaut: 10)")
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+    if args.ann_probes > 0 and args.engine != "numpy":
+        parser.error("--ann-probes nécessite --engine numpy")
+    if args.shards and args.engine != "shards":
+        parser.error("--shards nécessite --engine shards")
+
+    live.DETECT_WIDTH = args.detect_width
+    quality = gate_from_args(args)
+
+    # --- Un seul modèle pour tous les flux ---
+    try:
+        recognizer, labels_to_name = get_recognizer(args.engine, args.ann_probes, args.shards)
+    except Exception as e:
+        print("[ERREUR] Modèle/labels introuvables. Entraîne d'abord (enroll/import).")
+        print(e)
+        return
+
+    identities = IdentityCache(ttl=live.IDENTITY_TTL, max_size=live.IDENTITY_CACHE_SIZE,
+                               refresh_interval=live.IDENTITY_REFRESH).start()
+    if not identities.db_ok:
+        print("[INFO] Mode test - pas de vérification DB (cache hors-ligne)")
+
+    # --- Rechargement à chaud : chaque frame lit models.current une fois ---
+    models = ModelWatcher(lambda: load_engine(args.engine, args.ann_probes, args.shards),
+                          (recognizer, labels_to_name), interval=args.reload_interval,
+                          on_reload=lambda rec, labels: identities.preload(),
+                          version_path=SHARDS_VERSION if args.engine == "shards" else VERSION_PATH).start()
+
+    streams = []
+    for sid, spec in enumerate(args.source):
+        kind, open_cap = parse_source(spec)
+        streams.append(Stream(sid, spec, open_cap, kind))
+
+    buffers = []
+    def make_worker():
+        # CascadeClassifier non thread-safe → une instance par worker ;
+        # tampons gris/ROI réutilisés, un jeu par worker
+        cascade = new_cascade()
+        frame_buffers = FrameBuffers()
+        buffers.append(frame_buffers)
+        return lambda frame: live.process_frame(frame, *models.current, identities,
+                                                cascade, frame_buffers, quality)
+
+    metrics = live.METRICS
+    host = MultiStreamHost(streams, make_worker, workers=args.workers, metrics=metrics)
+    metrics.add_source("identities", identities.stats)
+    metrics.add_source("model", models.stats)
+    metrics.add_source("buffers", lambda: merge_stats(buffers))
+    if quality is not None:
+        metrics.add_source("quality", quality.stats)
+    for s in streams:
+        metrics.add_source(f"stream{s.sid}", s.stats)
+    exporter = MetricsExporter(metrics, args.metrics_interval,
+                               args.metrics_jsonl, args.metrics_prom).start()
+
+    print(f"[INFO] {len(streams)} flux, {host.workers} worker(s) partagés")
+    host.start()
+    t_start = time.monotonic()
+    next_stats = t_start + args.stats_interval
+    try:
+        while not host.finished:
+            if args.duration and time.monotonic() - t_start >= args.duration:
+                break
+            if args.show:
+                for s in streams:
+                    item = s.results.get(timeout=0)
+                    if item is not None:
+                        _, frame, detections, is_target_present = item
+                        live.draw_frame(frame, detections, is_target_present)
+                        cv2.imshow(f"Flux {s.sid} - {s.spec}", frame)
+                if (cv2.waitKey(5) & 0xFF) in (27, ord('q')):
+                    print("[INFO] Arrêt demandé par l'utilisateur")
+                    break
+            else:
+                time.sleep(0.05)
+            if time.monotonic() >= next_stats:
+                print_stats(host)
+                next_stats = time.monotonic() + args.stats_interval
+    except KeyboardInterrupt:
+        print("[INFO] Interruption")
+    finally:
+        host.stop()
+        exporter.stop()
+        models.stop()
+        identities.stop()
+        if args.show:
+            cv2.destroyAllWindows()
+
+    print_stats(host)
+    if models.reloads:
+        print(f"[INFO] Modèle: {models.stats()}")
+    snap = metrics.snapshot()
+    print(f"[PERF] total {snap['frames']} frames traités | {snap['fps']:.1f} FPS | visages: {snap['faces']}")
+    if quality is not None:
+        print(f"[INFO] Filtre qualité: {quality.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# recognition_service.py
+# ------------------------------------------------------------
+# Service de reconnaissance résident (HTTP sur localhost ou socket Unix) :
+# - modèle LBPH, labels et détecteurs Haar chargés une seule fois au
+#   démarrage (et "chauffés" par une détection à vide) : une requête ne
+#   paie plus le démarrage d'un script
+# - les requêtes concurrentes sont regroupées en micro-lots (MicroBatcher) :
+#   un lot part dès --max-batch requêtes ou après --max-wait ms ; décodage
+#   et détection en parallèle dans le lot (hors de la boucle asyncio), puis
+#   UNE prédiction groupée pour tous les visages (predict_batch avec
+#   --engine numpy)
+# Points d'accès (corps = image encodée : JPEG, PNG, ...) :
+#   POST /recognize[?k=N]  image complète → visages (box, label, name, distance)
+#   POST /predict[?k=N]    visage déjà recadré → une prédiction
+#   GET  /health           état + statistiques (lots, latence)
+# Exemples :
+#   python recognition_service.py --engine numpy --port 8765
+#   curl --data-binary @photo.jpg http://127.0.0.1:8765/recognize
+#   python recognition_service.py --unix /tmp/faceid.sock
+#   curl --unix-socket /tmp/faceid.sock --data-binary @roi.png "http://localhost/predict?k=3"
+# ------------------------------------------------------------
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import recognize_live_mysql as live
+from core import get_recognizer, new_cascade
+
+# Taille max d'un corps de requête (octets)
+MAX_BODY = 16 * 1024 * 1024
+# k maximal accepté (top-k)
+MAX_K = 10
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class MicroBatcher:
+    """
+    Regroupe les appels concurrents de submit() en lots : un lot est lancé
+    dès 'max_batch' éléments, ou 'max_wait' secondes après le premier.
+    run_batch(items) -> résultats (même ordre) s'exécute dans 'executor' ;
+    les requêtes arrivées pendant un lot forment le suivant.
+    """
+
+    def __init__(self, run_batch, max_batch=16, max_wait=0.005, executor=None):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.executor = executor
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, item):
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Déjà en file : inutile d'attendre
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, [i for i, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+        }
+
+class WarmRecognizer:
+    """
+    Modèle + détecteurs chargés une fois. run_batch() traite un lot
+    d'éléments ("image" | "roi", octets encodés, k) → liste de résultats
+    (dicts ; {"error": ...} pour une image illisible).
+    Le décodage et la détection des images d'un lot tournent sur
+    'detect_workers' threads, chacun avec son CascadeClassifier (non
+    thread-safe).
+    """
+
+    def __init__(self, recognizer, labels_to_name, detect_workers=2, detect_width=0):
+        self.recognizer = recognizer
+        self.labels_to_name = labels_to_name
+        self.detect_width = detect_width
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, detect_workers),
+                                        thread_name_prefix="detect",
+                                        initializer=self._warm_thread)
+        # Créer et chauffer les détecteurs maintenant, pas à la 1re requête
+        blank = np.zeros((240, 320), dtype=np.uint8)
+        list(self._pool.map(self._detect, [blank] * max(1, detect_workers)))
+
+    def _warm_thread(self):
+        self._local.cascade = new_cascade()
+
+    @staticmethod
+    def _decode(body):
+        return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+    def _detect(self, gray):
+        return live.detect_faces(gray, self._local.cascade, self.detect_width)
+
+    def _predict(self, rois, k):
+        if hasattr(self.recognizer, "predict_batch"):
+            return self.recognizer.predict_batch(rois, k=k)
+        return [[self.recognizer.predict(roi)] for roi in rois]
+
+    def _describe(self, top):
+        label, dist = top[0]
+        known = dist < live.THRESHOLD and label in self.labels_to_name
+        return {
+            "label": int(label) if known else -1,
+            "name": self.labels_to_name[label] if known else None,
+            "distance": round(float(dist), 3),
+            "top": [{"label": int(l), "name": self.labels_to_name.get(l), "distance": round(float(d), 3)}
+                    for l, d in top],
+        }
+
+    def run_batch(self, items):
+        # Décodage ici (thread du lot) : un gros JPEG ne bloque pas la boucle asyncio
+        grays = list(self._pool.map(self._decode, [body for _, body, _ in items]))
+        items = [(kind, gray, k) for (kind, _, k), gray in zip(items, grays)]
+        images = [gray for kind, gray, _ in items if kind == "image" and gray is not None]
+        boxes_iter = iter(self._pool.map(self._detect, images))
+
+        # ROI 200x200 de tout le lot → une seule prédiction groupée
+        rois, owners = [], []
+        boxes_per_item = []
+        for idx, (kind, gray, _) in enumerate(items):
+            if gray is None:
+                boxes = None
+            elif kind == "image":
+                boxes = next(boxes_iter)
+                for (x, y, w, h) in boxes:
+                    rois.append(cv2.resize(gray[y:y + h, x:x + w], (200, 200)))
+                    owners.append(idx)
+            else:
+                boxes = None
+                rois.append(cv2.resize(gray, (200, 200)))
+                owners.append(idx)
+            boxes_per_item.append(boxes)
+
+        k = max((k for _, _, k in items), default=1)
+        tops = self._predict(rois, k) if rois else []
+
+        results = [{"faces": []} if kind == "image" else None for kind, _, _ in items]
+        for idx, (_, gray, _) in enumerate(items):
+            if gray is None:
+                results[idx] = {"error": "Image illisible"}
+        face_idx = [0] * len(items)
+        for owner, top in zip(owners, tops):
+            kind, _, k_item = items[owner]
+            pred = self._describe(top[:k_item])
+            if kind == "image":
+                x, y, w, h = boxes_per_item[owner][face_idx[owner]]
+                face_idx[owner] += 1
+                results[owner]["faces"].append({"box": [int(x), int(y), int(w), int(h)], **pred})
+            else:
+                results[owner] = pred
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+class RecognitionService:
+    """Serveur HTTP/1.1 minimal (keep-alive) au-dessus d'asyncio : TCP ou socket Unix."""
+
+    def __init__(self, warm, max_batch=16, max_wait=0.005):
+        self.warm = warm
+        self.batcher = MicroBatcher(warm.run_batch, max_batch, max_wait,
+                                    executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch"))
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.latency_ema = 0.0
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", **self.stats()}
+        if url.path not in ("/recognize", "/predict"):
+            return 404, {"error": f"Chemin inconnu: {url.path}"}
+        if method != "POST":
+            return 405, {"error": "POST attendu"}
+        try:
+            k = min(MAX_K, max(1, int(parse_qs(url.query).get("k", ["1"])[0])))
+        except ValueError:
+            return 400, {"error": "k invalide"}
+        if not body:
+            return 400, {"error": "Image illisible"}
+        kind = "image" if url.path == "/recognize" else "roi"
+        result = await self.batcher.submit((kind, body, k))
+        return (400 if "error" in result else 200), result
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "Corps trop volumineux"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                t0 = time.perf_counter()
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                self.requests += 1
+                if status >= 400:
+                    self.errors += 1
+                latency = time.perf_counter() - t0
+                self.latency_ema = latency if self.requests == 1 else 0.95 * self.latency_ema + 0.05 * latency
+
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, close=False):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    def stats(self) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": round(self.latency_ema * 1000.0, 2),
+            **self.batcher.stats(),
+        }
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_path=None):
+        self.batcher.start()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            where = unix_path
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"[INFO] Service prêt sur {where} (max-batch {self.batcher.max_batch}, "
+              f"max-wait {self.batcher.max_wait * 1000:.1f} ms)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+            if unix_path and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Service de reconnaissance résident (modèle chargé, micro-lots).")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute HTTP (défaut: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port HTTP (défaut: 8765)")
+    parser.add_argument("--unix", help="Écouter sur ce socket Unix au lieu de TCP")
+    parser.add_argument("--engine", choices=("opencv", "numpy", "shards"), default="opencv",
+                        help="opencv: recognizer.predict par visage (défaut) | numpy: prédiction groupée par lot"
+                             " | shards: galerie en shards (shards.py)")
+    parser.add_argument("--ann-probes", type=int, default=0,
+                        help="Avec --engine numpy : listes IVF parcourues (0 = recherche exacte, défaut)")
+    parser.add_argument("--shards", nargs="+", metavar="SHARD",
+                        help="Avec --engine shards : ne charger que ces shards (défaut: tous)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Requêtes max par lot (défaut: 16)")
+    parser.add_argument("--max-wait", type=float, default=5.0,
+                        help="Attente max (ms) pour compléter un lot (défaut: 5)")
+    parser.add_argument("--detect-workers", type=int, default=2,
+                        help="Threads de détection Haar dans un lot (défaut: 2)")
+    parser.add_argument("--detect-width", type=int, default=live.DETECT_WIDTH,
+                        help="Largeur de détection en px, 0 = pleine résolution (défaut: 0)")
+    args = parser.parse_args()
+    if args.ann_probes > 0 and args.engine != "numpy":
+        parser.error("--ann-probes nécessite --engine numpy")
+    if args.shards and args.engine != "shards":
+        parser.error("--shards nécessite --engine shards")
+
+    t0 = time.perf_counter()
+    try:
+        recognizer, labels_to_name = get_recognizer(args.engine, args.ann_probes, args.shards)
+    except Exception as e:
+        print("[ERREUR] Modèle/labels introuvables. Entraîne d'abord (enroll/import).")
+        print(e)
+        return
+
+    warm = WarmRecognizer(recognizer, labels_to_name, args.detect_workers, args.detect_width)
+    print(f"[INFO] Modèle et détecteurs prêts en {time.perf_counter() - t0:.2f}s")
+    service = RecognitionService(warm, args.max_batch, args.max_wait / 1000.0)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print("[INFO] Arrêt du service")
+    finally:
+        warm.close()
+        print(f"[INFO] {service.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -5,155 +5,108 @@
 # - Ouvrir la webcam de manière robuste (Windows: DirectShow d'abord)
 # - Lire des frames de façon sûre, détecter les visages (Haar)
 # - Prédire l'identité via LBPH et vérifier l'existence en base (MySQL)
+#   via un cache d'identités (IdentityCache) : aucune requête sur le frame
 # - Afficher un bandeau global "TOI: PRESENT/ABSENT" selon TARGET_NAME
+# - --mode threaded : capture / détection+reconnaissance (pool de threads)
+#   / affichage en parallèle, files bornées drop-oldest (frame_pipeline.py)
+# - --track : détection tous les N frames + suivi entre deux (face_tracker.py)
+# - --engine numpy : prédiction LBPH groupée par frame (lbph_numpy.py)
+#   --ann-probes N : recherche approchée via l'index IVF (ann_index.py)
+# - --engine shards [--shards a b] : galerie en shards interrogés en
+#   parallèle, éventuellement limitée aux shards du site (shards.py)
+# - métriques par étape (live_metrics.py) : histogrammes glissants, FPS,
+#   frames perdus ; export JSONL / Prometheus (--metrics-*), --overlay
+# - rechargement à chaud (model_store.py) : un nouveau modèle publié par
+#   enroll/import est chargé en arrière-plan et échangé entre deux frames
+# - --log-events : journal des reconnaissances (table recognition_events)
+#   écrit par lots depuis un thread de fond (event_log.py)
+# - ouverture caméra : dernier profil qui a fonctionné essayé d'abord,
+#   sondage parallèle sinon (camera_probe.py)
+# - tampons réutilisés (frame_buffers.py) : niveaux de gris et lot de ROI
+#   préalloués par worker (dst=), fenêtre créée une seule fois ;
+#   collectes GC / RSS dans les métriques ('memory'), --trace-alloc
+# - filtre qualité (face_quality.py) avant predict : visages flous, trop
+#   petits ou mal exposés affichés "Qualité insuffisante" sans prédiction
+#   (--min-sharpness, --min-face-size, --exposure, --min-contrast, --no-quality)
 # Contrôles:
 #   q / ESC : quitter
 #   c       : re-sélectionner/rouvrir la caméra
+#   d       : diagnostic des caméras
 # ------------------------------------------------------------
 
 import cv2
-import json
 import time
-import os
-import numpy as np
-from db_utils import person_exists
-
-# --- Chemins et constantes ---
-DATA_DIR = "data"
-MODEL_PATH = f"{DATA_DIR}/model.yml"
-LABELS_PATH = f"{DATA_DIR}/labels.json"
+import argparse
+from identity_cache import IdentityCache
+from frame_pipeline import ThreadedPipeline
+from face_tracker import FaceTracker
+from face_detect import detect_scaled
+from ann_index import IVFLBPH
+from live_metrics import LiveMetrics, MetricsExporter, MemoryStats
+from model_store import ModelWatcher, VERSION_PATH
+from shards import ShardedLBPH, SHARDS_VERSION
+from event_log import EventLogger
+from core import get_cascade, new_cascade, get_recognizer, load_engine
+from camera_probe import open_camera, scan_cameras
+from frame_buffers import FrameBuffers, MAX_FACES, merge_stats
+from face_quality import add_quality_arguments, gate_from_args
 
+# --- Constantes ---
 TARGET_NAME = "Ayoub"    # ← mets ici ton nom cible
 THRESHOLD   = 70.0       # LBPH: plus la "conf" est petite, mieux c'est (ajuste selon tes données)
 
-# Détecteur Haar pour visages - VERSION CORRIGÉE
-haar_cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-print(f"[INFO] Chargement du détecteur Haar: {haar_cascade_path}")
-FACE_CASCADE = cv2.CascadeClassifier(haar_cascade_path)
+# Largeur de détection (px) : 0 = frame pleine résolution ; ex. 320 pour
+# diviser le coût de detectMultiScale sur un flux 640x480 (--detect-width)
+DETECT_WIDTH = 0
 
-# Vérifier que le détecteur est chargé
-if FACE_CASCADE.empty():
-    print("[ERREUR] Impossible de charger le détecteur Haar!")
-    exit(1)
-else:
-    print("[INFO] Détecteur Haar chargé avec succès")
+# Cache d'identités (person_exists) : TTL, taille max, période de rechargement
+IDENTITY_TTL = 60.0
+IDENTITY_CACHE_SIZE = 10000
+IDENTITY_REFRESH = 30.0
 
-def load_model_and_labels():
-    """
-    Charger le modèle LBPH (opencv-contrib) + le mapping label->nom depuis labels.json.
-    """
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(MODEL_PATH)
-    with open(LABELS_PATH, "r", encoding="utf-8") as f:
-        labels_to_name = json.load(f)
-    # Normaliser les clés JSON en int
-    labels_to_name = {int(k): v for k, v in labels_to_name.items()}
-    return recognizer, labels_to_name
+# Période de vérification d'un nouveau modèle publié (s), 0 = désactivé
+RELOAD_INTERVAL = 2.0
+
+# Journal des reconnaissances : une personne par source au plus une fois
+# toutes les EVENT_WINDOW secondes
+EVENT_WINDOW = 10.0
+
+# Mesures par étape (toujours actives : ~1 µs par mesure)
+METRICS = LiveMetrics()
+
+# Journal des reconnaissances (EventLogger), actif avec --log-events
+EVENTS = None
+
+# Résultat affiché pour un visage refusé par le filtre qualité
+# (face_quality.QualityGate passé à recognize_faces, --no-quality)
+LOW_QUALITY = ("Qualité insuffisante", (0, 165, 255), False)
+
+# Fenêtre d'affichage (créée une seule fois, cf. setup_window) ; repli
+# sans émojis si le backend GUI refuse le titre
+WINDOW_NAME = "🎯 Camera Frontale - Reconnaissance Faciale"
+FALLBACK_WINDOW_NAME = "Camera Frontale - Reconnaissance"
+_window = None
+
+# Texte "Resolution: WxH" par taille de frame (évite un format par frame)
+_resolution_text = {}
 
 def open_fixed_cam():
     """
-    Ouvrir la caméra frontale (webcam intégrée) de façon optimisée.
-    Spécialement conçu pour les caméras frontales d'ordinateurs portables.
+    Ouvrir la caméra frontale (webcam intégrée, index 0) : profil mémorisé
+    d'abord avec un budget court, puis sondage des configurations
+    (camera_probe.open_camera).
     """
     print("[INFO] Ouverture caméra frontale...")
-    
-    # Configurations spécifiques pour caméras frontales
-    configs = [
-        # Config 1: DirectShow basique (le plus courant)
-        {
-            'api': cv2.CAP_DSHOW,
-            'name': 'DirectShow',
-            'width': 640, 'height': 480, 'fps': 30,
-            'fourcc': None, 'buffer': 1
-        },
-        # Config 2: DirectShow avec MJPG
-        {
-            'api': cv2.CAP_DSHOW, 
-            'name': 'DirectShow+MJPG',
-            'width': 640, 'height': 480, 'fps': 30,
-            'fourcc': 'MJPG', 'buffer': 1
-        },
-        # Config 3: Media Foundation
-        {
-            'api': cv2.CAP_MSMF,
-            'name': 'MediaFoundation', 
-            'width': 640, 'height': 480, 'fps': 30,
-            'fourcc': None, 'buffer': 1
-        },
-        # Config 4: Résolution plus basse
-        {
-            'api': cv2.CAP_DSHOW,
-            'name': 'DirectShow_LowRes',
-            'width': 320, 'height': 240, 'fps': 30,
-            'fourcc': None, 'buffer': 1
-        },
-        # Config 5: Auto (dernier recours)
-        {
-            'api': cv2.CAP_ANY,
-            'name': 'Auto',
-            'width': 640, 'height': 480, 'fps': 15,
-            'fourcc': None, 'buffer': 2
-        }
-    ]
-    
-    # Tester uniquement l'index 0 (caméra frontale)
-    for config in configs:
-        print(f"[DEBUG] Test: {config['name']} - {config['width']}x{config['height']}")
-        
-        try:
-            # Ouvrir la caméra
-            cap = cv2.VideoCapture(0, config['api'])
-            
-            if not cap.isOpened():
-                print(f"[DEBUG] {config['name']} ne s'ouvre pas")
-                continue
-            
-            # Configuration des propriétés
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, config['width'])
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config['height'])
-            cap.set(cv2.CAP_PROP_FPS, config['fps'])
-            cap.set(cv2.CAP_PROP_BUFFERSIZE, config['buffer'])
-            
-            # Auto-exposition et auto-focus pour caméras frontales
-            cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.75)  # Auto-exposition
-            cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)         # Auto-focus
-            
-            # FOURCC si spécifié
-            if config['fourcc']:
-                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config['fourcc']))
-            
-            # Test de lecture avec patience (caméras frontales sont parfois lentes)
-            print(f"[DEBUG] Test de lecture...")
-            success_count = 0
-            
-            for attempt in range(15):  # Plus d'essais pour caméras frontales
-                ret, frame = cap.read()
-                
-                if ret and frame is not None and frame.size > 0:
-                    # Vérifier que l'image n'est pas complètement noire
-                    if np.std(frame) > 5:  # Image avec du contenu
-                        success_count += 1
-                        if success_count >= 3:  # 3 frames valides suffisent
-                            actual_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                            actual_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                            actual_fps = cap.get(cv2.CAP_PROP_FPS)
-                            
-                            print(f"[INFO] Caméra frontale OK!")
-                            print(f"[INFO] Config: {config['name']}")
-                            print(f"[INFO] Résolution: {actual_w}x{actual_h}")
-                            print(f"[INFO] FPS: {actual_fps:.1f}")
-                            return cap
-                
-                time.sleep(0.1)  # Attendre plus longtemps entre les essais
-            
-            print(f"[DEBUG] {config['name']} - Frames invalides ({success_count}/15)")
-            cap.release()
-            
-        except Exception as e:
-            print(f"[DEBUG] {config['name']} - Erreur: {e}")
-            if 'cap' in locals():
-                cap.release()
-    
+    t0 = time.perf_counter()
+    cap, _, config = open_camera((0,))
+    if cap is not None:
+        actual_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        print(f"[INFO] Caméra frontale OK en {time.perf_counter() - t0:.2f}s")
+        print(f"[INFO] Config: {config['name']} | Résolution: {actual_w}x{actual_h} "
+              f"| FPS: {cap.get(cv2.CAP_PROP_FPS):.1f}")
+        return cap
+
     print("[ERREUR] Impossible d'ouvrir la caméra frontale")
     print("[INFO] Solutions à essayer:")
     print("  1. Vérifier Paramètres > Confidentialité > Caméra")
@@ -164,40 +117,25 @@ def open_fixed_cam():
 
 def diagnose_cameras():
     """
-    Diagnostique les caméras disponibles sur le système.
+    Diagnostique les caméras disponibles sur le système (index 0 à 4 ×
+    3 backends, index sondés en parallèle).
     Affiche des informations détaillées pour le débogage.
     """
     print("[DIAGNOSTIC] Recherche des caméras disponibles...")
-    
-    backends = [
-        (cv2.CAP_DSHOW, "DirectShow"),
-        (cv2.CAP_MSMF, "MediaFoundation"),
-        (cv2.CAP_ANY, "Auto")
-    ]
-    
     found_cameras = []
-    
-    for idx in range(5):  # Tester jusqu'à l'index 4
-        for api, api_name in backends:
-            try:
-                cap = cv2.VideoCapture(idx, api)
-                if cap.isOpened():
-                    # Tester la lecture d'un frame
-                    ok, frame = cap.read()
-                    if ok and frame is not None:
-                        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                        fps = cap.get(cv2.CAP_PROP_FPS)
-                        found_cameras.append((idx, api_name, w, h, fps))
-                        print(f"[DIAGNOSTIC] ✅ Caméra trouvée: idx={idx}, backend={api_name}, résolution={w}x{h}, fps={fps:.1f}")
-                    else:
-                        print(f"[DIAGNOSTIC] ⚠️  Caméra idx={idx}, backend={api_name} s'ouvre mais ne lit pas de frames")
-                    cap.release()
-                else:
-                    print(f"[DIAGNOSTIC] ❌ Caméra idx={idx}, backend={api_name} ne s'ouvre pas")
-            except Exception as e:
-                print(f"[DIAGNOSTIC] ❌ Erreur idx={idx}, backend={api_name}: {e}")
-    
+    for r in scan_cameras(range(5), budget=1.0):
+        idx, api_name = r["index"], r["api_name"]
+        if r["ok"]:
+            found_cameras.append((idx, api_name, r["width"], r["height"], r["fps"]))
+            print(f"[DIAGNOSTIC] ✅ Caméra trouvée: idx={idx}, backend={api_name}, "
+                  f"résolution={r['width']}x{r['height']}, fps={r['fps']:.1f}")
+        elif r.get("error") == "ne s'ouvre pas":
+            print(f"[DIAGNOSTIC] ❌ Caméra idx={idx}, backend={api_name} ne s'ouvre pas")
+        elif r["black"] or r["failed_reads"]:
+            print(f"[DIAGNOSTIC] ⚠️  Caméra idx={idx}, backend={api_name} s'ouvre mais ne lit pas de frames exploitables")
+        else:
+            print(f"[DIAGNOSTIC] ❌ Erreur idx={idx}, backend={api_name}: {r.get('error')}")
+
     if not found_cameras:
         print("[DIAGNOSTIC] ❌ Aucune caméra fonctionnelle trouvée!")
         print("[DIAGNOSTIC] Vérifiez:")
@@ -207,7 +145,7 @@ def diagnose_cameras():
         print("  - Les pilotes de la caméra")
     else:
         print(f"[DIAGNOSTIC] ✅ {len(found_cameras)} caméra(s) fonctionnelle(s) trouvée(s)")
-    
+
     return found_cameras
 
 def safe_read(cap, max_tries=20):
@@ -224,129 +162,286 @@ def safe_read(cap, max_tries=20):
         time.sleep(0.02)  # 20 ms entre tentatives
     return False, None
 
-def main():
-    # --- Charger modèle + labels ---
+def detect_faces(gray, cascade=None, detect_width=None):
+    """
+    Détection Haar plein frame (paramètres permissifs du mode live).
+    'detect_width' > 0 : détection sur une copie réduite, boîtes remises
+    en coordonnées du frame (défaut: DETECT_WIDTH).
+    """
+    cascade = get_cascade() if cascade is None else cascade
+    t0 = time.perf_counter()
+    faces = detect_scaled(
+        cascade, gray,
+        DETECT_WIDTH if detect_width is None else detect_width,
+        scaleFactor=1.05,      # Plus petit = plus sensible
+        minNeighbors=3,        # Plus petit = plus de détections
+        minSize=(30, 30),      # Plus petit = détecte des visages plus petits
+        maxSize=(300, 300)     # Limite la taille max
+    )
+    METRICS.observe("detect", time.perf_counter() - t0)
+    return faces
+
+def predict_rois(recognizer, rois):
+    """
+    Prédire un lot de ROI 200x200 → [(label, conf), ...].
+    NumpyLBPH : un seul appel vectorisé pour tout le frame ;
+    reconnaisseur OpenCV : une boucle de predict().
+    """
+    if hasattr(recognizer, "predict_batch"):
+        return [top[0] for top in recognizer.predict_batch(rois)]
+    return [recognizer.predict(roi) for roi in rois]
+
+def label_status(label_pred, conf, labels_to_name, identities):
+    """(status, color, is_target) pour une prédiction LBPH."""
+    if conf < THRESHOLD and label_pred in labels_to_name:
+        name = labels_to_name[label_pred]
+
+        # Lecture en cache (DB injoignable → True, mode test)
+        t0 = time.perf_counter()
+        exists = identities.exists(name)
+        METRICS.observe("person_exists", time.perf_counter() - t0)
+
+        # Mise en file non bloquante (écriture DB par lots en arrière-plan)
+        if EVENTS is not None and exists:
+            EVENTS.log(label_pred, conf)
+
+        status = f"{name} (conf={conf:.1f})"
+        status += " — Succès ✅" if exists else " — Non trouvé ❌"
+        color = (0, 255, 0) if exists else (0, 0, 255)
+        return status, color, name == TARGET_NAME and exists
+
+    return f"Inconnu (conf={conf:.1f})", (0, 0, 255), False
+
+def recognize_faces(gray, boxes, recognizer, labels_to_name, identities, buffers=None, quality=None):
+    """
+    Reconnaissance LBPH de toutes les boîtes (x, y, w, h) d'un frame.
+    Retourne une liste de (status, color, is_target) ; status None = erreur.
+    'buffers' (FrameBuffers) : ROI écrites dans le lot préalloué ; les
+    visages au-delà de buffers.max_faces restent "Inconnu".
+    'quality' (face_quality.QualityGate, partagé entre workers) : visages
+    refusés → LOW_QUALITY, sans predict.
+    """
+    if len(boxes) == 0:
+        return []
     try:
-        recognizer, labels_to_name = load_model_and_labels()
+        # Préparation des ROI pour LBPH (taille 200x200 en niveaux de gris)
+        t0 = time.perf_counter()
+        if buffers is not None:
+            rois = buffers.rois(gray, boxes)
+        else:
+            rois = [cv2.resize(gray[y:y+h, x:x+w], (200, 200)) for (x, y, w, h) in boxes]
+        t1 = time.perf_counter()
+        METRICS.observe("resize", t1 - t0)
+
+        # Filtre qualité : seuls les visages exploitables passent à predict
+        accepted = None
+        if quality is not None:
+            accepted, _, _ = quality.check(rois, [min(b[2], b[3]) for b in boxes[:len(rois)]])
+            if accepted.all():
+                accepted = None
+            else:
+                rois = [roi for roi, ok in zip(rois, accepted) if ok]
+            t2 = time.perf_counter()
+            METRICS.observe("quality", t2 - t1)
+            t1 = t2
+
+        # Prédiction LBPH : label et "confidence"
+        preds = predict_rois(recognizer, rois)
+        METRICS.observe("predict", time.perf_counter() - t1)
     except Exception as e:
-        print("[ERREUR] Modèle/labels introuvables. Entraîne d'abord (enroll/import).")
-        print(e)
-        return
+        print(f"[WARN] Erreur reconnaissance: {e}")
+        return [(None, (0, 0, 255), False)] * len(boxes)
 
-    # --- Ouvrir la caméra de manière robuste ---
-    cap = open_fixed_cam()
-    if cap is None:
-        print("[ERREUR] Aucune caméra accessible.")
-        print("[INFO] Lancement du diagnostic automatique...")
-        diagnose_cameras()
-        return
+    results = [label_status(label_pred, conf, labels_to_name, identities) for label_pred, conf in preds]
+    if accepted is not None:
+        it = iter(results)
+        results = [next(it) if ok else LOW_QUALITY for ok in accepted]
+    if len(results) < len(boxes):
+        results += [("Inconnu (non traité)", (0, 0, 255), False)] * (len(boxes) - len(results))
+    return results
 
-    print("[INFO] Contrôles: 'q' pour quitter | 'c' pour re-sélectionner la caméra.")
+def process_frame(frame, recognizer, labels_to_name, identities, cascade=None, buffers=None,
+                  quality=None):
+    """
+    Détection (Haar) + reconnaissance (LBPH) sur un frame BGR.
+    Retourne (detections, is_target_present) où detections est une liste
+    de (x, y, w, h, status, color) ; status None = erreur de reconnaissance.
+    'buffers' (FrameBuffers) : gris et ROI dans des tampons réutilisés.
+    'quality' (QualityGate) : filtre qualité avant predict.
+    """
+    # Convertir en niveaux de gris
+    t0 = time.perf_counter()
+    gray = buffers.to_gray(frame) if buffers is not None else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    METRICS.observe("cvtColor", time.perf_counter() - t0)
+
+    # Détection de visages avec paramètres plus permissifs
+    faces = detect_faces(gray, cascade)
+
+    # Compteur plutôt qu'un print par frame (cf. live_metrics)
+    if len(faces) > 0:
+        METRICS.incr("faces", len(faces))
+
+    is_target_present = False
+    detections = []
+    results = recognize_faces(gray, faces, recognizer, labels_to_name, identities, buffers, quality)
+    for (x, y, w, h), (status, color, is_target) in zip(faces, results):
+        is_target_present = is_target_present or is_target
+        detections.append((x, y, w, h, status, color))
+
+    return detections, is_target_present
+
+def make_tracking_processor(recognizer, labels_to_name, identities, detect_every=5,
+                            predict_every=10, cascade=None, models=None, buffers=None, quality=None):
+    """
+    Variante de process_frame avec suivi (face_tracker.FaceTracker) :
+    détection plein frame tous les 'detect_every' frames, suivi local entre
+    les deux, et prédiction LBPH tous les 'predict_every' frames par piste.
+    'models' (ModelWatcher) : modèle courant relu à chaque frame.
+    'buffers' (FrameBuffers) : gris et ROI réutilisés (le tracker copie ses
+    modèles de suivi, le tampon gris peut donc être écrasé).
+    'quality' (QualityGate) : filtre qualité avant predict.
+    Retourne (process, tracker) ; process a la même signature de sortie.
+    """
+    tracker = FaceTracker(lambda gray: detect_faces(gray, cascade),
+                          detect_every=detect_every, predict_every=predict_every)
+
+    def process(frame):
+        t0 = time.perf_counter()
+        gray = buffers.to_gray(frame) if buffers is not None else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        t1 = time.perf_counter()
+        tracks = tracker.update(gray)
+        METRICS.observe("cvtColor", t1 - t0)
+        METRICS.observe("track", time.perf_counter() - t1)
+        METRICS.incr("faces", len(tracks))
+
+        # Prédiction groupée des seules pistes qui en ont besoin
+        rec, labels = models.current if models is not None else (recognizer, labels_to_name)
+        stale = [t for t in tracks if tracker.needs_predict(t)]
+        results = recognize_faces(gray, [t.box for t in stale], rec, labels, identities, buffers, quality)
+        for t, result in zip(stale, results):
+            # Visage momentanément flou : garder la dernière identité connue
+            if result is not LOW_QUALITY or t.result is None:
+                t.result = result
+            t.since_predict = 0
+
+        is_target_present = False
+        detections = []
+        for t in tracks:
+            status, color, is_target = t.result
+            is_target_present = is_target_present or is_target
+            detections.append((*t.box, status, color))
+        return detections, is_target_present
+
+    return process, tracker
+
+def draw_frame(frame, detections, is_target_present):
+    """Dessiner visages, statuts et bandeau global sur le frame (in-place)."""
+    for (x, y, w, h, status, color) in detections:
+        # Rectangle vert pour chaque visage détecté
+        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+        cv2.putText(frame, "VISAGE DETECTE", (x, y-10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2, cv2.LINE_AA)
+        if status is None:
+            cv2.putText(frame, "ERREUR RECONNAISSANCE", (x, y-30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2, cv2.LINE_AA)
+        else:
+            cv2.putText(frame, status, (x, y-30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2, cv2.LINE_AA)
+
+    # Bandeau global "toi présent/absent"
+    global_text = "TOI: PRESENT ✅" if is_target_present else "TOI: ABSENT ❌"
+    cv2.putText(frame, global_text, (20, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.0,
+                (0, 255, 0) if is_target_present else (0, 0, 255), 3, cv2.LINE_AA)
 
+    # Ajouter des informations sur le frame
+    height, width = frame.shape[:2]
+    resolution = _resolution_text.get((width, height))
+    if resolution is None:
+        resolution = _resolution_text.setdefault((width, height), f"Resolution: {width}x{height}")
+    cv2.putText(frame, resolution, (20, height-60),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+    cv2.putText(frame, "Appuyez sur 'q' pour quitter", (20, height-30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+
+def draw_overlay(frame, lines):
+    """Afficher les métriques (FPS, p50/p95 par étape) en haut à droite du frame."""
+    width = frame.shape[1]
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (width - 330, 24 + 18 * i),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1, cv2.LINE_AA)
+
+def render(frame, detections, is_target_present, overlay=False):
+    """draw_frame (+ overlay des métriques), mesuré dans l'étape 'draw'."""
+    t0 = time.perf_counter()
+    draw_frame(frame, detections, is_target_present)
+    if overlay:
+        draw_overlay(frame, METRICS.overlay_lines())
+    METRICS.observe("draw", time.perf_counter() - t0)
+
+def setup_window():
+    """
+    Créer et dimensionner la fenêtre d'affichage une seule fois ; repli sur
+    un titre sans émojis si la création échoue. Retourne le nom retenu.
+    """
+    global _window
+    if _window is None:
+        try:
+            cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(WINDOW_NAME, 800, 600)
+            _window = WINDOW_NAME
+        except Exception as e:
+            print(f"[WARN] Erreur affichage: {e}")
+            _window = FALLBACK_WINDOW_NAME
+    return _window
+
+def show_frame(frame):
+    """Afficher le frame ; retourne la touche pressée (waitKey)."""
+    global _window
+    t0 = time.perf_counter()
+    try:
+        cv2.imshow(setup_window(), frame)
+    except Exception as e:
+        print(f"[WARN] Erreur affichage: {e}")
+        # Fallback sans émojis
+        _window = FALLBACK_WINDOW_NAME
+        cv2.imshow(_window, frame)
+
+    key = cv2.waitKey(1) & 0xFF
+    METRICS.observe("imshow", time.perf_counter() - t0)
+    return key
+
+def run_serial(cap, process, overlay=False):
+    """
+    Boucle historique : capture, détection, reconnaissance et affichage sur un
+    seul thread. 'process' : frame -> (detections, is_target_present).
+    Le frame est relu dans le même tableau (cap.read(frame)) : il est
+    entièrement consommé (traité, dessiné, affiché) avant la lecture suivante.
+    """
+    frame = None
     while True:
         # Lecture directe du flux (plus simple et fiable)
-        ok, frame = cap.read()
+        t0 = time.perf_counter()
+        ok, frame = cap.read(frame)
+        METRICS.observe("capture", time.perf_counter() - t0)
         if not ok or frame is None:
+            METRICS.incr("read_failures")
             print("[WARN] Lecture échouée. Tentative de re-ouverture de la caméra...")
             cap.release()
             cap = open_fixed_cam()
             if cap is None:
                 print("[ERREUR] Impossible de rouvrir la caméra.")
                 break
+            frame = None
             continue
 
         # --- Pipeline de détection/reconnaissance ---
-        # Convertir en niveaux de gris
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Détection de visages avec paramètres plus permissifs
-        faces = FACE_CASCADE.detectMultiScale(
-            gray, 
-            scaleFactor=1.05,      # Plus petit = plus sensible
-            minNeighbors=3,        # Plus petit = plus de détections
-            minSize=(30, 30),      # Plus petit = détecte des visages plus petits
-            maxSize=(300, 300)     # Limite la taille max
-        )
-        
-        # Afficher seulement quand des visages sont détectés
-        if len(faces) > 0:
-            print(f"[INFO] {len(faces)} visage(s) détecté(s)")
-
-        is_target_present = False
-        global_text = "TOI: ABSENT ❌"
-
-        # Dessiner tous les visages détectés (même sans reconnaissance)
-        for (x, y, w, h) in faces:
-            # Rectangle vert pour chaque visage détecté
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            cv2.putText(frame, "VISAGE DETECTE", (x, y-10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2, cv2.LINE_AA)
-            
-            try:
-                # Préparation du ROI pour LBPH (taille 200x200 en niveaux de gris)
-                roi = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
-
-                # Prédiction LBPH : label et "confidence"
-                label_pred, conf = recognizer.predict(roi)
-
-                if conf < THRESHOLD and label_pred in labels_to_name:
-                    name = labels_to_name[label_pred]
-                    
-                    # Mode test sans base de données pour éviter les erreurs
-                    try:
-                        exists = person_exists(name)
-                    except:
-                        exists = True  # Mode test
-                        print(f"[INFO] Mode test - pas de vérification DB pour {name}")
-
-                    status = f"{name} (conf={conf:.1f})"
-                    status += " — Succès ✅" if exists else " — Non trouvé ❌"
-
-                    if name == TARGET_NAME and exists:
-                        is_target_present = True
-
-                    color = (0, 255, 0) if exists else (0, 0, 255)
-                else:
-                    status = f"Inconnu (conf={conf:.1f})"
-                    color = (0, 0, 255)
-
-                # Mettre à jour le texte du visage
-                cv2.putText(frame, status, (x, y-30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2, cv2.LINE_AA)
-                            
-            except Exception as e:
-                print(f"[WARN] Erreur reconnaissance: {e}")
-                cv2.putText(frame, "ERREUR RECONNAISSANCE", (x, y-30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2, cv2.LINE_AA)
-
-        # Bandeau global "toi présent/absent"
-        if is_target_present:
-            global_text = "TOI: PRESENT ✅"
-
-        cv2.putText(frame, global_text, (20, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1.0,
-                    (0, 255, 0) if is_target_present else (0, 0, 255), 3, cv2.LINE_AA)
-
-        # Ajouter des informations sur le frame
-        height, width = frame.shape[:2]
-        cv2.putText(frame, f"Resolution: {width}x{height}", (20, height-60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
-        cv2.putText(frame, "Appuyez sur 'q' pour quitter", (20, height-30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
-
-        # FORCER l'affichage de la fenêtre avec gestion d'erreur
-        window_name = "🎯 Camera Frontale - Reconnaissance Faciale"
-        try:
-            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-            cv2.resizeWindow(window_name, 800, 600)
-            cv2.imshow(window_name, frame)
-        except Exception as e:
-            print(f"[WARN] Erreur affichage: {e}")
-            # Fallback sans émojis
-            cv2.imshow("Camera Frontale - Reconnaissance", frame)
+        detections, is_target_present = process(frame)
+        render(frame, detections, is_target_present, overlay)
 
         # Gestion clavier
-        key = cv2.waitKey(1) & 0xFF
+        key = show_frame(frame)
+        METRICS.frame_done()
         if key in (27, ord('q')):  # ESC ou q → quitter
             print("[INFO] Arrêt demandé par l'utilisateur")
             break
@@ -358,13 +453,216 @@ def main():
                 print("[ERREUR] Impossible de rouvrir la caméra.")
                 diagnose_cameras()
                 break
+            frame = None  # résolution éventuellement différente
         if key == ord('d'):        # d → diagnostic des caméras
             print("[INFO] Diagnostic des caméras...")
             diagnose_cameras()
 
+    if cap is not None:
+        cap.release()
+
+def run_threaded(cap, make_worker, workers=2, overlay=False):
+    """
+    Pipeline multi-thread (frame_pipeline.ThreadedPipeline) : capture du frame
+    le plus récent, détection/reconnaissance sur 'workers' threads, affichage ici.
+    'make_worker' : () -> process (appelé une fois par worker).
+    """
+    # La caméra déjà ouverte est passée au thread de capture au premier appel
+    caps = [cap]
+    def open_cap():
+        return caps.pop() if caps else open_fixed_cam()
+
+    pipeline = ThreadedPipeline(open_cap, make_worker, workers=workers, metrics=METRICS).start()
+    METRICS.add_source("pipeline", pipeline.stats)
+    try:
+        while not pipeline.failed:
+            item = pipeline.next_result(timeout=0.1)
+            if item is None:
+                key = cv2.waitKey(1) & 0xFF
+            else:
+                _, _, frame, (detections, is_target_present) = item
+                render(frame, detections, is_target_present, overlay)
+                key = show_frame(frame)
+                METRICS.frame_done()
+
+            if key in (27, ord('q')):  # ESC ou q → quitter
+                print("[INFO] Arrêt demandé par l'utilisateur")
+                break
+            if key == ord('c'):        # c → rouvrir/re-sélectionner la caméra
+                print("[INFO] Ré-ouverture de la caméra...")
+                pipeline.request_reopen()
+            if key == ord('d'):        # d → diagnostic des caméras
+                print("[INFO] Diagnostic des caméras...")
+                diagnose_cameras()
+        if pipeline.failed:
+            print("[ERREUR] Impossible de rouvrir la caméra.")
+    finally:
+        pipeline.stop()
+        print(f"[INFO] Pipeline: {pipeline.stats()}")
+
+def main():
+    global DETECT_WIDTH, EVENTS
+    parser = argparse.ArgumentParser(description="Reconnaissance faciale temps réel (LBPH + MySQL).")
+    parser.add_argument("--mode", choices=("serial", "threaded"), default="serial",
+                        help="serial: boucle unique (défaut) | threaded: capture/workers/affichage en parallèle")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Nombre de threads détection/reconnaissance en mode threaded (défaut: 2)")
+    parser.add_argument("--track", action="store_true",
+                        help="Suivi des visages entre détections (détection tous les N frames)")
+    parser.add_argument("--detect-every", type=int, default=5,
+                        help="Avec --track : détection Haar plein frame tous les N frames (défaut: 5)")
+    parser.add_argument("--predict-every", type=int, default=10,
+                        help="Avec --track : prédiction LBPH tous les N frames par piste (défaut: 10)")
+    parser.add_argument("--detect-width", type=int, default=DETECT_WIDTH,
+                        help="Largeur de détection en px, 0 = pleine résolution (défaut: 0)")
+    parser.add_argument("--engine", choices=("opencv", "numpy", "shards"), default="opencv",
+                        help="opencv: recognizer.predict par visage (défaut) | numpy: prédiction groupée par frame"
+                             " | shards: galerie en shards (shards.py)")
+    parser.add_argument("--ann-probes", type=int, default=0,
+                        help="Avec --engine numpy : listes IVF parcourues (0 = recherche exacte, défaut)")
+    parser.add_argument("--shards", nargs="+", metavar="SHARD",
+                        help="Avec --engine shards : ne charger que ces shards (défaut: tous)")
+    parser.add_argument("--metrics-jsonl", help="Ajouter un snapshot des métriques (JSON) à ce fichier à chaque export")
+    parser.add_argument("--metrics-prom", help="Réécrire ce fichier texte Prometheus à chaque export (textfile collector)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Période d'export des métriques en secondes (défaut: 10)")
+    parser.add_argument("--overlay", action="store_true", help="Afficher FPS et latences par étape sur l'image")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="Vérifier un nouveau modèle toutes les N secondes, 0 = jamais (défaut: 2)")
+    parser.add_argument("--log-events", action="store_true",
+                        help="Journaliser les reconnaissances dans la table recognition_events")
+    parser.add_argument("--event-window", type=float, default=EVENT_WINDOW,
+                        help="Avec --log-events : une personne journalisée au plus une fois par N secondes (défaut: 10)")
+    parser.add_argument("--source-name", default="0",
+                        help="Avec --log-events : identifiant de la caméra dans le journal (défaut: 0)")
+    parser.add_argument("--max-faces", type=int, default=MAX_FACES,
+                        help=f"Visages reconnus au plus par frame (taille du lot de ROI préalloué, défaut: {MAX_FACES})")
+    parser.add_argument("--trace-alloc", action="store_true",
+                        help="Mesurer la mémoire Python allouée (tracemalloc, ralentit la boucle)")
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+    if args.ann_probes > 0 and args.engine != "numpy":
+        parser.error("--ann-probes nécessite --engine numpy")
+    if args.shards and args.engine != "shards":
+        parser.error("--shards nécessite --engine shards")
+
+    DETECT_WIDTH = args.detect_width
+    quality = gate_from_args(args)
+    if quality is not None:
+        METRICS.add_source("quality", quality.stats)
+
+    # --- Charger modèle + labels ---
+    try:
+        get_cascade()
+        recognizer, labels_to_name = get_recognizer(args.engine, args.ann_probes, args.shards)
+    except RuntimeError as e:
+        print(f"[ERREUR] {e}")
+        return
+    except Exception as e:
+        print("[ERREUR] Modèle/labels introuvables. Entraîne d'abord (enroll/import).")
+        print(e)
+        return
+    if args.engine == "numpy":
+        print(f"[INFO] Moteur NumPy: {len(recognizer.labels)} histogrammes")
+    elif args.engine == "shards":
+        print(f"[INFO] Shards chargés (histogrammes): {recognizer.stats()}")
+
+    # --- Cache d'identités : préchargé depuis persons, rafraîchi en fond ---
+    identities = IdentityCache(ttl=IDENTITY_TTL, max_size=IDENTITY_CACHE_SIZE,
+                               refresh_interval=IDENTITY_REFRESH).start()
+    if not identities.db_ok:
+        print("[INFO] Mode test - pas de vérification DB (cache hors-ligne)")
+    METRICS.add_source("identities", identities.stats)
+
+    # --- Rechargement à chaud : chaque frame lit models.current une fois ---
+    models = ModelWatcher(lambda: load_engine(args.engine, args.ann_probes, args.shards),
+                          (recognizer, labels_to_name), interval=args.reload_interval,
+                          on_reload=lambda rec, labels: identities.preload(),
+                          version_path=SHARDS_VERSION if args.engine == "shards" else VERSION_PATH).start()
+    METRICS.add_source("model", models.stats)
+
+    if args.log_events:
+        EVENTS = EventLogger(source=args.source_name, window=args.event_window).start()
+        METRICS.add_source("events", EVENTS.stats)
+
+    # --- Ouvrir la caméra de manière robuste ---
+    cap = open_fixed_cam()
+    if cap is None:
+        print("[ERREUR] Aucune caméra accessible.")
+        print("[INFO] Lancement du diagnostic automatique...")
+        diagnose_cameras()
+        models.stop()
+        identities.stop()
+        if EVENTS is not None:
+            EVENTS.stop()
+        return
+
+    print("[INFO] Contrôles: 'q' pour quitter | 'c' pour re-sélectionner la caméra.")
+
+    # Tampons réutilisés : un jeu par worker (jamais partagé entre threads)
+    buffers = []
+    memory = MemoryStats(trace_alloc=args.trace_alloc)
+    METRICS.add_source("buffers", lambda: merge_stats(buffers))
+    METRICS.add_source("memory", memory.stats)
+
+    tracker = None
+    if args.track:
+        # Le suivi dépend de l'ordre des frames → un seul worker
+        buffers.append(FrameBuffers(args.max_faces))
+        process, tracker = make_tracking_processor(recognizer, labels_to_name, identities,
+                                                   args.detect_every, args.predict_every, models=models,
+                                                   buffers=buffers[0], quality=quality)
+        make_worker = lambda: process
+        workers = 1
+    else:
+        def make_worker():
+            # CascadeClassifier non thread-safe → une instance par worker
+            cascade = new_cascade()
+            frame_buffers = FrameBuffers(args.max_faces)
+            buffers.append(frame_buffers)
+            return lambda frame: process_frame(frame, *models.current, identities, cascade,
+                                               frame_buffers, quality)
+        workers = args.workers
+
+    if tracker is not None:
+        METRICS.add_source("tracker", tracker.stats)
+    exporter = MetricsExporter(METRICS, args.metrics_interval,
+                               args.metrics_jsonl, args.metrics_prom).start()
+    try:
+        if args.mode == "threaded":
+            run_threaded(cap, make_worker, workers=workers, overlay=args.overlay)
+        else:
+            run_serial(cap, make_worker(), overlay=args.overlay)
+    finally:
+        exporter.stop()
+
     # Nettoyage
-    cap.release()
     cv2.destroyAllWindows()
+    models.stop()
+    identities.stop()
+    if EVENTS is not None:
+        EVENTS.stop()
+        print(f"[INFO] Journal: {EVENTS.stats()}")
+    print(f"[INFO] Cache identités: {identities.stats()}")
+    if tracker is not None:
+        print(f"[INFO] Suivi: {tracker.stats()}")
+    if models.reloads:
+        print(f"[INFO] Modèle: {models.stats()}")
+    recognizer = models.current[0]
+    if isinstance(recognizer, IVFLBPH):
+        print(f"[INFO] Index ANN: {recognizer.stats()}")
+    elif isinstance(recognizer, ShardedLBPH):
+        print(f"[INFO] Shards: {recognizer.stats()}")
+    snap = METRICS.snapshot()
+    print(f"[PERF] {snap['frames']} frames | {snap['fps']:.1f} FPS | visages: {snap['faces']} "
+          f"| lectures échouées: {snap['read_failures']}")
+    for stage, st in snap["stages"].items():
+        print(f"[PERF] {stage}: p50 {st['p50_ms']:.2f} ms | p95 {st['p95_ms']:.2f} ms | n={st['count']}")
+    if quality is not None:
+        print(f"[INFO] Filtre qualité: {snap['quality']}")
+    print(f"[PERF] Tampons: {snap['buffers']}")
+    print(f"[PERF] Mémoire: {snap['memory']}")
+    memory.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,250 @@
+# shards.py
+# ------------------------------------------------------------
+# Galerie LBPH découpée en shards (data/shards/<shard>.bin) :
+# - partition par tranche de persons.id (--by range --shard-size N) ou par
+#   la colonne persons.group_name (--by group ; NULL → "default")
+# - chaque shard est une galerie binaire indépendante (gallery_bin) ;
+#   shards.json garde la partition et une signature par shard (personnes
+#   + images : id, chemin, mtime, taille). Un ré-entraînement ne réécrit
+#   que les shards dont la signature a changé
+# - ShardedLBPH : même interface que NumpyLBPH (predict, predict_batch) ;
+#   histogrammes des requêtes calculés une fois, distances calculées sur
+#   chaque shard en parallèle (threads, NumPy relâche le GIL), fusion du
+#   top-k global
+# - un site peut ne charger que ses shards (--shards a b) : mémoire réduite
+# - une fois créés, les shards sont maintenus par enroll/import à chaque
+#   ré-entraînement ; shards.version déclenche le rechargement à chaud
+# Exemples :
+#   python shards.py --build --by group
+#   python shards.py --build --by range --shard-size 500
+#   python shards.py --info
+#   python recognize_live_mysql.py --engine shards --shards siege entrepot
+# ------------------------------------------------------------
+import os
+import json
+import hashlib
+import weakref
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from lbph_numpy import GRID_X, GRID_Y, NUM_PATTERNS, compute_histograms, chi_square, rank_labels
+from gallery_bin import save_gallery, load_gallery
+from feature_cache import FeatureCache
+from model_store import atomic_write_json, publish_version
+from db_utils import fetch_people_groups, fetch_image_rows
+
+DATA_DIR = "data"
+SHARDS_DIR = os.path.join(DATA_DIR, "shards")
+SHARDS_MANIFEST = os.path.join(SHARDS_DIR, "shards.json")
+SHARDS_VERSION = os.path.join(SHARDS_DIR, "shards.version")   # rechargement à chaud (model_store)
+
+DEFAULT_GROUP = "default"
+DEFAULT_SHARD_SIZE = 500
+
+def shard_key(pid, group, by="group", shard_size=DEFAULT_SHARD_SIZE):
+    """Nom du shard d'une personne (utilisé comme nom de fichier)."""
+    if by == "range":
+        lo = (pid - 1) // shard_size * shard_size + 1
+        return f"ids_{lo:06d}-{lo + shard_size - 1:06d}"
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in (group or DEFAULT_GROUP))
+
+def _shard_path(shard_dir, name):
+    return os.path.join(shard_dir, f"{name}.bin")
+
+def _signature(people, rows):
+    """Empreinte d'un shard : personnes (id, nom) + images (id, chemin, mtime, taille)."""
+    h = hashlib.sha1()
+    for pid, name in sorted(people):
+        h.update(f"p{pid}:{name}\n".encode("utf-8"))
+    for image_id, pid, path in sorted(rows):
+        try:
+            st = os.stat(path)
+            sig = f"{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            sig = "missing"
+        h.update(f"i{image_id}:{pid}:{path}:{sig}\n".encode("utf-8"))
+    return h.hexdigest()
+
+def read_manifest(path=SHARDS_MANIFEST):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def build_shards(by=None, shard_size=None, shard_dir=SHARDS_DIR, use_cache=True, force=False):
+    """
+    (Re)construire les shards depuis la DB. Sans 'by'/'shard_size', reprendre
+    la partition du manifeste existant. Seuls les shards dont la signature a
+    changé sont recalculés et réécrits ; les shards vidés sont supprimés.
+    Retourne {"written": [...], "unchanged": [...], "removed": [...]}.
+    """
+    manifest_path = os.path.join(shard_dir, "shards.json")
+    previous = read_manifest(manifest_path) if os.path.exists(manifest_path) else {}
+    by = by or previous.get("by", "group")
+    shard_size = shard_size or previous.get("shard_size", DEFAULT_SHARD_SIZE)
+    if previous and (previous.get("by"), previous.get("shard_size")) != (by, shard_size):
+        force = True         # partition changée → tout reconstruire
+    old = previous.get("shards", {}) if not force else {}
+
+    # Partition des personnes et des images
+    people = {}      # shard -> [(pid, name)]
+    owner = {}       # pid -> shard
+    for pid, name, group in fetch_people_groups():
+        key = shard_key(pid, group, by, shard_size)
+        people.setdefault(key, []).append((pid, name))
+        owner[pid] = key
+    rows = {}        # shard -> [(image_id, pid, path)]
+    for image_id, pid, path in fetch_image_rows():
+        if pid in owner:
+            rows.setdefault(owner[pid], []).append((image_id, pid, path))
+
+    os.makedirs(shard_dir, exist_ok=True)
+    cache = FeatureCache()
+    if not use_cache:
+        cache.index.clear()
+    report = {"written": [], "unchanged": [], "removed": []}
+    shards = {}
+    for key in sorted(people):
+        sig = _signature(people[key], rows.get(key, []))
+        path = _shard_path(shard_dir, key)
+        if old.get(key, {}).get("signature") == sig and os.path.exists(path):
+            shards[key] = old[key]
+            report["unchanged"].append(key)
+            continue
+        H, y = _features(cache, rows.get(key, []))
+        labels_to_name = {pid: name for pid, name in people[key]}
+        save_gallery(path, H, y, labels_to_name)
+        shards[key] = {"signature": sig, "people": len(people[key]), "n_samples": int(len(y))}
+        report["written"].append(key)
+    cache.save_index()
+
+    for key in set(previous.get("shards", {})) - set(shards):
+        try:
+            os.remove(_shard_path(shard_dir, key))
+        except OSError:
+            pass
+        report["removed"].append(key)
+
+    atomic_write_json(manifest_path, {"by": by, "shard_size": shard_size, "shards": shards})
+    if report["written"] or report["removed"]:
+        # Publiée en dernier : les recognizers --engine shards rechargent
+        files = [_shard_path(shard_dir, key) for key in sorted(shards)] + [manifest_path]
+        publish_version(files, path=os.path.join(shard_dir, "shards.version"),
+                        n_samples=sum(s["n_samples"] for s in shards.values()))
+    return report
+
+def _features(cache, rows):
+    """
+    Histogrammes d'un shard via le cache de features. Pas de features_for :
+    il évince les images absentes de 'rows', donc celles des autres shards.
+    """
+    vectors, labels = [], []
+    for image_id, pid, path in rows:
+        h = cache.get(image_id, path)
+        if h is None:
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                cache.unreadable += 1
+                continue
+            h = compute_histograms(img[None])[0]
+            cache.put(image_id, path, h)
+            cache.misses += 1
+        else:
+            cache.hits += 1
+        vectors.append(h)
+        labels.append(pid)
+    if not vectors:
+        return np.empty((0, GRID_X * GRID_Y * NUM_PATTERNS), dtype=np.float32), np.array([], dtype=np.int32)
+    return np.vstack(vectors).astype(np.float32, copy=False), np.array(labels, dtype=np.int32)
+
+class ShardedLBPH:
+    """
+    Plusieurs galeries NumpyLBPH interrogées en parallèle. Les labels
+    (persons.id) sont disjoints d'un shard à l'autre : le meilleur global
+    est le meilleur des meilleurs par shard.
+    """
+
+    def __init__(self, engines, workers=None):
+        self.engines = engines                   # {nom: NumpyLBPH}
+        self.threshold = np.inf
+        workers = workers or min(len(engines), os.cpu_count() or 1) or 1
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+        # Rechargement à chaud : l'ancien moteur libère ses threads
+        weakref.finalize(self, self._pool.shutdown, wait=False)
+
+    @property
+    def labels(self):
+        parts = [e.labels for e in self.engines.values()]
+        return np.concatenate(parts) if parts else np.array([], dtype=np.int32)
+
+    def _search(self, engine, queries, k):
+        if engine.histograms.shape[0] == 0:
+            return [[] for _ in queries]
+        dist = chi_square(queries, engine.histograms)
+        return [[t for t in rank_labels(row, engine.labels, k, self.threshold) if t[0] != -1]
+                for row in dist]
+
+    def predict_batch(self, rois, k=1):
+        if len(rois) == 0:
+            return []
+        queries = compute_histograms(rois)
+        per_shard = list(self._pool.map(lambda e: self._search(e, queries, k), self.engines.values()))
+        results = []
+        for i in range(len(queries)):
+            merged = sorted((t for shard in per_shard for t in shard[i]), key=lambda t: t[1])
+            results.append(merged[:k] or [(-1, float("inf"))])
+        return results
+
+    def predict(self, roi):
+        return self.predict_batch([roi], k=1)[0][0]
+
+    def stats(self) -> dict:
+        return {name: int(e.histograms.shape[0]) for name, e in self.engines.items()}
+
+def load_shards(names=None, shard_dir=SHARDS_DIR, workers=None):
+    """
+    Charger les shards 'names' (tous si None) → (ShardedLBPH, labels_to_name).
+    Chaque galerie est un memmap : seuls les shards chargés occupent la mémoire.
+    """
+    manifest = read_manifest(os.path.join(shard_dir, "shards.json"))
+    available = sorted(manifest["shards"])
+    names = available if not names else list(names)
+    missing = [n for n in names if n not in manifest["shards"]]
+    if missing:
+        raise ValueError(f"Shard(s) inconnu(s): {', '.join(missing)} (disponibles: {', '.join(available)})")
+    engines, labels_to_name = {}, {}
+    for name in names:
+        engine, names_map = load_gallery(_shard_path(shard_dir, name))
+        engines[name] = engine
+        labels_to_name.update(names_map)
+    return ShardedLBPH(engines, workers), labels_to_name
+
+def main():
+    parser = argparse.ArgumentParser(description="Galerie LBPH en shards : construction incrémentale et inspection.")
+    parser.add_argument("--build", action="store_true", help="Construire / mettre à jour les shards depuis la DB")
+    parser.add_argument("--by", choices=("group", "range"),
+                        help="Partition : persons.group_name ou tranches de persons.id (défaut: celle existante, sinon group)")
+    parser.add_argument("--shard-size", type=int, default=0,
+                        help=f"Avec --by range : personnes par shard (défaut: {DEFAULT_SHARD_SIZE})")
+    parser.add_argument("--force", action="store_true", help="Réécrire tous les shards")
+    parser.add_argument("--no-cache", action="store_true", help="Recalculer tous les histogrammes")
+    parser.add_argument("--info", action="store_true", help="Afficher les shards existants")
+    args = parser.parse_args()
+
+    if args.build:
+        report = build_shards(args.by, args.shard_size or None, use_cache=not args.no_cache, force=args.force)
+        print(f"[OK] Shards réécrits: {len(report['written'])} {report['written']} | "
+              f"inchangés: {len(report['unchanged'])} | supprimés: {report['removed']}")
+    if args.info:
+        manifest = read_manifest()
+        print(f"[INFO] Partition: {manifest['by']}"
+              + (f" ({manifest['shard_size']} personnes/shard)" if manifest["by"] == "range" else ""))
+        for name, s in sorted(manifest["shards"].items()):
+            size = os.path.getsize(_shard_path(SHARDS_DIR, name)) / 1e6
+            print(f"  {name}: {s['people']} personne(s), {s['n_samples']} échantillon(s), {size:.1f} Mo")
+    if not (args.build or args.info):
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,14 @@ USE faceid_db;
 
 CREATE TABLE IF NOT EXISTS persons (
   id INT AUTO_INCREMENT PRIMARY KEY,
-  name VARCHAR(100) UNIQUE NOT NULL
+  name VARCHAR(100) UNIQUE NOT NULL,
+  -- Groupe (site, service...) : partition des shards (cf. shards.py)
+  group_name VARCHAR(64) NULL,
+  INDEX idx_persons_group (group_name)
 );
+-- Base existante :
+-- ALTER TABLE persons ADD COLUMN group_name VARCHAR(64) NULL,
+--   ADD INDEX idx_persons_group (group_name);
 
 CREATE TABLE IF NOT EXISTS images (
   id INT AUTO_INCREMENT PRIMARY KEY,
@@ -15,3 +21,30 @@ CREATE TABLE IF NOT EXISTS images (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE CASCADE
 );
+
+-- Journal des reconnaissances (écrit par lots, cf. event_log.py)
+CREATE TABLE IF NOT EXISTS recognition_events (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  person_id INT NULL,
+  source VARCHAR(64) NOT NULL,
+  confidence FLOAT NOT NULL,
+  seen_at TIMESTAMP(3) NOT NULL,
+  INDEX idx_events_seen (seen_at),
+  INDEX idx_events_person (person_id, seen_at),
+  FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE SET NULL
+);
+
+-- Manifeste d'import : une ligne par photo source (chemin relatif à la
+-- racine d'import) ; un ré-import ne traite que les fichiers nouveaux ou
+-- modifiés (cf. import_people_mysql.py)
+CREATE TABLE IF NOT EXISTS import_manifest (
+  source_path VARCHAR(255) PRIMARY KEY,
+  person_id INT NOT NULL,
+  size BIGINT NOT NULL,
+  mtime_ns BIGINT NOT NULL,
+  content_hash CHAR(40) NULL,
+  status VARCHAR(16) NOT NULL,
+  crop_path VARCHAR(255) NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE CASCADE
+);
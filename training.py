@@ -0,0 +1,137 @@
+# training.py
+# ------------------------------------------------------------
+# Entraînement complet partagé par enroll_face_mysql.py et
+# import_people_mysql.py :
+# - build_training_data : histogrammes LBP de toutes les images de la DB
+#   via le cache de features (data/features/) ; max_per_person > 0 : seuls
+#   les N meilleurs crops de chaque personne (score face_quality) entrent
+#   dans la galerie, les autres restent en base et sur disque
+# - compact_model : galerie réduite à K prototypes par personne
+#   (gallery_compact.py), taille et précision avant/après affichées
+# - train_and_save_model : écrit data/model.yml, labels.json, model.bin,
+#   model.ivf (s'il existe ou avec ann=True), met à jour les shards
+#   existants puis publie data/model.version (rechargement à chaud)
+# ------------------------------------------------------------
+import os
+import time
+
+import numpy as np
+
+from core import DATA_DIR, MODEL_PATH, LABELS_PATH, GALLERY_PATH, IVF_PATH
+from gallery_bin import save_gallery, write_opencv_model
+from feature_cache import FeatureCache
+from ann_index import build_index
+from gallery_compact import compact_and_evaluate, size_report
+from shards import SHARDS_MANIFEST, build_shards
+from model_store import atomic_write_json, publish_version
+from db_utils import fetch_people, fetch_image_rows
+
+def best_per_label(y, scores, n):
+    """Indices (ordre d'origine) des 'n' meilleurs scores de chaque label."""
+    order = np.lexsort((-scores, y))            # par label, meilleurs d'abord
+    y_sorted = y[order]
+    starts = np.searchsorted(y_sorted, y_sorted, side="left")
+    rank = np.arange(len(y)) - starts
+    return np.sort(order[rank < n])
+
+def build_training_data(use_cache=True, max_per_person=0):
+    """
+    Lire toutes les personnes/images depuis la DB et assembler les
+    histogrammes LBP via le cache de features (data/features/) : seules
+    les images nouvelles ou modifiées sont relues et recalculées.
+    max_per_person > 0 : garder les N crops de meilleure qualité par personne.
+    - H: matrice float32 (N, 16384) des histogrammes
+    - y: labels numériques (persons.id)
+    - labels_to_name: dict {label_num: nom}
+    """
+    people = fetch_people()
+    if not people:
+        return np.empty((0, 0), dtype=np.float32), np.array([], dtype=np.int32), {}
+
+    # Label LBPH = persons.id (stable dans le temps, permet recognizer.update())
+    labels_to_name = {pid: name for (pid, name) in people}
+
+    cache = FeatureCache()
+    if not use_cache:
+        cache.index.clear()      # tout recalculer (le cache est réécrit)
+    if max_per_person > 0:
+        H, y, scores = cache.features_for(fetch_image_rows(), with_quality=True)
+        keep = best_per_label(y, scores, max_per_person)
+        if len(keep) < len(y):
+            print(f"[INFO] Cap qualité: {len(keep)}/{len(y)} échantillons gardés "
+                  f"(≤ {max_per_person} par personne)")
+            H, y = H[keep], y[keep]
+    else:
+        H, y = cache.features_for(fetch_image_rows())
+    print(f"[INFO] Cache features: {cache.stats()}")
+    return H, y, labels_to_name
+
+def compact_model(H, y, k):
+    """
+    Réduire chaque personne à au plus 'k' prototypes (k-medoids chi-square).
+    La précision top-1 avant/après est mesurée sur un jeu mis de côté
+    (1 image sur 5 par personne, requêtes par blocs). Les distances de
+    chaque personne sont calculées une fois ; seul k-medoids (peu coûteux
+    devant les distances) tourne deux fois : sans le jeu de test, puis sur
+    toute la galerie. Retourne (H, y, rapport).
+    """
+    t0 = time.perf_counter()
+    keep, rows = compact_and_evaluate(H, y, k)
+    H_c, y_c = np.ascontiguousarray(H[keep]), y[keep]
+    report = size_report(len(y), len(y_c), H.shape[1])
+    print(f"[OK] Galerie compacte (K={k}): {report['samples_before']} → {report['samples_after']} "
+          f"échantillons ({report['mb_before']} → {report['mb_after']} Mo) "
+          f"en {time.perf_counter() - t0:.1f}s")
+    if rows:
+        full, compact = rows
+        report["top1_before"] = round(full["top1"], 4)
+        report["top1_after"] = round(compact["top1"], 4)
+        print(f"[OK] Top-1 (jeu mis de côté): {full['top1'] * 100:.1f}% → {compact['top1'] * 100:.1f}% "
+              f"({compact['delta_top1'] * 100:+.1f} pts) | predict {full['ms_per_face']:.2f} → "
+              f"{compact['ms_per_face']:.2f} ms/visage")
+    else:
+        print("[INFO] Trop peu d'images par personne pour mesurer la précision.")
+    return H_c, y_c, report
+
+def update_shards():
+    """Shards : maintenus s'ils existent (seuls les shards modifiés sont réécrits)."""
+    if os.path.exists(SHARDS_MANIFEST):
+        report = build_shards()
+        print(f"[OK] Shards réécrits: {report['written']} ({len(report['unchanged'])} inchangé(s))")
+
+def train_and_save_model(use_cache=True, ann=False, ann_lists=None, max_per_person=0, compact_k=0):
+    """
+    Entraîner LBPH sur tout le dataset et sauvegarder modèle + labels.
+    max_per_person > 0 : au plus N échantillons (les meilleurs) par personne.
+    compact_k > 0 : modèle compact, au plus K prototypes par personne.
+    """
+    H, y, labels_to_name = build_training_data(use_cache, max_per_person)
+    if len(y) == 0:
+        print("[INFO] Aucun échantillon pour l'entraînement.")
+        return
+
+    info = {}
+    if compact_k > 0:
+        H, y, report = compact_model(H, y, compact_k)
+        info = {"compact_k": compact_k, "compaction": report}
+
+    # model.yml écrit directement depuis les histogrammes (identique à
+    # LBPHFaceRecognizer.train + save, sans recalcul des LBP)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    write_opencv_model(MODEL_PATH, H, y)
+    atomic_write_json(LABELS_PATH, labels_to_name)
+
+    save_gallery(GALLERY_PATH, H, y, labels_to_name)
+    print(f"[OK] Modèle entraîné → {MODEL_PATH}")
+    print(f"[OK] Labels sauvegardés → {LABELS_PATH}")
+    print(f"[OK] Galerie binaire → {GALLERY_PATH}")
+
+    # Index ANN : construit sur demande, puis maintenu à chaque ré-entraînement
+    if ann or os.path.exists(IVF_PATH):
+        index = build_index(IVF_PATH, H, y, ann_lists)
+        print(f"[OK] Index ANN ({index.lists} listes) → {IVF_PATH}")
+
+    update_shards()      # cache de features déjà à jour
+
+    # Publiée en dernier : les recognizers en cours rechargent le modèle
+    publish_version([MODEL_PATH, LABELS_PATH, GALLERY_PATH, IVF_PATH], n_samples=len(y), **info)